@@ -0,0 +1,57 @@
+from cache import CacheConfig
+
+try:
+    import numpy as np
+except ImportError:     # NumPy is optional: chunks are then decoded in pure Python
+    np = None
+
+"""
+AddressMapper: splits addresses into (tag, cache_index, offset) for one CacheConfig
+- Block entries ({block_size / word_size}) and sets ({size / block_size / associativity}) must be powers of two
+- Shifts and masks are computed once, so decoding is integer bit operations only
+- decode_chunk decodes a whole trace chunk up front, with NumPy when it is installed
+"""
+class AddressMapper:
+    def __init__(self, cache_config: CacheConfig) -> None:
+        num_block_entry = cache_config.block_size // cache_config.word_size
+        num_set = cache_config.size // cache_config.block_size // cache_config.associativity
+
+        if cache_config.block_size % cache_config.word_size != 0 or not is_power_of_two(num_block_entry):
+            raise ValueError(f'block size ({cache_config.block_size}) / word size ({cache_config.word_size}) must be a power of two')
+        if cache_config.size % (cache_config.block_size * cache_config.associativity) != 0 or not is_power_of_two(num_set):
+            raise ValueError(f'cache size ({cache_config.size}) / block size ({cache_config.block_size}) / associativity ({cache_config.associativity}) must be a power of two')
+
+        self.num_block_entry = num_block_entry
+        self.num_set = num_set
+        self.offset_bits = num_block_entry.bit_length() - 1
+        self.index_bits = num_set.bit_length() - 1
+        self.tag_shift = self.offset_bits + self.index_bits
+        self.offset_mask = num_block_entry - 1
+        self.index_mask = num_set - 1
+
+    def decode(self, address: int):
+        return address >> self.tag_shift, (address >> self.offset_bits) & self.index_mask, address & self.offset_mask
+
+    """
+    decode_chunk: decodes every value of a chunk into lists of tags, cache indices and offsets
+    Values of other instructions (cycle counts) are decoded too and simply ignored by the core.
+    """
+    def decode_chunk(self, values):
+        if np is not None and len(values) > 0:
+            if isinstance(values, memoryview):
+                addresses = np.frombuffer(values, dtype=np.uint64)      # zero-copy view of a binary trace
+            else:
+                addresses = np.asarray(values, dtype=np.uint64)
+            tags = (addresses >> np.uint64(self.tag_shift)).tolist()
+            indices = ((addresses >> np.uint64(self.offset_bits)) & np.uint64(self.index_mask)).tolist()
+            offsets = (addresses & np.uint64(self.offset_mask)).tolist()
+            return tags, indices, offsets
+
+        tag_shift, offset_bits, index_mask, offset_mask = self.tag_shift, self.offset_bits, self.index_mask, self.offset_mask
+        tags = [address >> tag_shift for address in values]
+        indices = [(address >> offset_bits) & index_mask for address in values]
+        offsets = [address & offset_mask for address in values]
+        return tags, indices, offsets
+
+def is_power_of_two(n: int) -> bool:
+    return n > 0 and n & (n - 1) == 0
@@ -0,0 +1,22 @@
+import sys
+from main import parse_protocol
+from benchmarks.common import simulate
+
+"""
+associativity: simulation speed from direct-mapped up to fully associative at a fixed cache size
+Usage (from the repository root): python3 -m benchmarks.associativity protocol trace cache_size block_size
+
+Uses the event scheduler so every point simulates exactly the same interleaving.
+"""
+
+if __name__ == "__main__":
+    protocol = parse_protocol(sys.argv[1])
+    trace = sys.argv[2]
+    cache_size, block_size = int(sys.argv[3]), int(sys.argv[4])
+
+    print(f'{"ways":>8} {"sets":>8} {"seconds":>9} {"accesses/s":>12}')
+    associativity = 1
+    while associativity <= cache_size // block_size:
+        _, accesses, seconds = simulate(protocol, trace, cache_size, associativity, block_size)
+        print(f'{associativity:>8} {cache_size // block_size // associativity:>8} {seconds:>9.3f} {accesses / seconds:>12.0f}')
+        associativity *= 2
@@ -0,0 +1,41 @@
+import resource
+import subprocess
+import sys
+import time
+from cache import CacheConfig
+from enums import Protocol
+from system import System
+
+"""
+cache_startup: System start-up time, peak RSS and cache footprint for large cache configurations
+Usage (from the repository root): python3 -m benchmarks.cache_startup [cache_size associativity block_size ...]
+
+Each configuration is measured in a fresh interpreter so that peak RSS is not shared between them.
+"""
+
+DEFAULT_CONFIGS = [
+    (1 << 20, 2, 32),
+    (4 << 20, 8, 32),
+    (8 << 20, 2, 32),
+    (8 << 20, 16, 64),
+]
+
+def measure(cache_size: int, associativity: int, block_size: int, processor_num: int = 4) -> None:
+    config = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=4, protocol=Protocol.MESI)
+    start = time.perf_counter()
+    system = System(protocol=Protocol.MESI, processor_num=processor_num, cache_config=config, filename='')
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024     # ru_maxrss is in KB on Linux
+    footprint = sum(core.cache.footprint()[0] for core in system.cores)
+    print(f'{cache_size:>10} {associativity:>6} {block_size:>6} {elapsed:>10.4f} {peak_rss:>10.1f} {footprint:>14}')
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--measure':
+        measure(*(int(arg) for arg in sys.argv[2:5]))
+        sys.exit(0)
+
+    args = [int(arg) for arg in sys.argv[1:]]
+    configs = [tuple(args[i:i + 3]) for i in range(0, len(args), 3)] or DEFAULT_CONFIGS
+    print(f'{"size":>10} {"assoc":>6} {"block":>6} {"startup s":>10} {"RSS MB":>10} {"cache bytes":>14}')
+    for config in configs:
+        subprocess.run([sys.executable, '-m', 'benchmarks.cache_startup', '--measure', *(str(value) for value in config)], check=True)
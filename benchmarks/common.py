@@ -0,0 +1,37 @@
+import io
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+from cache import CacheConfig
+from system import System
+from main import feed_traces
+
+"""
+run_system: runs one configuration quietly and returns (finished System, stats file contents, seconds spent tracing)
+"""
+def run_system(protocol, trace, cache_size, associativity, block_size, scheduler='event', processor_num=4, binary=False, trace_files=None):
+    config = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=4, protocol=protocol)
+    fd, filename = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    try:
+        system = System(protocol=protocol, processor_num=processor_num, cache_config=config, filename=filename, scheduler=scheduler)
+        feed_traces(system, trace, processor_num, binary=binary, trace_files=trace_files)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            system.trace()
+        elapsed = time.perf_counter() - start
+        with open(filename) as f:
+            stats = f.read()
+    finally:
+        os.remove(filename)
+    return system, stats, elapsed
+
+"""
+simulate: runs one configuration quietly and returns (stats file contents, memory accesses, seconds spent tracing)
+"""
+def simulate(protocol, trace, cache_size, associativity, block_size, scheduler='event', processor_num=4, binary=False, trace_files=None):
+    system, stats, elapsed = run_system(protocol, trace, cache_size, associativity, block_size, scheduler=scheduler,
+                                        processor_num=processor_num, binary=binary, trace_files=trace_files)
+    accesses = sum(core.tracker.num_load + core.tracker.num_store for core in system.cores)
+    return stats, accesses, elapsed
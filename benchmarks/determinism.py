@@ -0,0 +1,25 @@
+import sys
+from main import parse_protocol
+from tests.test_determinism import identical_runs
+
+"""
+determinism: runs one configuration twice per scheduler and compares the stats files bit for bit
+Usage (from the repository root): python3 -m benchmarks.determinism protocol trace cache_size associativity block_size
+
+Also reports simulated accesses per second of each scheduler. Exits with status 1 if two
+runs of the event scheduler disagree. The same check runs in the test suite (tests/test_determinism.py).
+"""
+
+if __name__ == "__main__":
+    protocol = parse_protocol(sys.argv[1])
+    trace = sys.argv[2]
+    cache_size, associativity, block_size = (int(arg) for arg in sys.argv[3:6])
+
+    deterministic = True
+    for scheduler in ['threads', 'event']:
+        identical, _, accesses, seconds = identical_runs(protocol, trace, cache_size, associativity, block_size, scheduler=scheduler)
+        print(f'{scheduler:<8} {accesses / seconds:>12.0f} accesses/s   runs identical: {identical}')
+        if scheduler == 'event' and not identical:
+            deterministic = False
+
+    sys.exit(0 if deterministic else 1)
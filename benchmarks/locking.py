@@ -0,0 +1,95 @@
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from cache import CacheConfig
+from enums import Protocol
+from system import System, LOCKINGS, DEFAULT_STRIPES
+from main import feed_traces
+from benchmarks.workloads import generate
+
+"""
+locking: threaded simulation speed with one global bus lock against striped locks, per workload
+Usage (from the repository root): python3 -m benchmarks.locking [--cores 8] [--length 20000] [--interpreters python3.13t python3.13]
+
+Runs MESI over each synthetic workload with the threads scheduler, once per locking mode (best of {repeat}), and
+prints simulated accesses per second. On a GIL build the threads never run Python code in parallel, so striped
+locking can only add its per-instruction locking cost; the speed-up shows on a free-threaded build (e.g. python3.13t,
+where sys._is_gil_enabled() is False). --interpreters runs the same measurements under each given interpreter,
+e.g. a free-threaded build and the GIL build of the same version.
+"""
+
+WORKLOADS = ['private', 'read_shared', 'false_sharing', 'migratory']
+
+def gil_enabled():
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+"""
+measure: (accesses, seconds) of the fastest of {repeat} threaded runs of {trace} with {locking}
+"""
+def measure(trace: str, locking: str, args):
+    config = CacheConfig(size=args.cache_size, associativity=args.associativity, block_size=args.block_size, word_size=4, protocol=Protocol.MESI)
+    best = None
+    for _ in range(args.repeat):
+        system = System(protocol=Protocol.MESI, processor_num=args.cores, cache_config=config, filename=os.devnull,
+                        scheduler='threads', locking=locking, stripes=args.stripes)
+        feed_traces(system, trace, args.cores)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            system.run()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return sum(core.tracker.num_load + core.tracker.num_store for core in system.cores), best
+
+def run(args) -> dict:
+    results = {}
+    for workload in WORKLOADS:
+        trace = generate(workload, args.length, cores=args.cores)
+        results[workload] = {}
+        for locking in LOCKINGS:
+            accesses, seconds = measure(trace, locking, args)
+            results[workload][locking] = accesses / seconds
+    return results
+
+def print_results(results: dict) -> None:
+    print(f'{"workload":<18} {"global acc/s":>13} {"striped acc/s":>14} {"speed-up":>9}')
+    for workload, speeds in results.items():
+        print(f'{workload:<18} {speeds["global"]:>13.0f} {speeds["striped"]:>14.0f} {speeds["striped"] / speeds["global"]:>9.2f}')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - global against striped bus locking with the threads scheduler')
+    parser.add_argument('--cores', type=int, default=8)
+    parser.add_argument('--length', type=int, default=20000, help='Instructions per core of the generated traces')
+    parser.add_argument('--stripes', type=int, default=DEFAULT_STRIPES, help='Lock stripes (a power of two)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the fastest is kept')
+    parser.add_argument('--cache-size', type=int, default=4096)
+    parser.add_argument('--associativity', type=int, default=2)
+    parser.add_argument('--block-size', type=int, default=32)
+    parser.add_argument('--interpreters', nargs='+', default=None, help='Run the measurements under each of these Python executables')
+    parser.add_argument('--json', action='store_true', help=argparse.SUPPRESS)     # Child mode of --interpreters
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.interpreters:
+        forwarded = [arg for arg in sys.argv[1:] if arg not in args.interpreters and arg != '--interpreters']
+        for interpreter in args.interpreters:
+            try:
+                output = subprocess.run([interpreter, '-m', 'benchmarks.locking', '--json'] + forwarded,
+                                        check=True, capture_output=True, text=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f'##### {interpreter}: failed ({e}) #####')
+                continue
+            measured = json.loads(output.stdout)
+            print(f'##### {interpreter} (Python {measured["version"]}, GIL {"enabled" if measured["gil"] else "disabled"}) #####')
+            print_results(measured['results'])
+    elif args.json:
+        print(json.dumps({'version': sys.version.split()[0], 'gil': gil_enabled(), 'results': run(args)}))
+    else:
+        print(f'Python {sys.version.split()[0]}, GIL {"enabled" if gil_enabled() else "disabled"}, {args.cores} cores, {os.cpu_count()} CPUs')
+        print_results(run(args))
@@ -0,0 +1,23 @@
+import timeit
+from replacement import POLICIES
+
+"""
+replacement: cost of victim selection per policy from 2 to 32 ways, in nanoseconds per touch + victim
+Usage (from the repository root): python3 -m benchmarks.replacement
+
+Miss rates of the policies on real traces are compared with main.py --replacement.
+"""
+
+ASSOCIATIVITIES = [2, 4, 8, 16, 32]
+
+def cost(name: str, associativity: int, number: int = 200000) -> float:
+    policy = POLICIES[name](associativity, seed=0)
+    state = policy.new_set()
+    way = associativity // 2
+    seconds = timeit.timeit(lambda: (policy.touch(state, way), policy.victim(state)), number=number)
+    return seconds / number * 1e9
+
+if __name__ == "__main__":
+    print(f'{"policy":<8}' + ''.join(f'{str(ways) + "-way":>10}' for ways in ASSOCIATIVITIES))
+    for name in POLICIES:
+        print(f'{name:<8}' + ''.join(f'{cost(name, ways):>10.0f}' for ways in ASSOCIATIVITIES))
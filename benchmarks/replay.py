@@ -0,0 +1,70 @@
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from cache import CacheConfig
+from system import System
+from tracker import CoreTracker, LatencyModel, DEFAULT_LATENCY
+from main import parse_protocol, feed_traces
+from replay import record_events, recording, replay
+
+"""
+replay: accuracy and speed of replaying a recorded run under other memory latencies, against direct runs
+Usage (from the repository root): python3 -m benchmarks.replay protocol trace cache_size associativity block_size [memory_latency ...]
+
+Records the configuration once with the default latencies, and checks that replaying it with them gives exactly the
+direct run's stats (fails otherwise). Then, for each memory latency, compares each core's cycles replayed from the
+recording with a direct run under that latency. All runs use the event scheduler.
+"""
+
+def run_direct(protocol, trace, cache_size, associativity, block_size, latency, record=False):
+    config = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=4, protocol=protocol)
+    CoreTracker.latency = latency
+    try:
+        system = System(protocol=protocol, processor_num=4, cache_config=config, filename=os.devnull, scheduler='event')
+        if record:
+            record_events(system)
+        feed_traces(system, trace, 4)
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            system.run()
+        return system, time.perf_counter() - start
+    finally:
+        CoreTracker.latency = DEFAULT_LATENCY
+
+def stats_text(system) -> str:
+    out = io.StringIO()
+    with redirect_stdout(out):
+        system.print_stats()
+    return out.getvalue()
+
+if __name__ == "__main__":
+    protocol = parse_protocol(sys.argv[1])
+    trace = sys.argv[2]
+    cache_size, associativity, block_size = int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+    latencies = [int(latency) for latency in sys.argv[6:]] or [50, 200, 400]
+
+    recorded, record_seconds = run_direct(protocol, trace, cache_size, associativity, block_size, DEFAULT_LATENCY, record=True)
+    metadata, streams = recording(recorded)
+    start = time.perf_counter()
+    replayed = replay(metadata, streams)
+    replay_seconds = time.perf_counter() - start
+    events = sum(len(stream) for stream in streams)
+    print(f'Recorded run: {record_seconds:.3f}s, {events} events ({4 * events} bytes). Replay: {replay_seconds:.4f}s')
+    if stats_text(replayed) != stats_text(recorded):
+        print('MISMATCH: replaying the default latencies does not reproduce the recorded run')
+        sys.exit(1)
+    print('Replay with the default latencies matches the direct run')
+
+    print(f'\n{"memory":>8} {"core":>5} {"direct cycles":>14} {"replayed":>12} {"error":>8} {"direct s":>9} {"replay s":>9}')
+    for memory in latencies:
+        latency = LatencyModel(memory=memory)
+        direct, direct_seconds = run_direct(protocol, trace, cache_size, associativity, block_size, latency)
+        start = time.perf_counter()
+        replayed = replay(metadata, streams, latency)
+        seconds = time.perf_counter() - start
+        for core, replayed_core in zip(direct.cores, replayed.cores):
+            cycles, estimate = core.tracker.overall_cycles, replayed_core.tracker.overall_cycles
+            error = abs(estimate - cycles) / cycles if cycles else 0.0
+            print(f'{memory:>8} {core.id:>5} {cycles:>14} {estimate:>12} {error:>8.2%} {direct_seconds:>9.3f} {seconds:>9.4f}')
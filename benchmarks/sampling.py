@@ -0,0 +1,59 @@
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from cache import CacheConfig
+from system import System
+from main import parse_protocol, feed_traces
+from sampling import Sampler
+from benchmarks.common import run_system
+
+"""
+sampling: speed-up and estimation error of sampled simulation against a full run
+Usage (from the repository root): python3 -m benchmarks.sampling protocol trace cache_size associativity block_size [period window warmup ...]
+
+Runs the configuration in full, then sampled with full functional warming and with each given warm-up length.
+For every estimate, reports the relative error against the full run and whether the full value lies within
+the 95% confidence interval. All runs use the event scheduler.
+"""
+
+def run_sampled(protocol, trace, cache_size, associativity, block_size, period, window, warmup):
+    config = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=4, protocol=protocol)
+    system = System(protocol=protocol, processor_num=4, cache_config=config, filename=os.devnull, scheduler='event')
+    sampler = Sampler(system, period, window, warmup)
+    feed_traces(system, trace, 4, wrap=sampler.sample_chunks)
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        system.run()
+    return sampler.estimates(), time.perf_counter() - start
+
+if __name__ == "__main__":
+    protocol = parse_protocol(sys.argv[1])
+    trace = sys.argv[2]
+    cache_size, associativity, block_size = int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+    period = int(sys.argv[6]) if len(sys.argv) > 6 else 10000
+    window = int(sys.argv[7]) if len(sys.argv) > 7 else 1000
+    warmups = [None] + [int(warmup) for warmup in sys.argv[8:]] if len(sys.argv) > 8 else [None, 2 * window]
+
+    system, _, full_seconds = run_system(protocol, trace, cache_size, associativity, block_size)
+    trackers = [core.tracker for core in system.cores]
+    actual = {
+        'miss_rate': sum(t.num_miss for t in trackers) / sum(t.num_load + t.num_store for t in trackers),
+        'data_traffic': system.bus.tracker.data_traffic,
+        'num_invalidation': system.bus.tracker.num_invalidation,
+        'num_update': system.bus.tracker.num_update,
+    }
+    actual.update({f'cycles_{core.id}': core.tracker.overall_cycles for core in system.cores})
+    print(f'Full run: {full_seconds:.3f}s')
+
+    for warmup in warmups:
+        estimates, seconds = run_sampled(protocol, trace, cache_size, associativity, block_size, period, window, warmup)
+        print(f'\nSampled (period {period}, window {window}, warm-up {"full" if warmup is None else warmup}): '
+              f'{seconds:.3f}s, {full_seconds / seconds:.2f}x speed-up')
+        print(f'{"estimate":>18} {"actual":>12} {"sampled":>12} {"+/-":>10} {"error":>8} {"in CI":>6}')
+        for name, value in actual.items():
+            estimate, half_width = estimates[name]
+            error = abs(estimate - value) / value if value else abs(estimate)
+            inside = 'yes' if abs(estimate - value) <= half_width else 'no'
+            print(f'{name:>18} {value:>12.4g} {estimate:>12.4g} {half_width:>10.3g} {error:>8.2%} {inside:>6}')
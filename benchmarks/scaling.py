@@ -0,0 +1,32 @@
+import sys
+from main import parse_protocol
+from trace_reader import count_trace_files
+from benchmarks.common import simulate
+
+"""
+scaling: simulation speed as the number of cores doubles from 1 up to {max_cores} (default 64)
+Usage (from the repository root): python3 -m benchmarks.scaling protocol trace cache_size associativity block_size [max_cores]
+
+Trace files are reused across cores with shifted addresses (see feed_traces), so every core does the same
+amount of work. Uses the event scheduler so every point simulates a reproducible interleaving.
+"per core" is the simulation time per access divided by the cost at 1 core: it stays at 1.00 while the
+simulator scales linearly with the number of cores.
+"""
+
+if __name__ == "__main__":
+    protocol = parse_protocol(sys.argv[1])
+    trace = sys.argv[2]
+    cache_size, associativity, block_size = int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+    max_cores = int(sys.argv[6]) if len(sys.argv) > 6 else 64
+    trace_files = count_trace_files(trace)
+
+    print(f'{"cores":>6} {"accesses":>12} {"seconds":>9} {"accesses/s":>12} {"per core":>9}')
+    cores = 1
+    base_cost = None
+    while cores <= max_cores:
+        _, accesses, seconds = simulate(protocol, trace, cache_size, associativity, block_size, processor_num=cores, trace_files=min(trace_files, cores))
+        cost = seconds / accesses
+        if base_cost is None:
+            base_cost = cost
+        print(f'{cores:>6} {accesses:>12} {seconds:>9.3f} {accesses / seconds:>12.0f} {cost / base_cost:>9.2f}')
+        cores *= 2
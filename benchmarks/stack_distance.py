@@ -0,0 +1,40 @@
+import sys
+import time
+from trace_reader import read_trace, find_trace_file
+from stack_distance import StackDistanceAnalysis
+from tests.test_stack_distance import check_points, cross_check
+
+"""
+stack_distance: checks the single-pass miss rates against full simulations, and compares their cost
+Usage (from the repository root): python3 -m benchmarks.stack_distance trace block_size max_cache_size
+
+Analyses core 0's trace once, then simulates core 0 alone (MESI, so no remote cache ever interferes) for a few
+cache sizes and associativities up to {max_cache_size}. Fails if any miss count differs. The same cross-check runs
+in the test suite (tests/test_stack_distance.py) on small synthetic traces.
+"""
+
+if __name__ == "__main__":
+    trace = sys.argv[1]
+    block_size, max_cache_size = int(sys.argv[2]), int(sys.argv[3])
+
+    start = time.perf_counter()
+    analysis = StackDistanceAnalysis(block_size, max_cache_size)
+    analysis.feed(read_trace(find_trace_file(trace, 0)))
+    analysis_seconds = time.perf_counter() - start
+    points = sum(1 for _ in analysis.curves())
+    print(f'Analysis: {points} cache configurations in {analysis_seconds:.3f}s')
+
+    checks = check_points(block_size, max_cache_size)
+    print(f'{"cache size":>12} {"ways":>6} {"analysed":>10} {"simulated":>10} {"seconds":>9}')
+    mismatches = 0
+    simulated_seconds = 0
+    for cache_size, associativity in checks:
+        analysed, simulated, seconds = cross_check(analysis, trace, block_size, cache_size, associativity)
+        simulated_seconds += seconds
+        flag = '' if simulated == analysed else '  MISMATCH'
+        mismatches += simulated != analysed
+        print(f'{cache_size:>12} {associativity:>6} {analysed:>10} {simulated:>10} {seconds:>9.3f}{flag}')
+
+    print(f'Simulating all {points} configurations would take about {simulated_seconds / len(checks) * points:.1f}s')
+    if mismatches:
+        sys.exit(f'{mismatches} configurations disagree with the simulator')
@@ -0,0 +1,156 @@
+import argparse
+import io
+import os
+import sys
+import threading
+from contextlib import redirect_stdout
+from cache import CacheConfig, INVALID
+from enums import BlockState, Instruction, Protocol
+from system import System
+from main import feed_traces
+from benchmarks.workloads import generate
+
+"""
+stress: checks the coherence invariants while many threaded cores run with striped bus locking
+Usage (from the repository root): python3 -m benchmarks.stress [--cores 16] [--length 5000] [--stripes 8] [--interval 0.01]
+
+Runs every protocol over the shared workloads with the threads scheduler and --locking striped. Meanwhile, a checker
+thread repeatedly takes each stripe lock in turn and, with it held, checks the sets of that stripe in every cache:
+- the bus directory lists exactly the caches holding each line
+- MESI: at most one cache holds a line in M or E, and no other cache holds it then
+- MOESI: at most one cache holds a line in M, O or E, and a line in E is held by no other cache
+- Dragon: at most one cache holds a line in M, E or Sm, and a line in M or E is held by no other cache
+The MOESI table keeps a state these checks leave out: a store hit on O becomes M without invalidating the sharers, so
+M lines can be shared there (the same happens with the event scheduler and a global lock). The stats are then
+checked to count every load and store of the traces once.
+Exits with status 1 on any violation.
+"""
+
+WORKLOADS = ['false_sharing', 'migratory', 'producer_consumer', 'read_shared']
+PROTOCOLS = ['MESI', 'MOESI', 'DRAGON']
+
+MODIFIED = BlockState.MODIFIED.value
+EXCLUSIVE = BlockState.EXCLUSIVE.value
+OWNED = BlockState.OWNED.value
+SHARED_MODIFIED = BlockState.SHARED_MODIFIED.value
+
+# States at most one cache may hold a line in, and states no other cache may share the line with, per protocol
+OWNER_STATES = {
+    Protocol.MESI: {MODIFIED, EXCLUSIVE},
+    Protocol.MOESI: {MODIFIED, OWNED, EXCLUSIVE},
+    Protocol.DRAGON: {MODIFIED, EXCLUSIVE, SHARED_MODIFIED},
+}
+EXCLUSIVE_STATES = {
+    Protocol.MESI: {MODIFIED, EXCLUSIVE},
+    Protocol.MOESI: {EXCLUSIVE},
+    Protocol.DRAGON: {MODIFIED, EXCLUSIVE},
+}
+
+"""
+check_stripe: descriptions of the invariants broken by the sets of {stripe} in {system}. Hold the stripe's lock
+"""
+def check_stripe(system, stripe: int) -> list:
+    owners, exclusive = OWNER_STATES[system.protocol], EXCLUSIVE_STATES[system.protocol]
+    directory = system.bus.directory
+    mask = system.bus.stripe_mask
+    caches = [core.cache for core in system.cores]
+    violations = []
+    for cache_index in range(stripe, len(caches[0].sets), mask + 1):
+        holders = {}
+        for cache in caches:
+            cache_set = cache.sets[cache_index]
+            if cache_set is None:
+                continue
+            for tag, state in zip(cache_set.tags, cache_set.states):
+                if state != INVALID:
+                    holders.setdefault(tag, []).append((cache.id, state))
+
+        for tag, states in holders.items():
+            where = f'tag {tag:#x} index {cache_index}: {[(id, BlockState(state).name) for id, state in states]}'
+            if sum(state in owners for _, state in states) > 1:
+                violations.append(f'several owners of {where}')
+            if len(states) > 1 and any(state in exclusive for _, state in states):
+                violations.append(f'shared exclusive line {where}')
+            if directory.sharers(tag, cache_index) != sum(1 << id for id, _ in states):
+                violations.append(f'directory {directory.sharers(tag, cache_index):#x} disagrees with {where}')
+    return violations
+
+"""
+check_all: violations over every stripe of {system}, taking each stripe's lock in turn
+"""
+def check_all(system) -> list:
+    violations = []
+    for stripe, lock in enumerate(system.bus.locks):
+        with lock:
+            violations.extend(check_stripe(system, stripe))
+    return violations
+
+"""
+memory_operations: loads and stores in the first {cores} files of {trace}
+"""
+def memory_operations(trace: str, cores: int) -> int:
+    operations = {str(Instruction.LOAD.value), str(Instruction.STORE.value)}
+    total = 0
+    for core in range(cores):
+        with open(os.path.join('traces', f'{trace}_{core}.data')) as f:
+            total += sum(1 for line in f if line.split(' ', 1)[0] in operations)
+    return total
+
+"""
+stress: (violations, checks run) of one threaded striped run of {protocol} over {trace}
+"""
+def stress(protocol: Protocol, trace: str, args):
+    config = CacheConfig(size=args.cache_size, associativity=args.associativity, block_size=args.block_size, word_size=4, protocol=protocol)
+    system = System(protocol=protocol, processor_num=args.cores, cache_config=config, filename=os.devnull, scheduler='threads',
+                    locking='striped', stripes=args.stripes)
+    feed_traces(system, trace, args.cores)
+
+    violations = []
+    checks = 0
+    done = threading.Event()
+
+    def checker():
+        nonlocal checks
+        while not done.wait(args.interval):
+            violations.extend(check_all(system))
+            checks += 1
+
+    thread = threading.Thread(target=checker)
+    thread.start()
+    try:
+        with redirect_stdout(io.StringIO()):
+            system.run()
+    finally:
+        done.set()
+        thread.join()
+    violations.extend(check_all(system))
+
+    accesses = sum(core.tracker.num_load + core.tracker.num_store for core in system.cores)
+    expected = memory_operations(trace, args.cores)
+    if accesses != expected:
+        violations.append(f'{accesses} loads and stores counted, the traces have {expected}')
+    return violations, checks + 1
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - coherence invariants under threaded striped locking')
+    parser.add_argument('--cores', type=int, default=16)
+    parser.add_argument('--length', type=int, default=5000, help='Instructions per core of the generated traces')
+    parser.add_argument('--stripes', type=int, default=8, help='Lock stripes (a power of two)')
+    parser.add_argument('--interval', type=float, default=0.01, help='Seconds between two checks')
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument('--associativity', type=int, default=2)
+    parser.add_argument('--block-size', type=int, default=32)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    failed = False
+    for workload in WORKLOADS:
+        trace = generate(workload, args.length, cores=args.cores)
+        for name in PROTOCOLS:
+            violations, checks = stress(Protocol[name], trace, args)
+            print(f'{workload:<18} {name:<7} {checks:>6} checks   {len(violations)} violations')
+            for violation in violations[:10]:
+                print(f'    {violation}')
+            failed = failed or bool(violations)
+    sys.exit(1 if failed else 0)
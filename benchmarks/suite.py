@@ -0,0 +1,142 @@
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from cache import CacheConfig
+from enums import Protocol
+from system import System
+from main import feed_traces
+from benchmarks.workloads import WORKLOADS, generate
+
+"""
+suite: simulator throughput over the synthetic workloads, tracked against a baseline
+Usage (from the repository root): python3 -m benchmarks.suite [--length 20000] [--save] [--threshold 0.2]
+
+Generates the benchmarks.workloads traces, then runs every protocol over every workload with the event scheduler,
+each run in a fresh interpreter so that peak RSS is not shared between them. Records simulated accesses per
+second (best of {repeat} runs), peak RSS and startup time (building the System and opening the traces).
+--save writes the results to the baseline file. Otherwise the results are compared with it, and the suite
+fails if any throughput fell more than {threshold} below its baseline.
+"""
+
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+PROTOCOLS = ['MESI', 'MOESI', 'DRAGON']
+
+def measure(protocol: str, trace: str, cache_size: int, associativity: int, block_size: int) -> None:
+    config = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=4, protocol=Protocol[protocol])
+    fd, filename = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        system = System(protocol=Protocol[protocol], processor_num=4, cache_config=config, filename=filename, scheduler='event')
+        feed_traces(system, trace, 4)
+        startup = time.perf_counter() - start
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            system.trace()
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(filename)
+    accesses = sum(core.tracker.num_load + core.tracker.num_store for core in system.cores)
+    print(json.dumps({
+        'accesses': accesses,
+        'seconds': elapsed,
+        'startup': startup,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,    # ru_maxrss is in KB on Linux
+    }))
+
+def run_once(protocol: str, trace: str, cache_size: int, associativity: int, block_size: int) -> dict:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--measure', protocol, trace,
+                             str(cache_size), str(associativity), str(block_size)], check=True, capture_output=True, text=True)
+    return json.loads(output.stdout)
+
+"""
+run_suite: {workload: {protocol: result}}, keeping the fastest of {repeat} runs of each pair
+"""
+def run_suite(args) -> dict:
+    results = {}
+    for workload in WORKLOADS:
+        trace = generate(workload, args.length, seed=args.seed)
+        results[workload] = {}
+        for protocol in PROTOCOLS:
+            runs = [run_once(protocol, trace, args.cache_size, args.associativity, args.block_size) for _ in range(args.repeat)]
+            best = min(runs, key=lambda run: run['seconds'])
+            best['accesses_per_second'] = best['accesses'] / best['seconds']
+            results[workload][protocol] = best
+    return results
+
+"""
+regressions: (workload, protocol, throughput, baseline throughput) of every pair more than {threshold} slower than {baseline}
+"""
+def regressions(results: dict, baseline: dict, threshold: float):
+    slower = []
+    for workload, protocols in results.items():
+        for protocol, result in protocols.items():
+            expected = baseline.get(workload, {}).get(protocol)
+            if expected is None:
+                continue
+            if result['accesses_per_second'] < expected['accesses_per_second'] * (1 - threshold):
+                slower.append((workload, protocol, result['accesses_per_second'], expected['accesses_per_second']))
+    return slower
+
+def suite_config(args) -> dict:
+    return {'length': args.length, 'seed': args.seed, 'cache_size': args.cache_size,
+            'associativity': args.associativity, 'block_size': args.block_size}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - throughput benchmark suite over synthetic workloads')
+    parser.add_argument('--length', type=int, default=20000, help='Instructions per core of each workload (default 20000)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the workload generator (default 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each workload and protocol, the fastest is kept (default 3)')
+    parser.add_argument('--cache-size', type=int, default=4096)
+    parser.add_argument('--associativity', type=int, default=2)
+    parser.add_argument('--block-size', type=int, default=32)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f'Baseline file (default {DEFAULT_BASELINE})')
+    parser.add_argument('--save', action='store_true', help='Write the results to the baseline file instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fail if throughput falls more than this fraction below the baseline (default 0.2)')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--measure':
+        measure(sys.argv[2], sys.argv[3], *(int(arg) for arg in sys.argv[4:7]))
+        sys.exit(0)
+
+    args = parse_args()
+    baseline = None
+    if not args.save:
+        if not os.path.exists(args.baseline):
+            sys.exit(f'No baseline at {args.baseline}: run with --save first')
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved['config'] != suite_config(args):
+            sys.exit(f'The baseline was recorded with {saved["config"]}: use the same options or --save a new one')
+        baseline = saved['results']
+
+    results = run_suite(args)
+    print(f'{"workload":<18} {"protocol":<8} {"accesses":>9} {"accesses/s":>11} {"baseline/s":>11} {"startup s":>10} {"RSS MB":>8}')
+    for workload, protocols in results.items():
+        for protocol, result in protocols.items():
+            expected = baseline.get(workload, {}).get(protocol) if baseline else None
+            reference = f'{expected["accesses_per_second"]:>11.0f}' if expected else f'{"-":>11}'
+            print(f'{workload:<18} {protocol:<8} {result["accesses"]:>9} {result["accesses_per_second"]:>11.0f} {reference} '
+                  f'{result["startup"]:>10.4f} {result["peak_rss_mb"]:>8.1f}')
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': suite_config(args), 'results': results}, f, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+        sys.exit(0)
+
+    slower = regressions(results, baseline, args.threshold)
+    for workload, protocol, throughput, expected in slower:
+        print(f'REGRESSION: {workload} {protocol} {throughput:.0f} accesses/s, baseline {expected:.0f} ({throughput / expected - 1:+.0%})')
+    if slower:
+        sys.exit(1)
+    print(f'No throughput regression beyond {args.threshold:.0%}')
@@ -0,0 +1,67 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import time
+from trace_reader import read_trace
+from binary_trace import convert_trace, load_binary_trace
+
+"""
+trace_io: throughput of every trace input format on one trace file
+Usage (from the repository root): python3 -m benchmarks.trace_io traces/bodytrack_0.data [repeats]
+
+The trace is copied into a temporary directory as plain text, gzip, bzip2, xz and binary.
+Each copy is then read to the end the way a core would consume it.
+"""
+
+COMPRESSORS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+def consume(data) -> int:
+    instructions = 0
+    for labels, values in data:
+        for label, value in zip(labels, values):
+            instructions += 1
+    return instructions
+
+def best_time(load, repeats: int):
+    best = None
+    instructions = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        instructions = consume(load())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return instructions, best
+
+def run(source: str, repeats: int = 3) -> None:
+    workdir = tempfile.mkdtemp(prefix='stardust_io_')
+    try:
+        inputs = {'text': os.path.join(workdir, 'trace.data')}
+        shutil.copyfile(source, inputs['text'])
+        for extension, opener in COMPRESSORS.items():
+            inputs[extension[1:]] = inputs['text'] + extension
+            with open(inputs['text'], 'rb') as src, opener(inputs[extension[1:]], 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        inputs['binary'] = os.path.join(workdir, 'trace.bin')
+        convert_trace(inputs['text'], inputs['binary'])
+
+        print(f'{"format":<8} {"size (bytes)":>14} {"seconds":>9} {"instr/s":>12}')
+        for name, path in inputs.items():
+            if name == 'binary':
+                load = lambda: load_binary_trace(path)
+            else:
+                load = lambda: read_trace(path)
+            instructions, seconds = best_time(load, repeats)
+            print(f'{name:<8} {os.path.getsize(path):>14} {seconds:>9.3f} {instructions / seconds:>12.0f}')
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    run(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,98 @@
+import os
+import random
+import sys
+from enums import Instruction
+
+"""
+workloads: reproducible synthetic traces, one per sharing pattern
+Usage (from the repository root): python3 -m benchmarks.workloads [length] [cores] [seed]
+
+Writes traces/bench-{workload}-{length}_{core}.data, {length} instructions per core, for every workload:
+- private: each core streams through its own array, mostly loading
+- read_shared: every core loads random words of one shared table
+- migratory: cores read-modify-write random records of a shared pool, so lines move from cache to cache
+- producer_consumer: even cores store into a ring buffer that the next odd core loads from
+- false_sharing: each core stores to its own word of the same few blocks (ping-pong)
+Memory operations are interleaved with other instructions of 1 to 20 cycles. Addresses are word addresses.
+The same {length}, {cores} and {seed} always give the same traces.
+"""
+
+LOAD = Instruction.LOAD.value
+STORE = Instruction.STORE.value
+OTHERS = Instruction.OTHERS.value
+
+REGION = 1 << 24            # Words between two cores' private regions
+SHARED_BASE = 1 << 30       # First word of the shared regions
+COMPUTE_RATIO = 0.3         # Share of other instructions
+MAX_BLOCK_WORDS = 16        # False sharing stays within one block for blocks of up to 16 words
+
+def private(rng, core):
+    address = core * REGION
+    while True:
+        yield (STORE if rng.random() < 0.25 else LOAD), address
+        address += 1
+
+def read_shared(rng, core):
+    while True:
+        yield LOAD, SHARED_BASE + rng.randrange(1 << 12)
+
+def migratory(rng, core):
+    while True:
+        address = SHARED_BASE + rng.randrange(256) * MAX_BLOCK_WORDS
+        yield LOAD, address
+        yield STORE, address
+
+def producer_consumer(rng, core):
+    ring = SHARED_BASE + core // 2 * REGION
+    i = 0
+    while True:
+        yield (STORE if core % 2 == 0 else LOAD), ring + i % (1 << 12)
+        i += 1
+
+def false_sharing(rng, core):
+    while True:
+        yield STORE, SHARED_BASE + rng.randrange(4) * MAX_BLOCK_WORDS + core % MAX_BLOCK_WORDS
+
+WORKLOADS = {
+    'private': private,
+    'read_shared': read_shared,
+    'migratory': migratory,
+    'producer_consumer': producer_consumer,
+    'false_sharing': false_sharing,
+}
+
+def trace_name(workload: str, length: int) -> str:
+    return f'bench-{workload}-{length}'
+
+"""
+generate: writes the {cores} trace files of {workload} that do not exist yet, and returns the trace name
+"""
+def generate(workload: str, length: int, cores: int = 4, seed: int = 0, directory: str = 'traces') -> str:
+    name = trace_name(workload, length)
+    for core in range(cores):
+        filename = os.path.join(directory, f'{name}_{core}.data')
+        if os.path.exists(filename):
+            continue
+
+        rng = random.Random(f'{seed}-{workload}-{core}')
+        accesses = WORKLOADS[workload](rng, core)
+        lines = []
+        for _ in range(length):
+            if rng.random() < COMPUTE_RATIO:
+                lines.append(f'{OTHERS} {hex(rng.randint(1, 20))}\n')
+            else:
+                label, address = next(accesses)
+                lines.append(f'{label} {hex(address)}\n')
+
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(lines)
+        os.replace(tmp, filename)
+    return name
+
+if __name__ == "__main__":
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cores = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    for workload in WORKLOADS:
+        print(f'traces/{generate(workload, length, cores, seed)}_*.data')
@@ -0,0 +1,176 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from trace_reader import read_trace, DEFAULT_BUFFER_SIZE, TRACE_EXTENSIONS
+
+"""
+binary_trace: compact binary copy of a text trace, memory-mapped straight into a core
+
+File layout (little-endian):
+- Header: magic, version, instruction count, source size, source mtime and source sha256
+- Labels: one uint8 per instruction
+- Values: one uint64 per instruction (address or cycles), aligned to 8 bytes
+
+Labels and values are stored as separate columns so that a chunk of either is a zero-copy
+memoryview of the mapped file. A binary trace is rebuilt whenever its source trace changes.
+"""
+
+MAGIC = b'STARDUST'
+VERSION = 1
+HEADER = struct.Struct('<8sH6xQQq32s')   # magic, version, count, source size, source mtime_ns, source sha256
+DEFAULT_CHUNK_RECORDS = 1 << 16         # Instructions per chunk handed to a core
+
+"""
+trace_base: {source} without its trace extension (.data, .data.gz, ...), where derived files are placed
+Only a suffix is stripped, so directories containing '.data' are kept as they are.
+"""
+def trace_base(source: str) -> str:
+    for extension in sorted(TRACE_EXTENSIONS, key=len, reverse=True):
+        if source.endswith(extension):
+            return source[:-len(extension)]
+    return source
+
+def binary_trace_path(source: str) -> str:
+    return trace_base(source) + '.bin'
+
+def values_offset(count: int) -> int:
+    return (HEADER.size + count + 7) // 8 * 8
+
+def binary_size(count: int) -> int:
+    return values_offset(count) + 8 * count
+
+"""
+pack_trace: writes {labels} (bytes-like) and {values} (array('Q')) into {buffer} in the binary trace layout
+{buffer} must hold binary_size(len(labels)) bytes. The header records no source, so binary_chunks can read it back.
+"""
+def pack_trace(buffer, labels, values) -> None:
+    count = len(labels)
+    if sys.byteorder == 'big':
+        values = array('Q', values)
+        values.byteswap()
+    buffer[:HEADER.size] = HEADER.pack(MAGIC, VERSION, count, 0, 0, b'')
+    buffer[HEADER.size:HEADER.size + count] = labels
+    buffer[values_offset(count):binary_size(count)] = memoryview(values).cast('B')
+
+def hash_file(filename: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(DEFAULT_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.digest()
+
+def read_header(filename: str):
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, version, count, size, mtime_ns, sha256 = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return count, size, mtime_ns, sha256
+
+"""
+convert_trace: writes the binary copy of text trace {source} to {destination}
+Labels and values are spooled to separate files in one streaming pass, then concatenated behind the header.
+"""
+def convert_trace(source: str, destination: str, buffer_size: int = DEFAULT_BUFFER_SIZE) -> int:
+    stat = os.stat(source)
+    sha256 = hash_file(source)
+    labels_tmp = destination + '.labels.tmp'
+    values_tmp = destination + '.values.tmp'
+    count = 0
+
+    with open(labels_tmp, 'wb') as labels_f, open(values_tmp, 'wb') as values_f:
+        for labels, values in read_trace(source, buffer_size=buffer_size):
+            labels_f.write(bytes(labels))
+            values_arr = array('Q', values)
+            if sys.byteorder == 'big':
+                values_arr.byteswap()
+            values_arr.tofile(values_f)
+            count += len(labels)
+
+    tmp = destination + '.tmp'
+    with open(tmp, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, count, stat.st_size, stat.st_mtime_ns, sha256))
+        with open(labels_tmp, 'rb') as labels_f:
+            while block := labels_f.read(DEFAULT_BUFFER_SIZE):
+                out.write(block)
+        out.write(b'\0' * (values_offset(count) - HEADER.size - count))
+        with open(values_tmp, 'rb') as values_f:
+            while block := values_f.read(DEFAULT_BUFFER_SIZE):
+                out.write(block)
+    os.remove(labels_tmp)
+    os.remove(values_tmp)
+    os.replace(tmp, destination)
+    return count
+
+"""
+is_stale: checks whether {binary} is missing or out of date with its {source}
+Size and mtime are checked first. If only the mtime moved, the source hash decides, and a matching
+hash refreshes the stored mtime so the next check is cheap again.
+"""
+def is_stale(source: str, binary: str) -> bool:
+    if not os.path.exists(binary):
+        return True
+    header = read_header(binary)
+    if header is None:
+        return True
+
+    count, size, mtime_ns, sha256 = header
+    stat = os.stat(source)
+    if stat.st_size != size:
+        return True
+    if stat.st_mtime_ns == mtime_ns:
+        return False
+    if hash_file(source) != sha256:
+        return True
+
+    with open(binary, 'r+b') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count, size, stat.st_mtime_ns, sha256))
+    return False
+
+"""
+ensure_binary_trace: returns the path of an up to date binary copy of {source}, converting it if needed
+"""
+def ensure_binary_trace(source: str) -> str:
+    binary = binary_trace_path(source)
+    if is_stale(source, binary):
+        convert_trace(source, binary)
+    return binary
+
+"""
+load_binary_trace: memory-maps {filename} and returns a generator of (labels, values) chunks
+Chunks are memoryviews into the mapping, so no instruction is parsed or copied.
+"""
+def load_binary_trace(filename: str, chunk_records: int = DEFAULT_CHUNK_RECORDS):
+    header = read_header(filename)
+    if header is None:
+        raise ValueError(f'{filename} is not a binary trace')
+    count = header[0]
+
+    with open(filename, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count > 0 else b''
+    return binary_chunks(mapped, count, chunk_records)
+
+def binary_chunks(mapped, count: int, chunk_records: int = DEFAULT_CHUNK_RECORDS):
+    view = memoryview(mapped)
+    labels = view[HEADER.size:HEADER.size + count]
+    values = view[values_offset(count):values_offset(count) + 8 * count].cast('Q')
+    if sys.byteorder == 'big':
+        values = array('Q', values)
+        values.byteswap()
+
+    for start in range(0, count, chunk_records):
+        yield labels[start:start + chunk_records], values[start:start + chunk_records]
+
+if __name__ == "__main__":
+    # Usage: python3 binary_trace.py traces/bodytrack_0.data [traces/bodytrack_1.data ...]
+    for source in sys.argv[1:]:
+        binary = binary_trace_path(source)
+        if is_stale(source, binary):
+            print(f'{source} -> {binary}: {convert_trace(source, binary)} instructions')
+        else:
+            print(f'{binary} is up to date')
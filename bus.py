@@ -1,117 +1,141 @@
 from tracker import BusTracker
 from cache import Cache, CacheConfig
+from directory import SharerDirectory, sharer_ids
 from enums import BlockSource, MemOperation
-from threading import Lock
+from threading import Lock, RLock
 
 # shared bus class
+# The bus keeps a directory of which caches hold each line, so a request only snoops the caches sharing its line
+# Bus activity is counted by the tracker of the requesting core in {trackers}: all of them are {tracker} unless
+# a caller (e.g. sampling) gives a core its own
+# Requests lock {locks}[cache_index & stripe_mask]: one global {lock} by default. With {stripes} > 1, every group of
+# sets has its own reentrant lock, so requests on different sets run concurrently (see System locking='striped')
+# The global lock is reentrant as well where callers hold it around a request (see System)
 class Bus:
-    def __init__(self, tracker: BusTracker, cache_config: CacheConfig, lock: Lock) -> None:
+    def __init__(self, tracker: BusTracker, cache_config: CacheConfig, lock: Lock, stripes: int = 1) -> None:
         self.tracker = tracker
         self.cache_config = cache_config
         self.caches = []
+        self.caches_by_id = {}
+        self.trackers = {}
+        self.directory = SharerDirectory(cache_config)
         self.lock = lock
+        if stripes & (stripes - 1) != 0:
+            raise ValueError(f'the number of lock stripes ({stripes}) must be a power of two')
+        self.locks = [lock] if stripes == 1 else [RLock() for _ in range(stripes)]
+        self.stripe_mask = stripes - 1
 
     def add_cache(self, cache: Cache):
         self.caches.append(cache)
+        self.caches_by_id[cache.id] = cache
+        self.trackers[cache.id] = self.tracker
+        cache.directory = self.directory
+
+    """
+    remote_sharers: caches other than {id} holding a valid copy of the line, in increasing id order
+    """
+    def remote_sharers(self, id, tag, cache_index):
+        sharers = self.directory.sharers(tag, cache_index) & ~(1 << id)
+        return [self.caches_by_id[cache_id] for cache_id in sharer_ids(sharers)]
 
     ########## Invalidation-based bus requests
     def bus_load_request(self, id, tag, cache_index, offset) -> BlockSource:
         # self.log(f'Received load_request from core {id} with tag {tag}, index {cache_index} and offset {offset}')
-        self.lock.acquire()
+        lock = self.locks[cache_index & self.stripe_mask]
+        lock.acquire()
         found_in_remote_cache = False
-        for c in self.caches:
+        for c in self.remote_sharers(id, tag, cache_index):
             # If bus finds a valid copy in one of the caches
-            if c.id != id and c.bus_invalidate_load(tag, cache_index, offset):
+            if c.bus_invalidate_load(tag, cache_index, offset):
                 # deliver block from REMOTE_CACHE to current cache
                 if not found_in_remote_cache:
                     self.deliver_block(source=BlockSource.REMOTE_CACHE, op=MemOperation.PR_INVALIDATE_LOAD, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
                     found_in_remote_cache = True
         if found_in_remote_cache:
-            self.lock.release()
+            lock.release()
             return BlockSource.REMOTE_CACHE
         else:
             self.deliver_block(source=BlockSource.MEMORY, op=MemOperation.PR_INVALIDATE_LOAD, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
-            self.lock.release()            
+            lock.release()
             return BlockSource.MEMORY
 
     def bus_load_exclusive_request(self, id, tag, cache_index, offset):
         # self.log(f'Received load_exclusive_request from core {id} with tag {tag}, index {cache_index} and offset {offset}')
-        self.lock.acquire()
-        found_in_remote_cache = False
-        for c in self.caches:
-            # If bus finds a valid copy in one of the caches
-            # self.log(f'Looking at cache {c.id}')
-            if c.id != id and c.find_block(tag=tag, cache_index=cache_index) > -1:
-                self.deliver_block(source=BlockSource.REMOTE_CACHE, op=MemOperation.PR_INVALIDATE_STORE, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
-                found_in_remote_cache = True
-                break
-        
+        lock = self.locks[cache_index & self.stripe_mask]
+        lock.acquire()
+        # If bus finds a valid copy in one of the caches
+        found_in_remote_cache = self.directory.sharers(tag, cache_index) & ~(1 << id) != 0
+
         # Only going to be used for MESI and MOESI
         if found_in_remote_cache:
+            self.deliver_block(source=BlockSource.REMOTE_CACHE, op=MemOperation.PR_INVALIDATE_STORE, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
             self.flush_all(id, tag, cache_index, offset)
-            self.lock.release()
+            lock.release()
             return BlockSource.REMOTE_CACHE
         else:
             self.deliver_block(source=BlockSource.MEMORY, op=MemOperation.PR_INVALIDATE_STORE, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
-            self.lock.release()
+            lock.release()
             return BlockSource.MEMORY
 
 
     def bus_moesi_load_request(self, id, tag, cache_index, offset) -> BlockSource:
         # self.log(f'Received load_request from core {id} with tag {tag}, index {cache_index} and offset {offset}')
-        self.lock.acquire()
+        lock = self.locks[cache_index & self.stripe_mask]
+        lock.acquire()
         found_in_remote_cache = False
-        for c in self.caches:
+        for c in self.remote_sharers(id, tag, cache_index):
             # If bus finds a valid copy in one of the caches
-            if c.id != id and c.bus_moesi_invalidate_load(tag, cache_index, offset):
+            if c.bus_moesi_invalidate_load(tag, cache_index, offset):
                 # deliver block from REMOTE_CACHE to current cache
                 if not found_in_remote_cache:
                     self.deliver_block(source=BlockSource.REMOTE_CACHE, op=MemOperation.PR_INVALIDATE_LOAD, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
                     found_in_remote_cache = True
         if found_in_remote_cache:
-            self.lock.release()
+            lock.release()
             return BlockSource.REMOTE_CACHE
         else:
             self.deliver_block(source=BlockSource.MEMORY, op=MemOperation.PR_INVALIDATE_LOAD, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
-            self.lock.release()            
+            lock.release()
             return BlockSource.MEMORY
 
     ########## Update-based bus requests
     def pr_load_miss_request(self, id, tag, cache_index, offset):
-        self.lock.acquire()
+        lock = self.locks[cache_index & self.stripe_mask]
+        lock.acquire()
         found_in_remote_cache = False
-        for c in self.caches:
+        for c in self.remote_sharers(id, tag, cache_index):
             # If bus finds a valid copy in one of the caches
-            if c.id != id and c.bus_update_load(tag, cache_index, offset):
+            if c.bus_update_load(tag, cache_index, offset):
                 # deliver block from REMOTE_CACHE to current cache
                 if not found_in_remote_cache:
                     self.deliver_block(source=BlockSource.REMOTE_CACHE, op=MemOperation.PR_LOAD_MISS, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
                     found_in_remote_cache = True
         if found_in_remote_cache:
-            self.lock.release()
+            lock.release()
             return BlockSource.REMOTE_CACHE
         else:
             self.deliver_block(source=BlockSource.MEMORY, op=MemOperation.PR_LOAD_MISS, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
-            self.lock.release()
+            lock.release()
             return BlockSource.MEMORY
 
     def pr_store_miss_request(self, id, tag, cache_index, offset):
-        self.lock.acquire()
+        lock = self.locks[cache_index & self.stripe_mask]
+        lock.acquire()
         found_in_remote_cache = False
-        for c in self.caches:
+        for c in self.remote_sharers(id, tag, cache_index):
             # If bus finds a valid copy in one of the caches
-            if c.id != id and c.bus_update_load(tag, cache_index, offset):  # If any copy exists in remote cache, change to shared_clean
+            if c.bus_update_load(tag, cache_index, offset):  # If any copy exists in remote cache, change to shared_clean
                 if not found_in_remote_cache:
                     # deliver block from REMOTE_CACHE to current cache
                     self.deliver_block(source=BlockSource.REMOTE_CACHE, op=MemOperation.PR_STORE_MISS, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
                     found_in_remote_cache = True
 
         if found_in_remote_cache:
-            self.lock.release()
+            lock.release()
             return BlockSource.REMOTE_CACHE # State of cache will be shared_clean
         else:
             self.deliver_block(source=BlockSource.MEMORY, op=MemOperation.PR_STORE_MISS, target_id=id, tag=tag, cache_index=cache_index, offset=offset)
-            self.lock.release()
+            lock.release()
             return BlockSource.MEMORY
 
     """
@@ -121,51 +145,55 @@ class Bus:
     Bus delivers word to all other caches
     """
     def bus_update_request(self, id, tag, cache_index, offset):
-        self.lock.acquire()
-        for c in self.caches:
-            if c.id != id and c.find_block(tag=tag, cache_index=cache_index) > -1:
-                self.tracker.track_update(updates=1)
-                self.deliver_word(source=BlockSource.REMOTE_CACHE, op=MemOperation.BUS_UPDATE_UPDATE, target_id=c.id, tag=tag, cache_index=cache_index, offset=offset)
+        lock = self.locks[cache_index & self.stripe_mask]
+        lock.acquire()
+        for c in self.remote_sharers(id, tag, cache_index):
+            self.trackers[id].track_update(updates=1)
+            self.deliver_word(source=BlockSource.REMOTE_CACHE, op=MemOperation.BUS_UPDATE_UPDATE, target_id=c.id, tag=tag, cache_index=cache_index, offset=offset, requester_id=id)
 
-        self.lock.release()
+        lock.release()
 
     def flush_request(self, id, tag, cache_index, offset):
-        self.lock.acquire()
-        wrote_back = False
-        for c in self.caches:
-            if c.id != id and c.find_block(tag, cache_index) > -1:
-                self.tracker.track_invalidation(1)                
-                wrote = c.flush(tag, cache_index, offset, wrote_back)
-                if wrote:
-                    wrote_back = True
-
-        self.lock.release()
-    
+        lock = self.locks[cache_index & self.stripe_mask]
+        lock.acquire()
+        self.flush_all(id, tag, cache_index, offset)
+        lock.release()
+
     ########## Utility
     def flush_all(self, id, tag, cache_index, offset):
         wrote_back = False
-        for c in self.caches:
-            if c.id != id and c.find_block(tag, cache_index) > -1:
-                self.tracker.track_invalidation(1)
-                wrote = c.flush(tag, cache_index, offset, wrote_back)
-                if wrote:
-                    wrote_back = True
+        for c in self.remote_sharers(id, tag, cache_index):
+            self.trackers[id].track_invalidation(1)
+            wrote = c.flush(tag, cache_index, offset, wrote_back)
+            if wrote:
+                wrote_back = True
 
     def deliver_block(self, source: BlockSource, op: MemOperation, target_id: int, tag: int, cache_index: int, offset: int):
         # self.log(f'Delivering block from {source} to {target_id}')
-        for c in self.caches:
-            if c.id == target_id:
-                c.receive_block_from_bus(source, op, tag, cache_index, offset)
-                self.tracker.track_traffic(word_size=self.cache_config.word_size, words=int(self.cache_config.block_size / self.cache_config.word_size))
-                return
+        self.caches_by_id[target_id].receive_block_from_bus(source, op, tag, cache_index, offset)
+        self.trackers[target_id].track_traffic(word_size=self.cache_config.word_size, words=int(self.cache_config.block_size / self.cache_config.word_size))
 
-    def deliver_word(self, source: BlockSource, op: MemOperation, target_id: int, tag: int, cache_index: int, offset: int):
+    def deliver_word(self, source: BlockSource, op: MemOperation, target_id: int, tag: int, cache_index: int, offset: int, requester_id: int):
         # self.log(f'Delivering word from {source} to {target_id}')
-        for c in self.caches:
-            if c.id == target_id:
-                c.receive_word_from_bus(source, op, tag, cache_index, offset)
-                self.tracker.track_traffic(word_size=self.cache_config.word_size, words=1)
-                return
+        self.caches_by_id[target_id].receive_word_from_bus(source, op, tag, cache_index, offset)
+        self.trackers[requester_id].track_traffic(word_size=self.cache_config.word_size, words=1)
+
+    """
+    shard_trackers: gives each core its own BusTracker, so cores running concurrently never update the same counters
+    """
+    def shard_trackers(self) -> None:
+        for id in self.trackers:
+            self.trackers[id] = BusTracker()
+
+    """
+    merge_trackers: adds every core's BusTracker into {tracker}, and points the cores back at it
+    """
+    def merge_trackers(self) -> None:
+        for id, tracker in self.trackers.items():
+            if tracker is not self.tracker:
+                for name, value in vars(tracker).items():
+                    setattr(self.tracker, name, getattr(self.tracker, name) + value)
+            self.trackers[id] = self.tracker
 
     def log(self, message: str):
         print(f'--- BUS: {message}')
@@ -173,4 +201,4 @@ class Bus:
     def print_stats(self):
         print(f'##### STATS FOR SHARED BUS #####')
         print(f'Data traffic: {self.tracker.data_traffic} bytes')
-        print(f'Number of invalidations or updates: {self.tracker.num_invalidation + self.tracker.num_update}')
\ No newline at end of file
+        print(f'Number of invalidations or updates: {self.tracker.num_invalidation + self.tracker.num_update}')
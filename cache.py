@@ -1,99 +1,58 @@
+import sys
+from array import array
 from enums import BlockState, MemOperation, BlockSource, Protocol
 from tracker import CoreTracker
+from transitions import TRANSITION_TABLES
+from replacement import make_policy
 
 """
 CacheConfig: structure for cache configuration
 """
 class CacheConfig:
-    def __init__(self, size: int, associativity: int, block_size: int, word_size: int, protocol: Protocol) -> None:
+    def __init__(self, size: int, associativity: int, block_size: int, word_size: int, protocol: Protocol, replacement: str = 'lru', seed: int = 0) -> None:
         self.size = size
         self.associativity = associativity
         self.block_size = block_size
         self.word_size = word_size
         self.protocol = protocol
+        self.replacement = replacement     # Replacement policy: lru, plru, fifo or random (see replacement.py)
+        self.seed = seed                   # Seed of the random replacement policy
+
+# Block states are stored as BlockState values. BLOCK_STATES maps a value back to its BlockState
+BLOCK_STATES = [None] * (max(state.value for state in BlockState) + 1)
+for state in BlockState:
+    BLOCK_STATES[state.value] = state
+
+MODIFIED = BlockState.MODIFIED.value
+SHARED = BlockState.SHARED.value
+INVALID = BlockState.INVALID.value
+OWNED = BlockState.OWNED.value
 
 """
-CacheBlock: Represents a cache block with size {block_size} and has {block_size / word_size} entries
-- Each cache block has a state (MESI)
-- Each block keeps track of whether it is least recently used (lru)
+CacheSet: the {associativity} blocks of one set, stored as compact arrays indexed by way
+- tags: address tag of each block
+- states: BlockState value of each block. We can consider INVALID as not occupied
+- ways: tag -> way of every valid block, so a lookup costs the same whatever the associativity
+- replacement: the replacement policy's state for this set (e.g. recency order for LRU)
+Only Cache changes a set, so that its tag index and the bus directory stay in step with the states.
 """
-class CacheBlock:
-    def __init__(self, block_size: int, word_size: int) -> None:
-        self.state = BlockState.INVALID     # We can consider INVALID as not occupied
-        self.last_used = 0                  # Gets updated for every load/store operation. For LRU implementation
-        self.tag = 0                        # Address tag
-
-        entry_num = int(block_size / word_size)  # default: 32 / 4 = 8
-        self.entries = []
-        for i in range(0, entry_num):
-            self.entries.append(0)
-    
-    def is_invalid(self):
-        return self.state == BlockState.INVALID
-
-    def is_shared(self):
-        return self.state == BlockState.SHARED
-    
-    def is_private(self):
-        return self.state == BlockState.EXCLUSIVE or self.state == BlockState.MODIFIED
-
-    def set_last_used(self, new_last_used: int):
-        self.last_used = new_last_used
-    
-    """
-    Simulate cache's state machine for MESI / DRAGON
-    """
-    def get_next_state(self, op: MemOperation, source: BlockSource) -> BlockState:
-        ##################### Invalidation-based protocol
-        if op == MemOperation.PR_INVALIDATE_LOAD:
-            if self.state == BlockState.INVALID and source == BlockSource.MEMORY:
-                return BlockState.EXCLUSIVE
-            elif self.state == BlockState.INVALID and source == BlockSource.REMOTE_CACHE:
-                return BlockState.SHARED
-        elif op == MemOperation.PR_INVALIDATE_STORE:
-            return BlockState.MODIFIED
-        elif op == MemOperation.BUS_INVALIDATE_LOAD:
-            if self.state == BlockState.EXCLUSIVE or self.state == BlockState.MODIFIED:
-                return BlockState.SHARED
-        ##################### MOESI protocol
-        elif op == MemOperation.BUS_MOESI_LOAD:
-            if self.state == BlockState.EXCLUSIVE:
-                return BlockState.SHARED
-            elif self.state == BlockState.MODIFIED:
-                return BlockState.OWNED
-        elif op == MemOperation.BUS_LOAD_EXCLUSIVE:
-            return BlockState.INVALID
-        ##################### Update-based protocol
-        elif op == MemOperation.PR_LOAD_MISS:
-            if self.state == BlockState.INVALID and source == BlockSource.MEMORY:
-                return BlockState.EXCLUSIVE
-            elif self.state == BlockState.INVALID and source == BlockSource.REMOTE_CACHE:
-                return BlockState.SHARED_CLEAN
-        elif op == MemOperation.PR_STORE_MISS:
-            if source == BlockSource.MEMORY:
-                return BlockState.MODIFIED
-            elif source == BlockSource.REMOTE_CACHE:
-                return BlockState.SHARED_MODIFIED
-        elif op == MemOperation.PR_UPDATE_STORE:
-            if self.state == BlockState.EXCLUSIVE:
-                return BlockState.MODIFIED
-            elif self.state == BlockState.SHARED_CLEAN:
-                return BlockState.SHARED_MODIFIED       # Achieve ownership
-        elif op == MemOperation.BUS_UPDATE_LOAD:
-            if self.state == BlockState.EXCLUSIVE:
-                return BlockState.SHARED_CLEAN
-            elif self.state == BlockState.MODIFIED:
-                return BlockState.MODIFIED
-        elif op == MemOperation.BUS_UPDATE_UPDATE:
-            if self.state == BlockState.SHARED_MODIFIED:
-                return BlockState.SHARED_CLEAN          # Give up ownership
-        
-        return self.state
+class CacheSet:
+    __slots__ = ('tags', 'states', 'ways', 'replacement')
+
+    def __init__(self, associativity: int, replacement) -> None:
+        self.tags = array('Q', bytes(8 * associativity))
+        self.states = bytearray([INVALID]) * associativity
+        self.ways = {}
+        self.replacement = replacement
+
+    def footprint(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.tags) + sys.getsizeof(self.states) + sys.getsizeof(self.ways) + sys.getsizeof(self.replacement)
 
 """
 Cache: Represents an L1 Cache
-- Cache has {size / block_size} cache blocks. They are divided into { associativity } sets of {size / block_sizse / associativity} blocks
-- Cache should use LRU protocol
+- Cache has {size / block_size} cache blocks. They are divided into {size / block_size / associativity} sets of { associativity } blocks
+- A set is only allocated when a block is first loaded into it. Until then it is None and every lookup in it misses
+- Victims are chosen by the replacement policy of the config, LRU by default
 """
 class Cache:
     def __init__(self, id: int, cache_config: CacheConfig, tracker: CoreTracker) -> None:
@@ -101,215 +60,195 @@ class Cache:
         self.id = id
         self.tracker = tracker
 
-        # For LRU implementation. Each cache block receives a new last_used each load/store
-        self.num_operation = 0
+        # Dense state machine of the protocol: transitions[op][state][source] -> next state
+        self.transitions = TRANSITION_TABLES[cache_config.protocol]
+
+        # Replacement policy, told about every access so it can choose victims. Seeded per cache for random replacement
+        self.policy = make_policy(cache_config.replacement, cache_config.associativity, seed=cache_config.seed + id)
+
+        # Snoop filter of the bus this cache is attached to (see Bus.add_cache), told about every fill and invalidation
+        self.directory = None
 
-        self.blocks = []
         num_sets = int(self.config.size / self.config.block_size / self.config.associativity)
-        for set in range(0, num_sets):
-            # 64 sets of 2 cache blocks
-            self.blocks.append([])
-            for _ in range(0, self.config.associativity):
-                self.blocks[set].append(CacheBlock(self.config.block_size, self.config.word_size))
+        self.sets = [None] * num_sets
 
-       
+    """
+    next_state: Simulate cache's state machine for MESI / MOESI / DRAGON with one table lookup
+    """
+    def next_state(self, state: int, op: MemOperation, source: BlockSource) -> int:
+        return self.transitions[op.value][state][source.value]
+
+    def get_set(self, cache_index) -> CacheSet:
+        cache_set = self.sets[cache_index]
+        if cache_set is None:
+            cache_set = CacheSet(self.config.associativity, self.policy.new_set())
+            self.sets[cache_index] = cache_set
+        return cache_set
+
+    """
+    set_state: changes the state of block {way}. A block becoming INVALID leaves the tag index and the bus directory
+    """
+    def set_state(self, cache_set: CacheSet, cache_index, way: int, state: int) -> None:
+        cache_set.states[way] = state
+        if state == INVALID:
+            tag = cache_set.tags[way]
+            if cache_set.ways.pop(tag, None) is not None and self.directory is not None:
+                self.directory.remove(tag, cache_index, self.id)
 
     """
-    A hit happens when blocks[cache_index] returns a set of blocks, in which one has tag === given tag AND that block is not invalid
+    footprint: bytes used by this cache's storage, and how many of its sets have been allocated
+    """
+    def footprint(self):
+        allocated = [cache_set for cache_set in self.sets if cache_set is not None]
+        return sys.getsizeof(self.sets) + sum(cache_set.footprint() for cache_set in allocated), len(allocated)
+
+    """
+    A hit happens when sets[cache_index] has a block with tag === given tag AND that block is not invalid
     Returns index of block in the given set
     """
     def find_block(self, tag, cache_index) -> int:
-        for block_id, block in enumerate(self.blocks[cache_index]):
-            if block.tag == tag and not block.is_invalid():
-                return block_id
-        
-        return -1
+        cache_set = self.sets[cache_index]
+        if cache_set is None:
+            return -1
+
+        return cache_set.ways.get(tag, -1)
 
     """
     processor_load: load instruction issued by processor
-        If hit: report hit to processor. Set block's last used to num_operation.
+        If hit: report hit to processor. Tell the replacement policy the block was used.
         If miss: Report miss to processor
-        num_operation++
     """
     def processor_load(self, tag, cache_index, offset) -> BlockState:
         # self.log(f'Handling processor load at tag {tag}, index {cache_index} and offset {offset}')
         hit_block = self.find_block(tag, cache_index)
         if hit_block != -1: # Hit!
-            self.blocks[cache_index][hit_block].last_used = self.num_operation
-            self.num_operation = self.num_operation + 1
+            cache_set = self.sets[cache_index]
+            self.policy.touch(cache_set.replacement, hit_block)
             # Track hit and access
+            state = BLOCK_STATES[cache_set.states[hit_block]]
             self.tracker.track_hit()
-            self.tracker.incr_data_access(state=self.blocks[cache_index][hit_block].state)
-            return self.blocks[cache_index][hit_block].state
+            self.tracker.incr_data_access(state=state)
+            return state
 
         self.tracker.incr_miss()
-        self.num_operation = self.num_operation + 1
         return BlockState.INVALID
 
     """
     processor_store: store instruction issued by processor
         If hit: report hit to processor. Use state machine to change state accordingly.
-        If miss: Handle LRU accordingly. Report miss to processor.
-        Set block's last used to num_operation. num_operation++
+        If miss: Report miss to processor.
+        Tell the replacement policy the block was used.
     """
     def processor_invalidate_store(self, tag, cache_index, offset):
-        hit_block = self.find_block(tag, cache_index)
-        if hit_block != -1: # Hit!
-            target_block = self.blocks[cache_index][hit_block]
-            target_block.last_used = self.num_operation
-            self.num_operation = self.num_operation + 1
+        return self.processor_store(tag, cache_index, MemOperation.PR_INVALIDATE_STORE)
 
-            # Store old state to return (shared, modified, exclusive)
-            old_state = target_block.state
-            
-            # hit store logic
-            target_block.state = target_block.get_next_state(op=MemOperation.PR_INVALIDATE_STORE, source=BlockSource.LOCAL_CACHE)
-
-            # Track hit
-            self.tracker.track_hit()
-            self.tracker.incr_data_access(old_state)
-            return old_state
-
-        self.tracker.incr_miss()
-        self.num_operation = self.num_operation + 1
-        return BlockState.INVALID
-    
     def processor_update_store(self, tag, cache_index, offset):
+        return self.processor_store(tag, cache_index, MemOperation.PR_UPDATE_STORE)
+
+    def processor_store(self, tag, cache_index, op: MemOperation) -> BlockState:
         hit_block = self.find_block(tag, cache_index)
         if hit_block != -1: # Hit!
-            target_block = self.blocks[cache_index][hit_block]
-            target_block.last_used = self.num_operation
-            self.num_operation = self.num_operation + 1
+            cache_set = self.sets[cache_index]
+            self.policy.touch(cache_set.replacement, hit_block)
+
+            # Store old state to return (shared, modified, exclusive / shared_clean, shared_modified, dirty)
+            old_state = cache_set.states[hit_block]
 
-            # Store old state to return (exclusive, shared_clean, shared_modified, dirty)
-            old_state = target_block.state
-            
             # hit store logic
-            target_block.state = target_block.get_next_state(op=MemOperation.PR_UPDATE_STORE, source=BlockSource.LOCAL_CACHE)
+            cache_set.states[hit_block] = self.next_state(old_state, op, BlockSource.LOCAL_CACHE)
 
             # Track hit
             self.tracker.track_hit()
-            self.tracker.incr_data_access(old_state)
-            return old_state
+            self.tracker.incr_data_access(BLOCK_STATES[old_state])
+            return BLOCK_STATES[old_state]
 
         self.tracker.incr_miss()
-        self.num_operation = self.num_operation + 1
         return BlockState.INVALID
 
     """
-    pr_read_miss: bus_load but a different new state
+    bus_snoop: a remote cache's request reached this cache through the bus
+        If you have the block: return True. Use state machine to change state accordingly.
+        If you don't: return False. No state change
     """
-    def bus_update_load(self, tag, cache_index, offset):
+    def bus_snoop(self, tag, cache_index, op: MemOperation, count_access: bool) -> bool:
         block_index = self.find_block(tag, cache_index)
         if block_index == -1:
             return False
-        
-        block = self.blocks[cache_index][block_index]
-        self.tracker.incr_data_access(block.state)
-        block.state = block.get_next_state(op=MemOperation.BUS_UPDATE_LOAD, source=BlockSource.REMOTE_CACHE)
-        block.last_used = self.num_operation
-        
-
-        self.num_operation += 1
+
+        cache_set = self.sets[cache_index]
+        if count_access:
+            self.tracker.incr_data_access(BLOCK_STATES[cache_set.states[block_index]])
+        self.set_state(cache_set, cache_index, block_index, self.next_state(cache_set.states[block_index], op, BlockSource.REMOTE_CACHE))
+        self.policy.touch(cache_set.replacement, block_index)
         return True
 
+    """
+    pr_read_miss: bus_load but a different new state
+    """
+    def bus_update_load(self, tag, cache_index, offset):
+        return self.bus_snoop(tag, cache_index, MemOperation.BUS_UPDATE_LOAD, count_access=True)
+
     """
     bus_load: Another remote cache is asking to read a block that you might have
-        If you have it: return True. Use state machine to change state accordingly.
-        If you don't: return False. No state change
     """
     def bus_invalidate_load(self, tag, cache_index, offset):
         # self.log(f'Handling bus load at tag {tag}, index {cache_index} and offset {offset}')
-        block_index = self.find_block(tag, cache_index)
-        if block_index == -1:
-            return False
-        
-        block = self.blocks[cache_index][block_index]
-        self.tracker.incr_data_access(block.state)
-        block.state = block.get_next_state(op=MemOperation.BUS_INVALIDATE_LOAD, source=BlockSource.REMOTE_CACHE)
-        block.last_used = self.num_operation
-
-        self.num_operation += 1
-        return True
+        return self.bus_snoop(tag, cache_index, MemOperation.BUS_INVALIDATE_LOAD, count_access=True)
 
     def bus_invalidate_load_exclusive(self, tag, cache_index, offset):
         # self.log(f'Handling bus load exclusive at tag {tag}, index {cache_index} and offset {offset}')
-        block_index = self.find_block(tag, cache_index)
-        if block_index == -1:
-            return False
-        
-        block = self.blocks[cache_index][block_index]
-
-        # self.tracker.incr_data_access(block.state) # Invalidation not counted as access
-        block.last_used = self.num_operation
-        block.state = block.get_next_state(op=MemOperation.BUS_LOAD_EXCLUSIVE, source=BlockSource.REMOTE_CACHE)
-
-        self.num_operation += 1
-        return True
+        # Invalidation not counted as access
+        return self.bus_snoop(tag, cache_index, MemOperation.BUS_LOAD_EXCLUSIVE, count_access=False)
 
     def bus_moesi_invalidate_load(self, tag, cache_index, offset):
         # self.log(f'Handling bus moesi invalidate load at tag {tag}, index {cache_index} and offset {offset}')
-        block_index = self.find_block(tag, cache_index)
-        if block_index == -1:
-            return False
-        
-        block = self.blocks[cache_index][block_index]
-        self.tracker.incr_data_access(block.state)
-        block.state = block.get_next_state(op=MemOperation.BUS_MOESI_LOAD, source=BlockSource.REMOTE_CACHE)
-        block.last_used = self.num_operation
-
-        self.num_operation += 1
-        return True
+        return self.bus_snoop(tag, cache_index, MemOperation.BUS_MOESI_LOAD, count_access=True)
 
     def flush(self, tag, cache_index, offset, wrote_back):
-        print("----- Flushing")
         block_index = self.find_block(tag, cache_index)
         if block_index == -1:
             return False
-        
-        block = self.blocks[cache_index][block_index]
-        if self.config.protocol == Protocol.MOESI and block.state == BlockState.OWNED:
+
+        cache_set = self.sets[cache_index]
+        state = cache_set.states[block_index]
+        if self.config.protocol == Protocol.MOESI and state == OWNED:
             self.tracker.track_evict()
 
-        if self.config.protocol == Protocol.MESI and (block.state == BlockState.MODIFIED or block.state == BlockState.SHARED) and not wrote_back: # block is written back to memory as it is invalidated. Has to.
+        if self.config.protocol == Protocol.MESI and (state == MODIFIED or state == SHARED) and not wrote_back: # block is written back to memory as it is invalidated. Has to.
             self.tracker.track_evict()
-        
-        block.state = BlockState.INVALID
-        block.last_used = self.num_operation
+
+        self.set_state(cache_set, cache_index, block_index, INVALID)
         return not wrote_back
 
     """
-    receive_block_from_bus: Adds new block to cache. Handle LRU if needed.
-    Let cache block decide its own next state
+    receive_block_from_bus: Adds new block to cache. Evicts the replacement policy's victim if the set is full.
+    Let the state machine decide the block's next state
     """
     def receive_block_from_bus(self, source: BlockSource, op: MemOperation, tag, cache_index, offset):
-        target_blk = None
+        cache_set = self.get_set(cache_index)
+        states = cache_set.states
+
         # Find invalid cache block to insert itself there
-        for block in self.blocks[cache_index]:
-            if block.is_invalid():
-                target_blk = block
-                break
-        
-        # If no invalid blocks found, find lru block
-        if target_blk == None:
-            min_last_used = 2 ** 31 + (2 ** 31 - 1)
-            for block in self.blocks[cache_index]:
-                if block.last_used < min_last_used:
-                    target_blk = block
-                    min_last_used = block.last_used
+        target_blk = states.find(INVALID)
+
+        # If no invalid blocks found, evict the policy's victim
+        if target_blk == -1:
+            target_blk = self.policy.victim(cache_set.replacement)
 
             # Invalidate chosen block
-            # self.log(f'Evicting block with tag {target_blk.tag}')
+            # self.log(f'Evicting block with tag {cache_set.tags[target_blk]}')
             self.tracker.track_evict()
-            target_blk.state = BlockState.INVALID
-        
+            self.set_state(cache_set, cache_index, target_blk, INVALID)
+
         # Load block into cache
-        target_blk.tag = tag
-        target_blk.last_used = self.num_operation
+        cache_set.tags[target_blk] = tag
+        cache_set.ways[tag] = target_blk
+        if self.directory is not None:
+            self.directory.add(tag, cache_index, self.id)
+        self.policy.fill(cache_set.replacement, target_blk)
 
         # Set new state
-        target_blk.state = target_blk.get_next_state(op=op, source=source)
-        self.num_operation = self.num_operation + 1
+        self.set_state(cache_set, cache_index, target_blk, self.next_state(states[target_blk], op, source))
 
         # Track stall time
         if source == BlockSource.REMOTE_CACHE:
@@ -321,19 +260,17 @@ class Cache:
         blk_index = self.find_block(tag=tag, cache_index=cache_index)
         if blk_index == -1:
             return
-        
-        target_blk = self.blocks[cache_index][blk_index]
-        
-        # Set last_used
-        target_blk.last_used = self.num_operation
+
+        cache_set = self.sets[cache_index]
+
+        self.policy.touch(cache_set.replacement, blk_index)
 
         # Set new state
-        target_blk.state = target_blk.get_next_state(op=op, source=source)
-        self.num_operation = self.num_operation + 1
+        self.set_state(cache_set, cache_index, blk_index, self.next_state(cache_set.states[blk_index], op, source))
 
         # Track stall time
         self.tracker.track_load_words_from_remote_cache(words=1)
 
 
     def log(self, message: str):
-        print(f'CACHE {self.id}: {message}')
\ No newline at end of file
+        print(f'CACHE {self.id}: {message}')
@@ -0,0 +1,87 @@
+import copy
+import os
+import pickle
+
+"""
+checkpoint: saves and restores the full state of an event-scheduled System
+
+A checkpoint holds every cache's sets (block tags, states and replacement order) and replacement policy, every
+CoreTracker and the BusTracker, the bus directory, and how many instructions each core has run. Resuming
+replays nothing: each core skips the instructions it already ran, and the cycle-ordered scheduler picks up the
+same interleaving, so a resumed run ends with exactly the stats of an uninterrupted one.
+
+Checkpoints need the event scheduler: threaded cores cannot be stopped between two instructions.
+One checkpoint can be restored into any number of Systems, e.g. to warm the caches once and then run
+several experiments from the warmed state.
+"""
+
+CHECKPOINT_VERSION = 1
+CONFIG_FIELDS = ['size', 'associativity', 'block_size', 'word_size', 'protocol', 'replacement', 'seed']
+
+"""
+capture_state: snapshot of {system} as a dict of plain picklable objects
+{run} describes how the traces were fed (trace name, files, offsets...): it must match when resuming
+"""
+def capture_state(system, run=None) -> dict:
+    config = system.cores[0].cache.config
+    scheduler = system.event_scheduler
+    return copy.deepcopy({
+        'version': CHECKPOINT_VERSION,
+        'config': {field: getattr(config, field) for field in CONFIG_FIELDS},
+        'processor_num': len(system.cores),
+        'run': run,
+        'executed': scheduler.executed,
+        'positions': dict(scheduler.positions),
+        'cores': [{'tracker': vars(core.tracker), 'sets': core.cache.sets, 'policy': core.cache.policy} for core in system.cores],
+        'bus_tracker': vars(system.bus.tracker),
+        'directory': system.bus.directory.lines,
+    })
+
+"""
+restore_state: loads {state} into {system}, which must have been built with the same configuration
+Call it before the traces are fed, so each core starts where the checkpoint left it. {state} is not modified.
+"""
+def restore_state(system, state: dict, run=None) -> None:
+    if system.scheduler != 'event':
+        raise ValueError('checkpoints need the event scheduler')
+
+    config = system.cores[0].cache.config
+    expected = {'config': {field: getattr(config, field) for field in CONFIG_FIELDS}, 'processor_num': len(system.cores), 'run': run}
+    for key, value in expected.items():
+        if state[key] != value:
+            raise ValueError(f'checkpoint {key} {state[key]} does not match {value}')
+
+    state = copy.deepcopy(state)
+    for core, core_state in zip(system.cores, state['cores']):
+        vars(core.tracker).update(core_state['tracker'])
+        core.cache.sets = core_state['sets']
+        core.cache.policy = core_state['policy']
+    vars(system.bus.tracker).update(state['bus_tracker'])
+    system.bus.directory.lines = state['directory']
+    system.event_scheduler.executed = state['executed']
+    system.event_scheduler.positions = state['positions']
+
+"""
+reset_stats: zeroes every tracker of {system}, keeping the caches as they are (e.g. after warming them)
+"""
+def reset_stats(system) -> None:
+    for core in system.cores:
+        vars(core.tracker).update(vars(type(core.tracker)()))
+    vars(system.bus.tracker).update(vars(type(system.bus.tracker)()))
+
+"""
+save_checkpoint: writes the state of {system} to {filename}. The file is replaced atomically, so an
+interrupted save leaves the previous checkpoint intact
+"""
+def save_checkpoint(system, filename: str, run=None) -> None:
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(capture_state(system, run), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, filename)
+
+def load_checkpoint(filename: str) -> dict:
+    with open(filename, 'rb') as f:
+        state = pickle.load(f)
+    if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f'{filename} is not a version {CHECKPOINT_VERSION} checkpoint')
+    return state
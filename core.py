@@ -1,68 +1,143 @@
 from bus import Bus
 from cache import Cache
 from tracker import CoreTracker
-from enums import Instruction, BlockSource, BlockState, Protocol
-import math
+from address_mapper import AddressMapper
+from enums import Instruction, BlockSource, BlockState, MemOperation, Protocol
+
+LOAD = Instruction.LOAD.value
+STORE = Instruction.STORE.value
+OTHERS = Instruction.OTHERS.value
+
+# Load and store handlers of each protocol. Protocol.NONE has none: its cores ignore their traces.
+PROTOCOL_HANDLERS = {
+    Protocol.MESI: ('handle_invalidate_load', 'handle_invalidation_store'),
+    Protocol.MOESI: ('handle_moesi_load', 'handle_invalidation_store'),
+    Protocol.DRAGON: ('handle_update_load', 'handle_update_store'),
+}
+
+# Batch of a core running alone: every instruction of its trace (see Core.steps)
+UNBOUNDED = (float('inf'), float('inf'))
 
 class Core:
-    def __init__(self, id, cache: Cache, bus: Bus, tracker: CoreTracker, protocol: Protocol) -> None:
+    def __init__(self, id, cache: Cache, bus: Bus, tracker: CoreTracker, protocol: Protocol, mapper: AddressMapper) -> None:
         self.protocol = protocol
         self.bus = bus
         self.cache = cache
         self.tracker = tracker
         self.id = id
+        self.mapper = mapper
+
+        # Bind this protocol's handlers once instead of checking the protocol on every instruction
+        self.handlers = None
+        if protocol in PROTOCOL_HANDLERS:
+            self.handlers = [getattr(self, name) for name in PROTOCOL_HANDLERS[protocol]]
+
+        # (stop cycles, limit) of the next batch of steps
+        self.batch = UNBOUNDED
+
+        # Serves each miss with its bus request. Replaced by bypass_private_lines
+        self.fill_miss = self.request_miss
+        self.shared_lines = None
+        self.locked_fills = False
+
+    """
+    bypass_private_lines(self, shared_lines, locked): Serves misses on lines outside {shared_lines} from memory directly
+    Only this core accesses such a line, so no other cache can hold it: the bus request would snoop nobody and
+    fill the block from memory. The private handlers do exactly that fill, with the same stats, and skip the
+    request, its snoops and its lock. Hits and misses on shared lines go the usual way. With {locked}, the fill
+    still holds the bus lock of its set, since evicting a block can change a shared line's sharers.
+    A private line is filled in E or M and no other core ever reads it, so its hits never need the bus either.
+    """
+    def bypass_private_lines(self, shared_lines, locked: bool) -> None:
+        if self.handlers is None:
+            return
+        self.shared_lines = shared_lines
+        self.locked_fills = locked
+        self.fill_miss = self.fill_private_miss
 
+    def is_shared(self, tag, cache_index) -> bool:
+        return (tag << self.mapper.index_bits) | cache_index in self.shared_lines
+
+    """
+    request_miss(self, request, op, tag, cache_index, offset): Serves a miss with the bus {request}, returns its source
+    Handlers pass the request looked up on the bus when the miss happens, so wrappers (profiler, event log) see it.
+    """
+    def request_miss(self, request, op: MemOperation, tag, cache_index, offset) -> BlockSource:
+        return request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+
+    """
+    fill_private_miss(self, request, op, tag, cache_index, offset): request_miss, but a private line is filled by fill_private
+    """
+    def fill_private_miss(self, request, op: MemOperation, tag, cache_index, offset) -> BlockSource:
+        if self.is_shared(tag, cache_index):
+            return request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+        self.fill_private(op, tag, cache_index, offset)
+        return BlockSource.MEMORY
+
+    """
+    fill_private(self, op, tag, cache_index, offset): Fills a private line from memory, as a bus request finding no sharer
+    """
+    def fill_private(self, op: MemOperation, tag, cache_index, offset) -> None:
+        bus = self.bus
+        if self.locked_fills:
+            with bus.locks[cache_index & bus.stripe_mask]:
+                bus.deliver_block(source=BlockSource.MEMORY, op=op, target_id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+        else:
+            bus.deliver_block(source=BlockSource.MEMORY, op=op, target_id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+
+    """
+    trace(self, data): Runs the instructions in {data}, an iterable of (labels, values) chunks (see trace_reader)
+    """
     def trace(self, data) -> None:
-        for label, value in data:
-            if self.protocol == Protocol.MESI:
-                if label == Instruction.LOAD.value:
-                    self.handle_invalidate_load(value)
-                elif label == Instruction.STORE.value:
-                    self.handle_invalidation_store(value)
-                elif label == Instruction.OTHERS.value:
-                    self.handle_others(value)
-                else:
-                    self.log("Invalid operation!")
-            elif self.protocol == Protocol.MOESI:
-                if label == Instruction.LOAD.value:
-                    self.handle_moesi_load(value)
-                elif label == Instruction.STORE.value:
-                    self.handle_invalidation_store(value)
-                elif label == Instruction.OTHERS.value:
-                    self.handle_others(value)
-                else:
-                    self.log("Invalid operation!")
-            elif self.protocol == Protocol.DRAGON:
-                if label == Instruction.LOAD.value:
-                    self.handle_update_load(value)
-                elif label == Instruction.STORE.value:
-                    self.handle_update_store(value)
-                elif label == Instruction.OTHERS.value:
-                    self.handle_others(value)
-                else:
-                    self.log("Invalid operation!")
+        self.batch = UNBOUNDED
+        for _ in self.steps(data):
+            pass
 
-    def process_address(self, address: str):
-        # Convert address to int
-        address = int(address, 16)
+    """
+    steps(self, data): Generator running the instructions of {data} in batches, so a scheduler can interleave cores
+    Each batch runs until this core's overall_cycles reach the stop cycles of {batch}, or its limit of instructions
+    ran, then yields how many ran. {batch} is read again before the next one.
+    Addresses of a whole chunk are decoded up front, so handlers receive ready-made tag, index and offset
+    """
+    def steps(self, data):
+        if self.handlers is None:
+            return
 
-        num_block_entry = int(self.cache.config.block_size / self.cache.config.word_size)                   # 8
-        num_set = int(self.cache.config.size / self.cache.config.block_size / self.cache.config.associativity)    # 64
+        handle_load, handle_store = self.handlers
+        handle_others = self.handle_others
+        stop_cycles, limit = self.batch
+        ran = 0
+        for labels, values in data:
+            # Sampling and regions of interest swap the tracker between chunks (see sampling.py and roi.py)
+            tracker = self.tracker
+            tags, indices, offsets = self.mapper.decode_chunk(values)
+            for label, value, tag, cache_index, offset in zip(labels, values, tags, indices, offsets):
+                if label == LOAD:
+                    handle_load(tag, cache_index, offset)
+                elif label == STORE:
+                    handle_store(tag, cache_index, offset)
+                elif label == OTHERS:
+                    handle_others(value)
+                else:
+                    self.log("Invalid operation!")
+                ran += 1
+                if ran >= limit or tracker.overall_cycles >= stop_cycles:
+                    yield ran
+                    stop_cycles, limit = self.batch
+                    ran = 0
+        if ran:
+            yield ran
 
-        offset = address % (num_block_entry)
-        cache_index = int(address / num_block_entry) % num_set
-        tag = int(address / (2 ** (math.sqrt(num_block_entry) + math.sqrt(num_set))))
+    def process_address(self, address: int):
+        return self.mapper.decode(address)
 
-        return tag, cache_index, offset
-    
     """
-    handle_invalidate_load(self, address): Processor issues a PrRd on its own L1 cache.
+    handle_invalidate_load(self, tag, cache_index, offset): Processor issues a PrRd on its own L1 cache.
     If hit: Do nothing
     If PrRd is a miss: issue BusRd command to core 1 on shared bus
     End: update tracker
     """
-    def handle_invalidate_load(self, address) -> None:
-        tag, cache_index, offset = self.process_address(address=address)
+    def handle_invalidate_load(self, tag, cache_index, offset) -> None:
         source = BlockSource.LOCAL_CACHE
         state = self.cache.processor_load(tag=tag, cache_index=cache_index, offset=offset)
         if state != BlockState.INVALID:
@@ -70,17 +145,16 @@ class Core:
             pass
         else:
             # self.log(f"Processor load missed! Tag {tag} index {cache_index}")
-            source = self.bus.bus_load_request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+            source = self.fill_miss(self.bus.bus_load_request, MemOperation.PR_INVALIDATE_LOAD, tag, cache_index, offset)
         
         self.tracker.incr_load()
 
     """
-    handle_invalidation_store(self, address): Processor issues a PrWr on its own L1 cache.
+    handle_invalidation_store(self, tag, cache_index, offset): Processor issues a PrWr on its own L1 cache.
     If hit: Issue bus command to invalidate or update everything else DEPENDING ON PROTOCOL
     If miss: issue BusRdX command to get exclusive access to 1 block
     """
-    def handle_invalidation_store(self, address) -> None:
-        tag, cache_index, offset = self.process_address(address=address)
+    def handle_invalidation_store(self, tag, cache_index, offset) -> None:
         source = BlockSource.LOCAL_CACHE
         state = self.cache.processor_invalidate_store(tag=tag, cache_index=cache_index, offset=offset)
         # hit but exclusive / modified: ignore
@@ -89,7 +163,7 @@ class Core:
             self.bus.flush_request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
         elif state == BlockState.INVALID: # miss
             # self.log(f"Processor store miss! Tag {tag} index {cache_index}")
-            source = self.bus.bus_load_exclusive_request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+            source = self.fill_miss(self.bus.bus_load_exclusive_request, MemOperation.PR_INVALIDATE_STORE, tag, cache_index, offset)
             self.cache.processor_invalidate_store(tag=tag, cache_index=cache_index, offset=offset)
         
         self.tracker.incr_store()
@@ -98,8 +172,7 @@ class Core:
     Handles moesi load
     """
 
-    def handle_moesi_load(self, address) -> None:
-        tag, cache_index, offset = self.process_address(address=address)
+    def handle_moesi_load(self, tag, cache_index, offset) -> None:
         source = BlockSource.LOCAL_CACHE
         state = self.cache.processor_load(tag=tag, cache_index=cache_index, offset=offset)
         if state != BlockState.INVALID:
@@ -107,15 +180,14 @@ class Core:
             pass
         else:
             # self.log(f"Processor load missed! Tag {tag} index {cache_index}")
-            source = self.bus.bus_moesi_load_request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+            source = self.fill_miss(self.bus.bus_moesi_load_request, MemOperation.PR_INVALIDATE_LOAD, tag, cache_index, offset)
         
         self.tracker.incr_load()
 
     """
-    def handle_update_load(self, address): Same as invalidate load, but calls a different bus request
+    def handle_update_load(self, tag, cache_index, offset): Same as invalidate load, but calls a different bus request
     """
-    def handle_update_load(self, address) -> None:
-        tag, cache_index, offset = self.process_address(address=address)
+    def handle_update_load(self, tag, cache_index, offset) -> None:
         source = BlockSource.LOCAL_CACHE
         state = self.cache.processor_load(tag=tag, cache_index=cache_index, offset=offset)
         if state != BlockState.INVALID:
@@ -123,22 +195,21 @@ class Core:
             pass
         else:
             # self.log(f"Processor load missed! Tag {tag} index {cache_index}")
-            source = self.bus.pr_load_miss_request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+            source = self.fill_miss(self.bus.pr_load_miss_request, MemOperation.PR_LOAD_MISS, tag, cache_index, offset)
 
         # Use source to keep track of cycles. should always be
         self.tracker.incr_load()
 
     """
-    handle_update_store(self, address): Update-based store. Issues a PrWr on its own L1 cache.
+    handle_update_store(self, tag, cache_index, offset): Update-based store. Issues a PrWr on its own L1 cache.
     """
-    def handle_update_store(self, address) -> None:
-        tag, cache_index, offset = self.process_address(address=address)
+    def handle_update_store(self, tag, cache_index, offset) -> None:
         source = BlockSource.LOCAL_CACHE
         state = self.cache.processor_update_store(tag=tag, cache_index=cache_index, offset=offset)
         # Ignore EXCLUSIVE, MODIFIED
         if state == BlockState.INVALID: # miss
             # self.log(f"Processor store miss! Tag {tag} index {cache_index}")
-            source = self.bus.pr_store_miss_request(id=self.id, tag=tag, cache_index=cache_index, offset=offset)
+            source = self.fill_miss(self.bus.pr_store_miss_request, MemOperation.PR_STORE_MISS, tag, cache_index, offset)
             # Request bus for ownership if not loaded from memory by calling update
             if source == BlockSource.REMOTE_CACHE:
                 self.cache.processor_update_store(tag=tag, cache_index=cache_index, offset=offset)  # Write
@@ -154,9 +225,8 @@ class Core:
     """
     handle_others(self, cycles): Basically increases overall execution cycle and compute cycle
     """
-    def handle_others(self, cycles) -> None:        
-        # parse cycles from hex to decimal
-        self.tracker.track_compute(cycles=int(cycles, 16))
+    def handle_others(self, cycles) -> None:
+        self.tracker.track_compute(cycles=cycles)
 
     def log(self, message) -> None:
         print(f'CORE {self.id}: {message}')
@@ -0,0 +1,40 @@
+from cache import CacheConfig
+
+"""
+SharerDirectory: snoop filter of the bus, mapping each line to the caches holding a valid copy of it
+- A line is identified by (tag, cache_index), packed into one int
+- Sharers are a bitmask of cache ids, so a set of sharers costs one int whatever the core count
+- Caches keep it up to date on fill, eviction and invalidation
+"""
+class SharerDirectory:
+    def __init__(self, cache_config: CacheConfig) -> None:
+        num_sets = cache_config.size // cache_config.block_size // cache_config.associativity
+        self.index_bits = num_sets.bit_length() - 1
+        self.lines = {}
+
+    def line(self, tag: int, cache_index: int) -> int:
+        return (tag << self.index_bits) | cache_index
+
+    def add(self, tag: int, cache_index: int, cache_id: int) -> None:
+        line = (tag << self.index_bits) | cache_index
+        self.lines[line] = self.lines.get(line, 0) | (1 << cache_id)
+
+    def remove(self, tag: int, cache_index: int, cache_id: int) -> None:
+        line = (tag << self.index_bits) | cache_index
+        sharers = self.lines.get(line, 0) & ~(1 << cache_id)
+        if sharers:
+            self.lines[line] = sharers
+        else:
+            self.lines.pop(line, None)
+
+    def sharers(self, tag: int, cache_index: int) -> int:
+        return self.lines.get((tag << self.index_bits) | cache_index, 0)
+
+"""
+sharer_ids: ids in the bitmask {sharers}, in increasing order
+"""
+def sharer_ids(sharers: int):
+    while sharers:
+        lowest = sharers & -sharers
+        yield lowest.bit_length() - 1
+        sharers ^= lowest
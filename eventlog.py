@@ -0,0 +1,215 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+from collections import Counter
+from enums import BlockSource, BlockState, Protocol
+
+"""
+eventlog: packed binary log of every bus transaction
+
+EventLog.attach wraps the bus request methods of a System (instance attributes, so a run without a log executes the
+usual code). Each request is then recorded as one fixed-size record:
+- cycle: the requester's overall_cycles when it issued the request
+- requester, operation (index in OPERATIONS) and source of the block (BlockSource value, NO_SOURCE for requests
+  that move no block)
+- line: the directory's (tag << index_bits) | cache_index
+- sharers before and after: bitmasks of the other caches holding the line
+- the requester's state of the line before and after (BlockState values, INVALID when absent)
+Records are packed into a bounded in-memory ring buffer and written to the file in bulk whenever it fills up.
+With {keep_last}, nothing is written until the log is closed: the ring buffer then keeps only the last {capacity}
+transactions, e.g. to see what led to a failure at the end of a long run.
+
+File layout: a header (HEADER, version, record size, core count, protocol, index bits, records dropped by
+{keep_last}), then the records, little-endian.
+
+Usage: python3 eventlog.py LOG [--core 0] [--op bus_load_request] [--line 0x1f] [--from-cycle N] [--to-cycle N]
+                           [--limit 100] [--summary]
+"""
+
+MAGIC = b'SDEV'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHBBQ')
+RECORD = struct.Struct('<QQQQHBBBB')     # cycle, line, sharers before, sharers after, requester, operation, source, state before, state after
+NO_SOURCE = 255
+DEFAULT_CAPACITY = 1 << 16               # Records buffered in memory (about 2.4 MB)
+
+OPERATIONS = ['bus_load_request', 'bus_load_exclusive_request', 'bus_moesi_load_request', 'pr_load_miss_request',
+              'pr_store_miss_request', 'bus_update_request', 'flush_request']
+
+INVALID = BlockState.INVALID.value
+
+class EventLog:
+    def __init__(self, filename: str, capacity: int = DEFAULT_CAPACITY, keep_last: bool = False) -> None:
+        if capacity <= 0:
+            raise ValueError(f'the event log capacity must be positive, not {capacity}')
+        self.filename = filename
+        self.capacity = capacity
+        self.keep_last = keep_last
+        self.buffer = bytearray(capacity * RECORD.size)
+        self.count = 0              # Records in the buffer
+        self.head = 0               # Next record slot
+        self.written = 0            # Records written to the file
+        self.dropped = 0            # Records overwritten in keep_last mode
+        self.lock = threading.Lock()
+        self.file = None
+        self.header = None
+
+    """
+    attach: logs every bus request of {system} from now on
+    """
+    def attach(self, system) -> None:
+        if len(system.cores) > 64:
+            raise ValueError(f'the event log records sharers of up to 64 cores, not {len(system.cores)}')
+        bus = system.bus
+        self.header = (len(system.cores), system.protocol.value, bus.directory.index_bits)
+        self.file = open(self.filename, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, *self.header, 0))
+        for operation, name in enumerate(OPERATIONS):
+            setattr(bus, name, self.logged(bus, getattr(bus, name), operation))
+
+    def logged(self, bus, request, operation: int):
+        directory = bus.directory
+        caches = bus.caches_by_id
+
+        def wrapper(id, tag, cache_index, offset):
+            cache = caches[id]
+            others = ~(1 << id)
+            cycle = cache.tracker.overall_cycles
+            # Snapshots under the request's own lock (reentrant), so threaded cores cannot move the line in between
+            with bus.locks[cache_index & bus.stripe_mask]:
+                sharers = directory.sharers(tag, cache_index) & others
+                state = line_state(cache, tag, cache_index)
+                source = request(id=id, tag=tag, cache_index=cache_index, offset=offset)
+                sharers_after = directory.sharers(tag, cache_index) & others
+                state_after = line_state(cache, tag, cache_index)
+            self.record(cycle, directory.line(tag, cache_index), sharers, sharers_after, id, operation,
+                        NO_SOURCE if source is None else source.value, state, state_after)
+            return source
+        return wrapper
+
+    def record(self, *fields) -> None:
+        with self.lock:
+            RECORD.pack_into(self.buffer, self.head * RECORD.size, *fields)
+            self.head += 1
+            if self.count < self.capacity:
+                self.count += 1
+            else:
+                self.dropped += 1
+            if self.head == self.capacity:
+                self.head = 0
+                if not self.keep_last:
+                    self.flush()
+
+    """
+    flush: writes the buffered records to the file in one write
+    """
+    def flush(self) -> None:
+        if self.keep_last:
+            # Oldest first: the records after head were written before those up to it
+            start = self.head if self.count == self.capacity else 0
+            view = memoryview(self.buffer)
+            self.file.write(view[start * RECORD.size:self.count * RECORD.size])
+            self.file.write(view[:start * RECORD.size])
+        else:
+            self.file.write(memoryview(self.buffer)[:self.count * RECORD.size])
+        self.written += self.count
+        self.count = 0
+        self.head = 0
+
+    def close(self) -> None:
+        with self.lock:
+            self.flush()
+            self.file.seek(0)
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, *self.header, self.dropped))
+            self.file.close()
+
+"""
+line_state: BlockState value of the line in {cache}, INVALID if it does not hold it
+"""
+def line_state(cache, tag, cache_index) -> int:
+    way = cache.find_block(tag, cache_index)
+    return INVALID if way == -1 else cache.sets[cache_index].states[way]
+
+"""
+read_log: (header dict, iterator over record tuples) of the log in {filename}
+"""
+def read_log(filename: str):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    magic, version, record_size, cores, protocol, index_bits, dropped = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f'{filename} is not a version {VERSION} event log')
+    header = {'cores': cores, 'protocol': Protocol(protocol).name, 'index_bits': index_bits, 'dropped': dropped,
+              'records': (len(data) - HEADER.size) // RECORD.size}
+    return header, RECORD.iter_unpack(memoryview(data)[HEADER.size:HEADER.size + header['records'] * RECORD.size])
+
+def source_name(source: int) -> str:
+    return '-' if source == NO_SOURCE else BlockSource(source).name
+
+def format_record(record, index_bits: int) -> str:
+    cycle, line, before, after, requester, operation, source, state_before, state_after = record
+    tag, cache_index = line >> index_bits, line & ((1 << index_bits) - 1)
+    return (f'{cycle:>12} core {requester:<3} {OPERATIONS[operation]:<27} tag {tag:#x} index {cache_index:<5} '
+            f'sharers {before:#x}->{after:#x} source {source_name(source):<12} '
+            f'{BlockState(state_before).name}->{BlockState(state_after).name}')
+
+def summarize(records, header) -> None:
+    operations, sources, cores, lines, transitions = Counter(), Counter(), Counter(), Counter(), Counter()
+    total = 0
+    for cycle, line, before, after, requester, operation, source, state_before, state_after in records:
+        total += 1
+        operations[OPERATIONS[operation]] += 1
+        sources[source_name(source)] += 1
+        cores[requester] += 1
+        lines[line] += 1
+        transitions[f'{BlockState(state_before).name}->{BlockState(state_after).name}'] += 1
+
+    dropped = f', {header["dropped"]} earlier ones dropped' if header['dropped'] else ''
+    print(f'{total} bus transactions ({header["protocol"]}, {header["cores"]} cores{dropped})')
+    for title, counter in [('operation', operations), ('source', sources), ('requester state', transitions)]:
+        print(f'##### BY {title.upper()} #####')
+        for name, count in counter.most_common():
+            print(f'{name:<30} {count:>10}')
+    print('##### BY CORE #####')
+    for core, count in sorted(cores.items()):
+        print(f'core {core:<25} {count:>10}')
+    print('##### BUSIEST LINES #####')
+    mask = (1 << header['index_bits']) - 1
+    for line, count in lines.most_common(10):
+        print(f'tag {line >> header["index_bits"]:#x} index {line & mask:<10} {count:>10}')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - filter and summarise a bus event log')
+    parser.add_argument('log', help='Event log written with main.py --event-log')
+    parser.add_argument('--core', type=int, help='Only requests of this core')
+    parser.add_argument('--op', choices=OPERATIONS, help='Only this bus request')
+    parser.add_argument('--line', type=lambda value: int(value, 0), help='Only this line ((tag << index bits) | index)')
+    parser.add_argument('--from-cycle', type=int, default=0, help='Only requests issued at or after this cycle')
+    parser.add_argument('--to-cycle', type=int, default=None, help='Only requests issued before this cycle')
+    parser.add_argument('--limit', type=int, default=None, help='Print at most this many records')
+    parser.add_argument('--summary', action='store_true', help='Print counts instead of records')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.exists(args.log):
+        sys.exit(f'No event log at {args.log}')
+    try:
+        header, records = read_log(args.log)
+    except (ValueError, struct.error) as e:
+        sys.exit(str(e))
+
+    operation = OPERATIONS.index(args.op) if args.op else None
+    selected = (record for record in records
+                if (args.core is None or record[4] == args.core) and (operation is None or record[5] == operation)
+                and (args.line is None or record[1] == args.line) and record[0] >= args.from_cycle
+                and (args.to_cycle is None or record[0] < args.to_cycle))
+    if args.summary:
+        summarize(selected, header)
+    else:
+        for i, record in enumerate(selected):
+            if args.limit is not None and i >= args.limit:
+                break
+            print(format_record(record, header['index_bits']))
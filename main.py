@@ -1,48 +1,369 @@
+import argparse
+import signal
 import sys
-from system import System, Protocol
+from contextlib import redirect_stdout
+from system import System, Protocol, SCHEDULERS, LOCKINGS, DEFAULT_STRIPES
 from cache import CacheConfig
+from trace_reader import read_trace, find_trace_file, count_trace_files, offset_addresses, DEFAULT_BUFFER_SIZE
+from binary_trace import ensure_binary_trace, load_binary_trace
+from replacement import POLICIES
+from checkpoint import save_checkpoint, load_checkpoint, restore_state, reset_stats
+from sampling import Sampler
+from roi import RegionOfInterest
+from results_store import ResultsStore, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES
+from profiling import Profiler
+from eventlog import EventLog, DEFAULT_CAPACITY
+from tracker import CoreTracker, LatencyModel
+from replay import record_events, save_recording
+from sharing_profiler import SharingProfiler, DEFAULT_MAX_LINES
+from telemetry import Telemetry
+from private_lines import shared_lines
+from address_mapper import AddressMapper
 
-def preprocess_data(data: str):
-    split_lines = data.split('\n')
-    res = []
-    
-    for line in split_lines:
-        if len(line.split(' ')) == 2:
-            label, value = line.split(' ')
-            label = int(label)
-            res.append((label, value))
-    
-    return res
+DEFAULT_ADDRESS_OFFSET = 1 << 32    # Past the 32-bit address space of the traces, so reused copies never share data
 
-if __name__ == "__main__":
-    protocol = sys.argv[1]              # MESI or DRAGON
+def parse_protocol(protocol: str) -> Protocol:
     if protocol == "MESI":
-        protocol = Protocol.MESI
+        return Protocol.MESI
     elif protocol == "DRAGON":
-        protocol = Protocol.DRAGON
+        return Protocol.DRAGON
     elif protocol == "MOESI":
-        protocol = Protocol.MOESI
+        return Protocol.MOESI
     else:
-        protocol = Protocol.NONE
-    
-    trace = sys.argv[2]                 # bodytrack, blackscholes, fluidanimate
-    cache_size = int(sys.argv[3])       # Default 4096 bytes (4KB)
-    associativity = int(sys.argv[4])    # Default 2-way
-    block_size = int(sys.argv[5])       # Default 32 bytes
-    word_size = 4                       # Default 4 bytes
-    processor_num = 4                   # Default 4 processors
-    
-    print(f'Protocol: {protocol}\nTrace file: {trace}\nCache size: {cache_size} bytes\nAssociativiy: {associativity}-way\nBlock size: {block_size} bytes')
+        return Protocol.NONE
+
+"""
+positive_int: argparse type accepting integers above zero
+"""
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value} is not an integer')
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - Trace-based cache coherence simulator')
+    parser.add_argument('protocol', help='MESI, MOESI or DRAGON')
+    parser.add_argument('trace', help='Trace name, e.g. bodytrack reads traces/bodytrack_{core}.data (or .data.gz, .data.bz2, .data.xz)')
+    parser.add_argument('cache_size', type=int, help='Cache size in bytes (default 4096)')
+    parser.add_argument('associativity', type=int, help='Associativity (default 2-way)')
+    parser.add_argument('block_size', type=int, help='Block size in bytes (default 32)')
+    parser.add_argument('--buffer-size', type=positive_int, default=DEFAULT_BUFFER_SIZE,
+                        help='Characters of trace text read per chunk. Bounds the memory used by each trace.')
+    parser.add_argument('--binary', action='store_true',
+                        help='Convert traces to the binary format once (rebuilt when stale) and memory-map them')
+    parser.add_argument('--scheduler', choices=SCHEDULERS, default='threads',
+                        help="threads: one thread per core. event: deterministic cycle-ordered interleaving on one thread")
+    parser.add_argument('--locking', choices=LOCKINGS, default='global',
+                        help='global: one bus lock. striped: one lock per group of cache sets, so threaded cores working on different sets run concurrently')
+    parser.add_argument('--lock-stripes', type=int, default=DEFAULT_STRIPES,
+                        help=f'Lock stripes of --locking striped, a power of two (default {DEFAULT_STRIPES}, at most one per set)')
+    parser.add_argument('--replacement', choices=list(POLICIES), default='lru',
+                        help='Replacement policy: true LRU (default), tree pseudo-LRU, FIFO or random')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random replacement policy')
+    parser.add_argument('--cores', type=int, default=4, help='Number of cores (default 4)')
+    parser.add_argument('--trace-files', type=int, default=None,
+                        help='Number of trace files to use, default all of traces/{trace}_0, _1, ... Core i runs file i %% trace-files')
+    parser.add_argument('--address-offset', type=lambda value: int(value, 0), default=DEFAULT_ADDRESS_OFFSET,
+                        help='Added to the addresses of each further core reusing a trace file (0 makes the copies share data)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Save a checkpoint to this file on Ctrl-C, every --checkpoint-every instructions and at --stop-after (event scheduler only)')
+    parser.add_argument('--checkpoint-every', type=int, default=None, help='Instructions (all cores together) between two checkpoints')
+    parser.add_argument('--stop-after', type=int, default=None, help='Stop after this many instructions (all cores together), e.g. to warm the caches')
+    parser.add_argument('--resume', default=None, help='Resume from this checkpoint. The cache configuration and traces must match')
+    parser.add_argument('--reset-stats', action='store_true', help='Zero the stats after resuming, to measure from the checkpoint on')
+    parser.add_argument('--fast-forward', '--roi-begin', dest='roi_begin', type=int, default=0,
+                        help='Fast-forward the first N instructions of each core: caches are warmed, no stats are kept')
+    parser.add_argument('--fast-forward-cycles', '--roi-begin-cycles', dest='roi_begin_cycles', type=int, default=None,
+                        help='Fast-forward each core until it ran this many cycles (loads and stores counted as hits)')
+    parser.add_argument('--roi-end', type=int, default=None, help='End each core after this instruction of its trace')
+    parser.add_argument('--store', default=None,
+                        help='SQLite results store (e.g. results.sqlite): identical runs on unchanged traces are served from it instead of simulated')
+    parser.add_argument('--refresh', action='store_true', help='Simulate even if the store has the result, and replace it')
+    parser.add_argument('--store-max-entries', type=int, default=DEFAULT_MAX_ENTRIES, help='Results kept in the store before evicting the least recently used')
+    parser.add_argument('--store-max-bytes', type=int, default=DEFAULT_MAX_BYTES, help='Bytes of stats kept in the store before evicting the least recently used')
+    parser.add_argument('--sample-period', type=int, default=None,
+                        help='Sampled simulation: measure one detailed window per this many instructions of each core and estimate the totals')
+    parser.add_argument('--sample-window', type=int, default=1000, help='Instructions of each detailed window (default 1000)')
+    parser.add_argument('--sample-warmup', type=int, default=None,
+                        help='Only warm the caches for this many instructions before each window and skip the rest (default: warm everything)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time trace parsing, handlers, cache methods, bus requests and bus lock waits per core, written next to the stats file')
+    parser.add_argument('--profile-calls', action='store_true',
+                        help='With --profile, also dump a cProfile (pstats) profile of the run next to the stats file')
+    parser.add_argument('--event-log', default=None,
+                        help='Log every bus transaction to this file in a packed binary format (read it with eventlog.py)')
+    parser.add_argument('--event-log-capacity', type=int, default=DEFAULT_CAPACITY,
+                        help=f'Transactions buffered in memory before a bulk write (default {DEFAULT_CAPACITY})')
+    parser.add_argument('--event-log-last', action='store_true',
+                        help='Only keep the last --event-log-capacity transactions, written at the end of the run')
+    parser.add_argument('--latency', default=None,
+                        help='JSON latency model replacing the default one, e.g. {"memory": 200} (fields: hit, memory, evict, word)')
+    parser.add_argument('--record', default=None,
+                        help='Record each core\'s timing events to this file, to replay the run under other latencies with replay.py')
+    parser.add_argument('--sharing-profile', type=int, nargs='?', const=20, default=None, metavar='TOP',
+                        help='Count sharing per cache line and report the TOP (default 20) lines with the most coherence traffic, '
+                             'flagging likely false sharing, next to the stats file')
+    parser.add_argument('--sharing-max-lines', type=int, default=DEFAULT_MAX_LINES,
+                        help=f'Lines tracked by --sharing-profile before further lines go uncounted (default {DEFAULT_MAX_LINES})')
+    parser.add_argument('--telemetry', default=None,
+                        help='Write live progress as JSON lines to this file, or to a listening Unix socket given as unix:PATH')
+    parser.add_argument('--telemetry-interval', type=float, default=None,
+                        help='Seconds between two telemetry samples (default 5 unless --telemetry-every is given)')
+    parser.add_argument('--telemetry-every', type=int, default=None,
+                        help='Also write a telemetry sample every this many instructions retired by all cores')
+    parser.add_argument('--private-lines', action='store_true',
+                        help='Pre-scan the traces (cached next to them) for lines only one core accesses, and fill their misses without the bus')
+    return parser.parse_args(argv)
+
+"""
+stats_filename: {protocol}_{trace}_{cache_size}_{associativity}_{block_size}.txt, with the core count appended when it is not 4
+"""
+def stats_filename(protocol, trace, cache_size, associativity, block_size, processor_num=4) -> str:
+    cores = '' if processor_num == 4 else f'_{processor_num}cores'
+    return f'{protocol}_{trace}_{cache_size}_{associativity}_{block_size}{cores}.txt'
 
-    cacheConfig = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=word_size, protocol=protocol)
-    system = System(protocol=protocol, processor_num=processor_num, cache_config=cacheConfig, filename=f'{protocol}_{trace}_{cache_size}_{associativity}_{block_size}.txt')
+"""
+trace_filenames: the trace files of {trace} used by {processor_num} cores: the first {trace_files}, by default all found
+"""
+def trace_filenames(trace: str, processor_num: int, trace_files: int = None):
+    if trace_files is None:
+        trace_files = min(count_trace_files(trace), processor_num)
+    if trace_files == 0:
+        find_trace_file(trace, 0)   # Raises FileNotFoundError listing the files tried
+    return [find_trace_file(trace, index) for index in range(trace_files)]
 
-    # Read trace file and feed to system
+"""
+feed_traces: hands the trace files of {trace} (streamed, or memory-mapped if {binary}) to the {processor_num} cores
+With {trace_files} files (default: every traces/{trace}_{i} found), core i runs file i % trace_files.
+"""
+def feed_traces(system: System, trace: str, processor_num: int, binary: bool = False, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                trace_files: int = None, address_offset: int = DEFAULT_ADDRESS_OFFSET, wrap=None) -> None:
+    trace_files = len(trace_filenames(trace, processor_num, trace_files))
+
+    def load(index: int):
+        trace_filename = find_trace_file(trace, index)
+        if binary:
+            return load_binary_trace(ensure_binary_trace(trace_filename))
+        return read_trace(trace_filename, buffer_size=buffer_size)
+
+    feed_chunks(system, load, processor_num, trace_files, address_offset, wrap)
+
+"""
+feed_chunks: gives core i the chunks returned by {load}(i % trace_files), passed through {wrap}(i, chunks) if given
+The k-th core reusing a file sees its addresses shifted by k * {address_offset}.
+"""
+def feed_chunks(system: System, load, processor_num: int, trace_files: int, address_offset: int = DEFAULT_ADDRESS_OFFSET, wrap=None) -> None:
     for i in range(0, processor_num):
-        trace_filename = f'traces/{trace}_{i}.data'
-        data = open(trace_filename, "r")
-        data = data.read()
-        data = preprocess_data(data)
+        data = load(i % trace_files)
+        if i >= trace_files and address_offset != 0:
+            data = offset_addresses(data, (i // trace_files) * address_offset)
+        if wrap is not None:
+            data = wrap(i, data)
         system.add_thread(data=data, core_id=i)
 
-    system.trace()
+if __name__ == "__main__":
+    args = parse_args()
+    protocol = parse_protocol(args.protocol)    # MESI or DRAGON
+    trace = args.trace                          # bodytrack, blackscholes, fluidanimate
+    cache_size = args.cache_size                # Default 4096 bytes (4KB)
+    associativity = args.associativity          # Default 2-way
+    block_size = args.block_size                # Default 32 bytes
+    word_size = 4                               # Default 4 bytes
+    processor_num = args.cores                  # Default 4 processors
+
+    print(f'Protocol: {protocol}\nTrace file: {trace}\nCache size: {cache_size} bytes\nAssociativiy: {associativity}-way\nBlock size: {block_size} bytes')
+    if processor_num != 4:
+        print(f'Cores: {processor_num}')
+
+    if args.latency:
+        try:
+            CoreTracker.latency = LatencyModel.from_file(args.latency)
+        except (OSError, ValueError, TypeError) as e:
+            sys.exit(f'Invalid latency model {args.latency}: {e}')
+
+    cacheConfig = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=word_size, protocol=protocol, replacement=args.replacement, seed=args.seed)
+    shared = None
+    if args.private_lines:
+        if args.event_log:
+            sys.exit('Misses on private lines skip the bus, so the event log would miss them: --private-lines cannot be combined with --event-log')
+        try:
+            offset_bits = AddressMapper(cacheConfig).offset_bits
+            shared, lines = shared_lines(trace_filenames(trace, processor_num, args.trace_files), processor_num, args.address_offset, offset_bits)
+        except (OSError, ValueError) as e:
+            sys.exit(f'Cannot classify private lines: {e}')
+        print(f'Private lines: {lines - len(shared)} of {lines} lines are accessed by a single core')
+    try:
+        system = System(protocol=protocol, processor_num=processor_num, cache_config=cacheConfig, filename=stats_filename(protocol, trace, cache_size, associativity, block_size, processor_num), scheduler=args.scheduler,
+                        locking=args.locking, stripes=args.lock_stripes, shared_lines=shared)
+    except ValueError as e:
+        sys.exit(f'Invalid configuration: {e}')
+
+    # What a checkpoint must agree on to be resumed with these traces
+    run = {'trace': trace, 'trace_files': args.trace_files, 'address_offset': args.address_offset}
+    if (args.checkpoint or args.resume or args.stop_after is not None) and args.scheduler != 'event':
+        sys.exit('Checkpoints need --scheduler event')
+    if args.resume:
+        try:
+            restore_state(system, load_checkpoint(args.resume), run)
+        except (OSError, ValueError) as e:
+            sys.exit(f'Cannot resume from {args.resume}: {e}')
+        print(f'Resumed from {args.resume} after {system.event_scheduler.executed} instructions')
+        if args.reset_stats:
+            reset_stats(system)
+
+    sampler = None
+    if args.sample_period is not None:
+        if args.checkpoint or args.resume:
+            sys.exit('Sampled simulation cannot be checkpointed')
+        try:
+            sampler = Sampler(system, args.sample_period, args.sample_window, args.sample_warmup)
+        except ValueError as e:
+            sys.exit(f'Invalid sampling: {e}')
+
+    roi = None
+    if args.roi_begin > 0 or args.roi_begin_cycles is not None or args.roi_end is not None:
+        if sampler or args.checkpoint or args.resume:
+            sys.exit('A region of interest cannot be combined with sampling or checkpoints')
+        try:
+            roi = RegionOfInterest(system, args.roi_begin, args.roi_end, args.roi_begin_cycles)
+        except ValueError as e:
+            sys.exit(f'Invalid region of interest: {e}')
+        end = f'instruction {args.roi_end}' if args.roi_end is not None else 'the end of the trace'
+        begin = f'cycle {args.roi_begin_cycles}' if args.roi_begin_cycles is not None else f'instruction {args.roi_begin}'
+        print(f'Region of interest: from {begin} to {end} of each core')
+
+    if args.locking == 'striped' and (sampler or roi or args.checkpoint or args.resume or args.record):
+        sys.exit('Striped locking gives each core its own trackers: it cannot be combined with sampling, a region of interest, checkpoints or recordings')
+
+    if args.record:
+        if sampler or roi or args.checkpoint or args.resume:
+            sys.exit('A recording covers a whole run: it cannot be combined with sampling, a region of interest or checkpoints')
+        record_events(system)
+
+    store = None
+    if args.store and args.scheduler != 'event':
+        # Threaded cores interleave differently on every run: a stored result would stand for one run out of many
+        print(f'Threaded runs are not deterministic: {args.store} only keeps runs of --scheduler event')
+    elif args.store and not (args.record or sampler or args.checkpoint or args.resume or args.stop_after is not None):
+        store = ResultsStore(args.store, max_entries=args.store_max_entries, max_bytes=args.store_max_bytes)
+        params = {'protocol': protocol.name, 'trace': trace, 'cache_size': cache_size, 'associativity': associativity,
+                  'block_size': block_size, 'word_size': word_size, 'replacement': args.replacement, 'seed': args.seed,
+                  'cores': processor_num, 'scheduler': args.scheduler,
+                  'options': {'address_offset': args.address_offset, 'roi_begin': args.roi_begin,
+                              'roi_begin_cycles': args.roi_begin_cycles, 'roi_end': args.roi_end,
+                              'latency': vars(CoreTracker.latency), 'locking': args.locking}}
+        key = store.key(trace_filenames(trace, processor_num, args.trace_files), params)
+        # Reports of the run itself (profiles, event log, telemetry) need it simulated: its results are stored all the same
+        reports = args.profile or args.sharing_profile is not None or args.event_log or args.telemetry
+        stored = None if args.refresh or reports else store.get(key)
+        if stored is not None:
+            stats, _ = stored
+            with open(system.filename, 'w+') as f:
+                f.write(stats)
+            print(f'Results served from {args.store} (simulator {store.version}), written to {system.filename}')
+            store.close()
+            sys.exit(0)
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler(system, call_profile=args.profile_calls)
+        profiler.instrument()
+
+    sharing = None
+    if args.sharing_profile is not None:
+        try:
+            sharing = SharingProfiler(system, max_lines=args.sharing_max_lines)
+        except ValueError as e:
+            sys.exit(f'Cannot profile sharing: {e}')
+        sharing.attach()
+
+    event_log = None
+    if args.event_log:
+        try:
+            event_log = EventLog(args.event_log, capacity=args.event_log_capacity, keep_last=args.event_log_last)
+            event_log.attach(system)
+        except (OSError, ValueError) as e:
+            sys.exit(f'Cannot log events to {args.event_log}: {e}')
+
+    telemetry = None
+    if args.telemetry:
+        interval = args.telemetry_interval
+        if interval is None and args.telemetry_every is None:
+            interval = 5.0
+        try:
+            telemetry = Telemetry(system, args.telemetry, interval=interval, every=args.telemetry_every)
+        except (OSError, ValueError) as e:
+            sys.exit(f'Cannot write telemetry to {args.telemetry}: {e}')
+
+    # Stream (or memory-map) each trace file to its core
+    wrap = sampler.sample_chunks if sampler else roi.roi_chunks if roi else None
+    if profiler is not None:
+        # Time the reading itself, before sampling or the region of interest cut the chunks
+        inner = wrap
+        wrap = lambda i, data: profiler.timed_chunks(i, data) if inner is None else inner(i, profiler.timed_chunks(i, data))
+    if telemetry is not None:
+        # Count the instructions the cores actually run, after sampling or the region of interest cut the chunks
+        counted = wrap
+        wrap = lambda i, data: telemetry.counted_chunks(i, data if counted is None else counted(i, data))
+    feed_traces(system, trace, processor_num, binary=args.binary, buffer_size=args.buffer_size,
+                trace_files=args.trace_files, address_offset=args.address_offset, wrap=wrap)
+
+    scheduler = system.event_scheduler
+    scheduler.stop_after = args.stop_after
+    if args.checkpoint:
+        scheduler.pause_every = args.checkpoint_every
+        scheduler.on_pause = lambda scheduler: save_checkpoint(system, args.checkpoint, run)
+        signal.signal(signal.SIGINT, lambda signum, frame: scheduler.stop())
+
+    if telemetry is not None:
+        telemetry.start()
+
+    if sampler is not None:
+        system.run()
+        sampler.report()
+        with open(system.filename, 'w+') as f, redirect_stdout(f):
+            sampler.report()
+    elif roi is not None:
+        system.run()
+        roi.finish()
+        system.write_stats()
+    elif not system.trace():
+        saved = f', checkpoint saved to {args.checkpoint}' if args.checkpoint else ''
+        print(f'Stopped after {scheduler.executed} instructions{saved}')
+        store = None
+
+    if telemetry is not None:
+        telemetry.stop()
+        if telemetry.error is not None:
+            print(f'Telemetry to {args.telemetry} stopped: {telemetry.error}')
+
+    if args.record:
+        save_recording(system, args.record)
+        print(f'Timing events recorded to {args.record}')
+
+    if event_log is not None:
+        event_log.close()
+        print(f'{event_log.written} bus transactions logged to {args.event_log}')
+
+    if sharing is not None:
+        filename = f'{system.filename[:-len(".txt")]}.sharing.txt'
+        with open(filename, 'w+') as f, redirect_stdout(f):
+            sharing.report(args.sharing_profile)
+        print(f'Sharing profile written to {filename}')
+
+    if profiler is not None:
+        base = system.filename[:-len('.txt')]
+        with open(f'{base}.profile.txt', 'w+') as f, redirect_stdout(f):
+            profiler.report()
+        print(f'Profile written to {base}.profile.txt')
+        if args.profile_calls and profiler.dump_call_profile(f'{base}.prof'):
+            print(f'Call profile written to {base}.prof (e.g. snakeviz {base}.prof)')
+
+    if store is not None:
+        with open(system.filename) as f:
+            store.put(key, params, f.read(), system.summary())
+        store.close()
@@ -0,0 +1,122 @@
+import os
+import struct
+import sys
+from array import array
+from enums import Instruction
+from trace_reader import read_trace
+from binary_trace import hash_file, trace_base
+
+try:
+    import numpy as np
+except ImportError:     # NumPy is optional: lines are then collected in pure Python
+    np = None
+
+"""
+private_lines: pre-scan of the traces for the lines a single core accesses, so that their misses can skip the bus
+
+A line is a block address: address >> offset bits, the directory's (tag << index bits) | cache index. For each trace
+file, the sorted distinct lines its loads and stores touch are cached next to it (e.g. traces/bodytrack_0.lines8
+for 8 words per block), and rebuilt when the trace changes, like binary traces. shared_lines then combines the
+files as the cores run them: a line in the lines of two cores is shared, every other line is private to the one
+core accessing it. Only other caches ever hold a line another core accesses, so a miss on a private line finds no
+sharer to snoop, and can be filled from memory directly (see Core.bypass_private_lines).
+
+File layout (little-endian): a header (HEADER: magic, version, offset bits, line count, source size, source mtime
+and source sha256), then the lines as uint64.
+"""
+
+MAGIC = b'SDLN'
+VERSION = 1
+HEADER = struct.Struct('<4sHBxQQq32s')
+LOAD = Instruction.LOAD.value
+STORE = Instruction.STORE.value
+
+def lines_path(source: str, offset_bits: int) -> str:
+    return f'{trace_base(source)}.lines{1 << offset_bits}'
+
+"""
+scan_lines: sorted distinct lines of the loads and stores in trace {source}
+"""
+def scan_lines(source: str, offset_bits: int):
+    lines = set()
+    for labels, values in read_trace(source):
+        if np is not None and len(labels) > 0:
+            labels, values = np.asarray(labels, dtype=np.uint8), np.asarray(values, dtype=np.uint64)
+            accesses = values[(labels == LOAD) | (labels == STORE)]
+            lines.update(np.unique(accesses >> np.uint64(offset_bits)).tolist())
+        else:
+            lines.update(value >> offset_bits for label, value in zip(labels, values) if label == LOAD or label == STORE)
+    return array('Q', sorted(lines))
+
+"""
+read_lines: the cached lines of {source} in {filename}, or None if they are missing, stale or for other blocks
+As with binary traces, a source whose mtime moved but whose hash matches refreshes the stored mtime.
+"""
+def read_lines(source: str, filename: str, offset_bits: int):
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        return None
+    magic, version, bits, count, size, mtime_ns, sha256 = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or bits != offset_bits or len(data) != HEADER.size + 8 * count:
+        return None
+
+    stat = os.stat(source)
+    if stat.st_size != size:
+        return None
+    if stat.st_mtime_ns != mtime_ns:
+        if hash_file(source) != sha256:
+            return None
+        with open(filename, 'r+b') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, offset_bits, count, size, stat.st_mtime_ns, sha256))
+
+    lines = array('Q')
+    lines.frombytes(data[HEADER.size:])
+    if sys.byteorder == 'big':
+        lines.byteswap()
+    return lines
+
+def write_lines(source: str, filename: str, offset_bits: int, lines) -> None:
+    stat = os.stat(source)
+    sha256 = hash_file(source)
+    if sys.byteorder == 'big':
+        lines = array('Q', lines)
+        lines.byteswap()
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, offset_bits, len(lines), stat.st_size, stat.st_mtime_ns, sha256))
+        lines.tofile(f)
+    os.replace(tmp, filename)
+
+"""
+ensure_lines: the lines of {source}, scanned and cached next to it unless an up to date copy is there
+"""
+def ensure_lines(source: str, offset_bits: int):
+    filename = lines_path(source, offset_bits)
+    lines = read_lines(source, filename, offset_bits)
+    if lines is None:
+        lines = scan_lines(source, offset_bits)
+        write_lines(source, filename, offset_bits, lines)
+    return lines
+
+"""
+shared_lines: (frozenset of the lines accessed by several cores, count of distinct lines accessed)
+Core i runs file i % len({filenames}), its addresses shifted by (i // len({filenames})) * {address_offset}, as in
+feed_chunks. The offset must be a whole number of blocks, so that shifted addresses stay in shifted lines.
+"""
+def shared_lines(filenames, processor_num: int, address_offset: int, offset_bits: int):
+    if address_offset % (1 << offset_bits) != 0:
+        raise ValueError(f'the address offset ({address_offset}) must be a multiple of the block ({1 << offset_bits} words)')
+    files = [ensure_lines(filename, offset_bits) for filename in filenames]
+
+    seen, shared = set(), set()
+    for i in range(processor_num):
+        lines = files[i % len(files)]
+        shift = (i // len(files)) * (address_offset >> offset_bits)
+        if shift != 0:
+            lines = [line + shift for line in lines]
+        shared.update(seen.intersection(lines))
+        seen.update(lines)
+    return frozenset(shared), len(seen)
@@ -0,0 +1,262 @@
+import copy
+import cProfile
+import pstats
+import threading
+import time
+
+"""
+profiling: opt-in instrumentation of a System's hot paths
+
+Profiler.instrument replaces methods of the System's own objects (instance attributes shadowing the class methods),
+so an uninstrumented run executes exactly the same code as before and pays nothing. Once instrumented, it records
+per core:
+- reading and parsing its trace (read_trace), and decoding the addresses of each chunk (decode_chunk)
+- its load, store and other instruction handlers
+- its cache's lookups (find_block), state transitions (next_state, set_state), snoops, flushes and fills
+- each bus request type it issues, with the time spent waiting for and holding the bus lock
+- with striped locking, the time spent waiting for and holding its set's lock around each load and store (set lock)
+Times are wall-clock and inclusive: a load handler's time includes its cache lookup and bus request.
+Snoops and fills are counted for the cache performing them, whichever core's request caused them.
+
+With {call_profile}, the run is also profiled with cProfile (one profile per core thread with the threads scheduler,
+merged), and the result can be dumped in the pstats format read by snakeviz, gprof2dot or flameprof.
+"""
+
+CORE_METHODS = ['handle_others']
+CACHE_METHODS = ['find_block', 'next_state', 'set_state', 'processor_load', 'processor_store', 'bus_snoop', 'flush',
+                 'receive_block_from_bus', 'receive_word_from_bus']
+BUS_REQUESTS = ['bus_load_request', 'bus_load_exclusive_request', 'bus_moesi_load_request', 'pr_load_miss_request',
+                'pr_store_miss_request', 'bus_update_request', 'flush_request']
+UNATTRIBUTED = ('bus', 'other')
+SET_LOCK = 'set lock'
+
+"""
+ProfiledLock: a Lock recording, for the bus request running on the calling thread, how long it waited to acquire the
+lock and how long it held it
+Bus locks are reentrant (a striped core holds its set's lock for a whole instruction): only the outermost acquire
+and release count, under the request, or UNATTRIBUTED, running when the lock was first taken.
+"""
+class ProfiledLock:
+    def __init__(self, lock, profiler) -> None:
+        self.lock = lock
+        self.profiler = profiler
+        self.depth = 0              # Only changed by the thread holding the lock
+        self.key = None
+        self.acquired = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        if not acquired:
+            return False
+        self.depth += 1
+        if self.depth == 1:
+            self.acquired = time.perf_counter()
+            self.key = getattr(self.profiler.local, 'request', UNATTRIBUTED)
+            self.profiler.entry(self.key)[2] += self.acquired - start
+        return True
+
+    def release(self) -> None:
+        self.depth -= 1
+        if self.depth == 0:
+            self.profiler.entry(self.key)[3] += time.perf_counter() - self.acquired
+        self.lock.release()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+class Profiler:
+    def __init__(self, system, call_profile: bool = False) -> None:
+        self.system = system
+        self.call_profile = call_profile
+        self.local = threading.local()      # Each thread counts into its own dict, merged when reporting
+        self.tables = []
+        self.tables_lock = threading.Lock()
+        self.profiles = []
+        self.wall_seconds = 0.0
+
+    """
+    entry: [calls, seconds, lock wait seconds, lock hold seconds] of {key} in the calling thread's table
+    """
+    def entry(self, key):
+        table = getattr(self.local, 'table', None)
+        if table is None:
+            table = self.local.table = {}
+            with self.tables_lock:
+                self.tables.append(table)
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [0, 0.0, 0.0, 0.0]
+        return entry
+
+    def timed(self, function, key):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                entry = self.entry(key)
+                entry[0] += 1
+                entry[1] += time.perf_counter() - start
+        return wrapper
+
+    def timed_request(self, function, name):
+        def wrapper(*args, **kwargs):
+            key = (f'core {kwargs["id"] if "id" in kwargs else args[0]}', name)
+            local = self.local
+            previous = getattr(local, 'request', UNATTRIBUTED)
+            local.request = key
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                entry = self.entry(key)
+                entry[0] += 1
+                entry[1] += time.perf_counter() - start
+                local.request = previous
+        return wrapper
+
+    """
+    set_locked: {handler} charging the set lock that striped locking takes around it (see System.striped) to {key}
+    """
+    def set_locked(self, handler, key):
+        def wrapper(*args):
+            local = self.local
+            previous = getattr(local, 'request', UNATTRIBUTED)
+            local.request = key
+            try:
+                return handler(*args)
+            finally:
+                self.entry(key)[0] += 1
+                local.request = previous
+        wrapper.__name__ = handler.__name__
+        return wrapper
+
+    """
+    timed_chunks: passes the chunks of {data} through, timing how long each takes to read and parse
+    Use it as the innermost chunk wrapper, e.g. feed_traces(..., wrap=profiler.timed_chunks)
+    """
+    def timed_chunks(self, core_id: int, data):
+        key = (f'core {core_id}', 'read_trace')
+        iterator = iter(data)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                entry = self.entry(key)
+                entry[0] += 1
+                entry[1] += time.perf_counter() - start
+            yield chunk
+
+    def timed_run(self, run):
+        def wrapper():
+            profile = None
+            if self.call_profile and self.system.scheduler == 'event':
+                profile = cProfile.Profile()
+                self.profiles.append(profile)
+                profile.enable()
+            start = time.perf_counter()
+            try:
+                return run()
+            finally:
+                self.wall_seconds += time.perf_counter() - start
+                if profile is not None:
+                    profile.disable()
+        return wrapper
+
+    def profiled_trace(self, trace):
+        def wrapper(data):
+            profile = cProfile.Profile()
+            with self.tables_lock:
+                self.profiles.append(profile)
+            profile.runcall(trace, data)
+        return wrapper
+
+    """
+    instrument: wraps the hot paths of every core, cache and the bus. Call it before the traces are fed
+    """
+    def instrument(self) -> None:
+        system = self.system
+        for core in system.cores:
+            label = f'core {core.id}'
+            core.mapper = copy.copy(core.mapper)        # The mapper is shared and stateless: each core times its own
+            core.mapper.decode_chunk = self.timed(core.mapper.decode_chunk, (label, 'decode_chunk'))
+            if core.handlers is not None:
+                if system.locking == 'striped':
+                    core.handlers = [self.set_locked(handler, (label, SET_LOCK)) for handler in core.handlers]
+                core.handlers = [self.timed(handler, (label, handler.__name__)) for handler in core.handlers]
+            for name in CORE_METHODS:
+                setattr(core, name, self.timed(getattr(core, name), (label, name)))
+            for name in CACHE_METHODS:
+                setattr(core.cache, name, self.timed(getattr(core.cache, name), (label, f'cache.{name}')))
+            if self.call_profile and system.scheduler == 'threads':
+                core.trace = self.profiled_trace(core.trace)
+
+        bus = system.bus
+        for name in BUS_REQUESTS:
+            setattr(bus, name, self.timed_request(getattr(bus, name), name))
+        bus.locks = [ProfiledLock(lock, self) for lock in bus.locks]
+        system.run = self.timed_run(system.run)
+
+    """
+    totals: {key: [calls, seconds, lock wait seconds, lock hold seconds]} over every thread
+    """
+    def totals(self) -> dict:
+        totals = {}
+        for table in self.tables:
+            for key, entry in table.items():
+                total = totals.setdefault(key, [0, 0.0, 0.0, 0.0])
+                for i, value in enumerate(entry):
+                    total[i] += value
+        return totals
+
+    def report(self) -> None:
+        totals = self.totals()
+        print(f'##### PROFILE ({self.system.scheduler} scheduler, {self.wall_seconds:.3f} s running the cores) #####')
+        print(f'{"where":<8} {"what":<30} {"calls":>10} {"seconds":>10} {"us/call":>9} {"lock wait s":>12} {"lock hold s":>12}')
+        for (where, what), (calls, seconds, wait, hold) in sorted(totals.items()):
+            per_call = seconds / calls * 1e6 if calls else 0.0
+            print(f'{where:<8} {what:<30} {calls:>10} {seconds:>10.4f} {per_call:>9.2f} {wait:>12.4f} {hold:>12.4f}')
+
+        print('##### BUS REQUESTS, ALL CORES #####')
+        requests = {}
+        for (where, what), entry in totals.items():
+            if what in BUS_REQUESTS or what == SET_LOCK or (where, what) == UNATTRIBUTED:
+                request = requests.setdefault(what, [0, 0.0, 0.0, 0.0])
+                for i, value in enumerate(entry):
+                    request[i] += value
+        for what, (calls, seconds, wait, hold) in sorted(requests.items()):
+            print(f'{what:<39} {calls:>10} {seconds:>10.4f} {"":>9} {wait:>12.4f} {hold:>12.4f}')
+
+        print('##### LOCK WAIT PER CORE #####')
+        waits = {}
+        for (where, what), entry in totals.items():
+            if what in BUS_REQUESTS or what == SET_LOCK:
+                waits[where] = waits.get(where, 0.0) + entry[2]
+        if UNATTRIBUTED in totals:
+            waits[' '.join(UNATTRIBUTED)] = totals[UNATTRIBUTED][2]
+        for core in self.system.cores:
+            wait = waits.pop(f'core {core.id}', 0.0)
+            share = f' ({wait / self.wall_seconds:.1%} of the run)' if self.wall_seconds > 0 else ''
+            print(f'core {core.id:<34} {wait:>10.4f} s{share}')
+        for where, wait in waits.items():
+            print(f'{where:<39} {wait:>10.4f} s')
+
+    """
+    dump_call_profile: writes the merged cProfile stats to {filename} (pstats format). Returns False if there are none
+    """
+    def dump_call_profile(self, filename: str) -> bool:
+        profiles = [profile for profile in self.profiles if profile.getstats()]
+        if not profiles:
+            return False
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(filename)
+        return True
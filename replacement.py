@@ -0,0 +1,101 @@
+import random
+from collections import OrderedDict
+
+"""
+replacement: pluggable replacement policies for Cache
+A policy keeps one state object per cache set (created by new_set) and is told about every use of a block:
+- touch(state, way): block {way} was accessed, by its own processor or by a bus snoop
+- fill(state, way): a new block was loaded into {way}
+- victim(state): way to evict from a set whose blocks are all valid
+Cache always fills invalid ways before asking for a victim, so policies never see invalid blocks chosen.
+"""
+
+"""
+LRUPolicy: true LRU. Each set keeps its ways in recency order, least recently used first, so touching
+a way and finding the victim are both O(1) whatever the associativity
+"""
+class LRUPolicy:
+    def __init__(self, associativity: int, seed: int = 0) -> None:
+        self.associativity = associativity
+
+    def new_set(self):
+        return OrderedDict.fromkeys(range(self.associativity))
+
+    def touch(self, state, way: int) -> None:
+        state.move_to_end(way)
+
+    def fill(self, state, way: int) -> None:
+        state.move_to_end(way)
+
+    def victim(self, state) -> int:
+        return next(iter(state))
+
+"""
+FIFOPolicy: evicts the block that was loaded first. Accesses do not change the order
+"""
+class FIFOPolicy(LRUPolicy):
+    def touch(self, state, way: int) -> None:
+        pass
+
+"""
+TreePLRUPolicy: tree pseudo-LRU over {associativity} ways (must be a power of two)
+Each set keeps {associativity - 1} bits of a binary tree (node 1 is the root), each pointing towards the
+less recently used half. Touch and victim both walk one root-to-leaf path: log2(associativity) steps.
+"""
+class TreePLRUPolicy:
+    def __init__(self, associativity: int, seed: int = 0) -> None:
+        if associativity & (associativity - 1) != 0:
+            raise ValueError(f'tree-PLRU needs a power-of-two associativity, got {associativity}')
+        self.associativity = associativity
+        self.levels = associativity.bit_length() - 1
+
+    def new_set(self):
+        return bytearray(self.associativity)
+
+    def touch(self, state, way: int) -> None:
+        node = 1
+        for shift in range(self.levels - 1, -1, -1):
+            bit = (way >> shift) & 1
+            state[node] = bit ^ 1       # Point away from the half just used
+            node = 2 * node + bit
+
+    def fill(self, state, way: int) -> None:
+        self.touch(state, way)
+
+    def victim(self, state) -> int:
+        node = 1
+        for _ in range(self.levels):
+            node = 2 * node + state[node]
+        return node - self.associativity
+
+"""
+RandomPolicy: evicts a uniformly random way, reproducibly for a given seed
+"""
+class RandomPolicy:
+    def __init__(self, associativity: int, seed: int = 0) -> None:
+        self.associativity = associativity
+        self.rng = random.Random(seed)
+
+    def new_set(self):
+        return None
+
+    def touch(self, state, way: int) -> None:
+        pass
+
+    def fill(self, state, way: int) -> None:
+        pass
+
+    def victim(self, state) -> int:
+        return self.rng.randrange(self.associativity)
+
+POLICIES = {
+    'lru': LRUPolicy,
+    'plru': TreePLRUPolicy,
+    'fifo': FIFOPolicy,
+    'random': RandomPolicy,
+}
+
+def make_policy(name: str, associativity: int, seed: int = 0):
+    if name not in POLICIES:
+        raise ValueError(f'unknown replacement policy {name}, expected one of {", ".join(POLICIES)}')
+    return POLICIES[name](associativity, seed)
@@ -0,0 +1,167 @@
+import argparse
+import json
+import struct
+import sys
+import time
+from array import array
+from contextlib import redirect_stdout
+from cache import CacheConfig
+from enums import Protocol
+from system import System
+from tracker import CoreTracker, RecordingTracker, LatencyModel, DEFAULT_LATENCY, HIT, COMPUTE, KIND_BITS, KIND_MASK
+
+try:
+    import numpy as np
+except ImportError:     # NumPy is optional: event totals are then summed in pure Python
+    np = None
+
+"""
+replay: record a run's timing events once, then recompute its cycles under any LatencyModel
+
+record_events gives every core of a System a RecordingTracker. After the run, save_recording writes each core's
+event stream (hits, memory fills, evictions, remote words and compute cycles, in order) with the counters that do
+not depend on latencies (loads, stores, misses, private / shared accesses, bus traffic, invalidations, updates).
+replay rebuilds the stats from a recording: with the recording's latencies the stats file is identical to the
+direct run's.
+
+Under other latencies, replay keeps the recorded interleaving of the cores: a direct run with those latencies could
+interleave them differently (the event scheduler orders cores by cycles), and so see other hits and misses.
+Plain LatencyModels are replayed from per-kind event totals, without walking the streams. Subclasses overriding
+LatencyModel.stall are called for every event, with the core's cycle at that point.
+
+Usage: python3 replay.py RECORDING [--latency latency.json] [--output stats.txt]
+"""
+
+MAGIC = b'SDRP'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')         # magic, version, metadata length
+COUNT = struct.Struct('<Q')             # events of a core's stream
+CONFIG_FIELDS = ['size', 'associativity', 'block_size', 'word_size', 'replacement', 'seed']
+COUNTERS = ['num_load', 'num_store', 'num_miss', 'num_private_access', 'num_shared_access']
+
+"""
+record_events: makes every core of {system} record its timing events. Call it before the run
+"""
+def record_events(system) -> None:
+    for core in system.cores:
+        core.tracker = core.cache.tracker = RecordingTracker()
+
+"""
+recording: (metadata, one array of events per core) of {system}, recorded since record_events
+"""
+def recording(system):
+    config = system.cores[0].cache.config
+    metadata = {
+        'protocol': system.protocol.name,
+        'config': {field: getattr(config, field) for field in CONFIG_FIELDS},
+        'latency': vars(CoreTracker.latency),
+        'cores': [{counter: getattr(core.tracker, counter) for counter in COUNTERS} for core in system.cores],
+        'bus': dict(vars(system.bus.tracker)),
+    }
+    return metadata, [core.tracker.events for core in system.cores]
+
+def save_recording(system, filename: str) -> None:
+    metadata, streams = recording(system)
+    encoded = json.dumps(metadata).encode()
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        for events in streams:
+            if sys.byteorder != 'little':
+                events = array('I', events)
+                events.byteswap()
+            f.write(COUNT.pack(len(events)))
+            f.write(events.tobytes())
+
+"""
+load_recording: (metadata, one array of events per core) of the recording in {filename}
+"""
+def load_recording(filename: str):
+    with open(filename, 'rb') as f:
+        magic, version, length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{filename} is not a version {VERSION} recording')
+        metadata = json.loads(f.read(length))
+        streams = []
+        for _ in metadata['cores']:
+            count, = COUNT.unpack(f.read(COUNT.size))
+            events = array('I')
+            events.frombytes(f.read(count * events.itemsize))
+            if sys.byteorder != 'little':
+                events.byteswap()
+            streams.append(events)
+    return metadata, streams
+
+"""
+event_totals: total count of each event kind in {events}
+"""
+def event_totals(events):
+    if np is not None and len(events) > 0:
+        words = np.frombuffer(events, dtype=np.uint32)
+        return np.bincount(words & KIND_MASK, weights=words >> KIND_BITS, minlength=COMPUTE + 1).astype(np.int64).tolist()
+    totals = [0] * (COMPUTE + 1)
+    for word in events:
+        totals[word & KIND_MASK] += word >> KIND_BITS
+    return totals
+
+"""
+replay_timing: (hit, compute, idle) cycles of one core's {events} under {latency}
+"""
+def replay_timing(events, latency: LatencyModel):
+    if type(latency).stall is LatencyModel.stall:
+        totals = event_totals(events)
+        hit = latency.stall(HIT, totals[HIT], 0)
+        idle = sum(latency.stall(kind, totals[kind], 0) for kind in range(HIT + 1, COMPUTE))
+        return hit, totals[COMPUTE], idle
+
+    hit = compute = idle = 0
+    for word in events:
+        kind, count = word & KIND_MASK, word >> KIND_BITS
+        if kind == COMPUTE:
+            compute += count
+        elif kind == HIT:
+            hit += latency.stall(kind, count, hit + compute + idle)
+        else:
+            idle += latency.stall(kind, count, hit + compute + idle)
+    return hit, compute, idle
+
+"""
+replay: a System holding the stats of the recording ({metadata}, {streams}) under {latency}, ready for print_stats
+"""
+def replay(metadata: dict, streams, latency: LatencyModel = DEFAULT_LATENCY, filename: str = ''):
+    protocol = Protocol[metadata['protocol']]
+    config = CacheConfig(protocol=protocol, **metadata['config'])
+    system = System(protocol=protocol, processor_num=len(streams), cache_config=config, filename=filename, scheduler='event')
+    for core, counters, events in zip(system.cores, metadata['cores'], streams):
+        tracker = core.tracker
+        vars(tracker).update(counters)
+        tracker.hit_cycles, tracker.compute_cycles, tracker.idle_cycles = replay_timing(events, latency)
+        tracker.overall_cycles = tracker.hit_cycles + tracker.compute_cycles + tracker.idle_cycles
+    vars(system.bus.tracker).update(metadata['bus'])
+    return system
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - replay a recorded run under another latency model')
+    parser.add_argument('recording', help='Recording written with main.py --record')
+    parser.add_argument('--latency', default=None, help='JSON latency model, e.g. {"memory": 200} (default: the recorded one)')
+    parser.add_argument('--output', default=None, help='Write the stats to this file instead of stdout')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        metadata, streams = load_recording(args.recording)
+        latency = LatencyModel.from_file(args.latency) if args.latency else LatencyModel(**metadata['latency'])
+    except (OSError, ValueError, struct.error) as e:
+        sys.exit(str(e))
+
+    start = time.perf_counter()
+    system = replay(metadata, streams, latency, filename=args.output or '')
+    elapsed = time.perf_counter() - start
+    if args.output:
+        with open(args.output, 'w+') as f, redirect_stdout(f):
+            system.print_stats()
+        print(f'Stats written to {args.output}')
+    else:
+        system.print_stats()
+    print(f'Replayed {sum(len(events) for events in streams)} events under {vars(latency)} in {elapsed:.4f} s')
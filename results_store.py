@@ -0,0 +1,173 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from binary_trace import hash_file
+
+"""
+results_store: SQLite-backed memo of simulation results
+
+A run is keyed by the sha256 of each trace file it reads, its full CacheConfig, protocol, core count,
+scheduler and other result-affecting options, and the simulator version. A repeated run returns the stored
+stats instantly. The simulator version is a hash of the simulator's source files, so results are never
+served by a different simulator.
+
+Trace hashes are cached by (path, size, mtime), so unchanged traces are not re-read.
+Entries are evicted least recently used first once the store holds more than {max_entries} results or
+{max_bytes} bytes of stats.
+
+Usage: python3 results_store.py results.sqlite [--format csv|json] [--protocol MESI] [--trace bodytrack] [--output FILE]
+"""
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 100 << 20
+
+# Modules whose code decides simulation results
+SIMULATOR_MODULES = ['address_mapper.py', 'binary_trace.py', 'bus.py', 'cache.py', 'core.py', 'directory.py', 'enums.py',
+                     'main.py', 'private_lines.py', 'replacement.py', 'roi.py', 'scheduler.py', 'system.py',
+                     'trace_reader.py', 'tracker.py', 'transitions.py']
+
+COLUMNS = ['protocol', 'trace', 'cache_size', 'associativity', 'block_size', 'word_size', 'replacement', 'seed',
+           'cores', 'scheduler', 'options']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    protocol TEXT, trace TEXT, cache_size INTEGER, associativity INTEGER, block_size INTEGER, word_size INTEGER,
+    replacement TEXT, seed INTEGER, cores INTEGER, scheduler TEXT, options TEXT,
+    simulator_version TEXT, stats TEXT, summary TEXT, created REAL, last_used REAL, size INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS trace_hashes (
+    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT
+);
+'''
+
+def simulator_version() -> str:
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in SIMULATOR_MODULES:
+        with open(os.path.join(directory, module), 'rb') as f:
+            digest.update(module.encode() + b'\0' + f.read())
+    return digest.hexdigest()[:16]
+
+class ResultsStore:
+    def __init__(self, filename: str, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.db = sqlite3.connect(filename)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = simulator_version()
+
+    def close(self) -> None:
+        self.db.close()
+
+    """
+    trace_hash: sha256 of the trace file {path}, recomputed only when its size or mtime changed
+    """
+    def trace_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self.db.execute('SELECT size, mtime_ns, sha256 FROM trace_hashes WHERE path = ?', (path,)).fetchone()
+        if row is not None and row['size'] == stat.st_size and row['mtime_ns'] == stat.st_mtime_ns:
+            return row['sha256']
+
+        sha256 = hash_file(path).hex()
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO trace_hashes VALUES (?, ?, ?, ?)', (path, stat.st_size, stat.st_mtime_ns, sha256))
+        return sha256
+
+    """
+    key: key of a run reading {trace_filenames} (one per trace file, in core order) with {params}
+    {params} holds every COLUMNS value, 'options' being a dict of any other result-affecting option
+    """
+    def key(self, trace_filenames, params: dict) -> str:
+        identity = {
+            'traces': [self.trace_hash(filename) for filename in trace_filenames],
+            'params': {column: params[column] for column in COLUMNS if column != 'trace'},
+            'version': self.version,
+        }
+        return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+
+    """
+    get: (stats, summary) stored under {key}, or None. Marks the entry as recently used
+    """
+    def get(self, key: str):
+        row = self.db.execute('SELECT stats, summary FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with self.db:
+            self.db.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        return row['stats'], json.loads(row['summary'])
+
+    def put(self, key: str, params: dict, stats: str, summary: dict) -> None:
+        now = time.time()
+        values = [json.dumps(params[column], sort_keys=True) if column == 'options' else params[column] for column in COLUMNS]
+        with self.db:
+            self.db.execute(f'INSERT OR REPLACE INTO results (key, {", ".join(COLUMNS)}, simulator_version, stats, summary, created, last_used, size) '
+                            f'VALUES ({", ".join("?" * (len(COLUMNS) + 7))})',
+                            [key] + values + [self.version, stats, json.dumps(summary), now, now, len(stats)])
+        self.evict()
+
+    """
+    evict: drops the least recently used results until the store is within {max_entries} and {max_bytes}
+    """
+    def evict(self) -> None:
+        count, size = self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        with self.db:
+            for row in self.db.execute('SELECT key, size FROM results ORDER BY last_used').fetchall():
+                if count <= self.max_entries and size <= self.max_bytes:
+                    break
+                self.db.execute('DELETE FROM results WHERE key = ?', (row['key'],))
+                count -= 1
+                size -= row['size']
+
+    """
+    rows: every stored result matching {filters} (column -> value), as flat dicts of its parameters and summary
+    """
+    def rows(self, **filters):
+        conditions = [f'{column} = ?' for column in filters]
+        query = f'SELECT * FROM results{" WHERE " + " AND ".join(conditions) if conditions else ""} ORDER BY {", ".join(COLUMNS[:5])}'
+        rows = []
+        for row in self.db.execute(query, list(filters.values())):
+            result = {column: row[column] for column in COLUMNS}
+            result['simulator_version'] = row['simulator_version']
+            result.update(json.loads(row['summary']))
+            rows.append(result)
+        return rows
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - export stored simulation results')
+    parser.add_argument('store', help='Results store, e.g. results.sqlite')
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--protocol', help='Only results of this protocol, e.g. MESI')
+    parser.add_argument('--trace', help='Only results of this trace')
+    parser.add_argument('--output', help='Write to this file instead of stdout')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.exists(args.store):
+        sys.exit(f'No results store at {args.store}')
+    store = ResultsStore(args.store)
+    filters = {column: getattr(args, column) for column in ['protocol', 'trace'] if getattr(args, column) is not None}
+    rows = store.rows(**filters)
+    store.close()
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    if args.format == 'json':
+        json.dump(rows, out, indent=2)
+        out.write('\n')
+    elif rows:
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    if args.output:
+        out.close()
@@ -0,0 +1,89 @@
+from enums import Instruction
+from tracker import WarmingTracker, NullBusTracker
+
+"""
+roi: fast-forwards each core to its region of interest, and ends it there
+- Before the region, a core is functionally warmed: caches and coherence states are updated, nothing is counted
+- The region starts at instruction {begin} of each core's trace, or once its fast-forward clock reaches
+  {begin_cycles} (other instructions count their cycles, loads and stores 1 cycle, as hits)
+- The region ends after instruction {end} of each core's trace: the rest of the trace is not read
+Stats only cover the region: cycles are counted from the start of each core's region.
+"""
+
+OTHERS = Instruction.OTHERS.value
+
+class RegionOfInterest:
+    def __init__(self, system, begin: int = 0, end: int = None, begin_cycles: int = None) -> None:
+        if end is not None and end <= begin:
+            raise ValueError(f'the region of interest ends (instruction {end}) before it begins (instruction {begin})')
+        self.system = system
+        self.begin = begin
+        self.end = end
+        self.begin_cycles = begin_cycles
+        self.trackers = {core.id: core.tracker for core in system.cores}
+        self.start_cycles = {core.id: 0 for core in system.cores}
+
+    """
+    fast_forward_length: how many instructions of a chunk are still fast-forwarded, given the core's {warming} clock
+    """
+    def fast_forward_length(self, labels, values, position: int, warming: WarmingTracker) -> int:
+        if self.begin_cycles is None:
+            return max(0, min(len(labels), self.begin - position))
+
+        length = len(labels)
+        if self.begin > position:
+            length = min(length, self.begin - position)
+        clock = warming.overall_cycles
+        for i in range(length):
+            if clock >= self.begin_cycles:
+                return i
+            clock += values[i] if labels[i] == OTHERS else 1
+        return length
+
+    """
+    roi_chunks: the chunks of {data} up to the end of the region, fast-forwarding {core_id} until it begins
+    A core pulls its next chunk only once it ran the previous one, so trackers are swapped between two instructions.
+    """
+    def roi_chunks(self, core_id: int, data):
+        core = self.system.cores[core_id]
+        bus = self.system.bus
+        warming = None
+        if self.begin > 0 or self.begin_cycles is not None:
+            warming = WarmingTracker(0, 1)
+            core.tracker = core.cache.tracker = warming
+            bus.trackers[core_id] = NullBusTracker()
+
+        position = 0
+        for labels, values in data:
+            if self.end is not None and position + len(labels) > self.end:
+                labels, values = labels[:self.end - position], values[:self.end - position]
+
+            if warming is not None:
+                length = self.fast_forward_length(labels, values, position, warming)
+                if length > 0:
+                    yield labels[:length], values[:length]
+                    labels, values = labels[length:], values[length:]
+                    position += length
+                if len(labels) > 0:
+                    # The region starts here
+                    tracker = self.trackers[core_id]
+                    tracker.overall_cycles = self.start_cycles[core_id] = warming.overall_cycles
+                    core.tracker = core.cache.tracker = tracker
+                    bus.trackers[core_id] = bus.tracker
+                    warming = None
+
+            if len(labels) > 0:
+                yield labels, values
+                position += len(labels)
+            if self.end is not None and position >= self.end:
+                return
+
+    """
+    finish: restores every core's tracker and counts its cycles from the start of its region
+    """
+    def finish(self) -> None:
+        for core in self.system.cores:
+            tracker = self.trackers[core.id]
+            core.tracker = core.cache.tracker = tracker
+            self.system.bus.trackers[core.id] = self.system.bus.tracker
+            tracker.overall_cycles -= self.start_cycles[core.id]
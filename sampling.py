@@ -0,0 +1,199 @@
+import math
+from enums import Instruction
+from tracker import BusTracker, WarmingTracker, NullBusTracker
+
+"""
+sampling: SMARTS-style sampled simulation
+
+Each core's trace is cut into periods of {period} instructions. Only the last {window} instructions of a period
+are simulated in detail and measured. The rest of the period is functionally warmed: caches, replacement order
+and coherence states are updated as usual, but nothing is counted (the core's trackers are swapped for a
+WarmingTracker and a NullBusTracker). With {warmup} set, only the {warmup} instructions before each window are
+warmed and the rest of the period is skipped outright, which is much faster but leaves the caches colder.
+
+Totals are extrapolated from the windows with ratio estimators (e.g. cycles per instruction x instructions),
+each with a 95% confidence interval from the spread between windows.
+"""
+
+OTHERS = Instruction.OTHERS.value
+SKIP, WARM, DETAIL = 'skip', 'warm', 'detail'
+Z_95 = 1.96
+
+"""
+ratio_estimate: estimate and 95% confidence half-width of sum(numerators) / sum(denominators) over the windows
+"""
+def ratio_estimate(numerators, denominators):
+    n = len(numerators)
+    total = sum(denominators)
+    if n == 0 or total == 0:
+        return 0.0, math.inf
+    ratio = sum(numerators) / total
+    if n < 2:
+        return ratio, math.inf
+    mean = total / n
+    variance = sum((x - ratio * y) ** 2 for x, y in zip(numerators, denominators)) / (n - 1) / n / mean ** 2
+    return ratio, Z_95 * math.sqrt(variance)
+
+"""
+CoreSampler: sampling state of one core: its real trackers, its measured windows and its instruction counts
+"""
+class CoreSampler:
+    def __init__(self, core, bus) -> None:
+        self.core = core
+        self.bus = bus
+        self.tracker = core.tracker                 # Real CoreTracker, active during detailed windows
+        self.bus_tracker = BusTracker()             # Bus activity requested by this core during detailed windows
+        self.memory_cycles = 1                      # Cycles per load / store assumed while warming, from the last window
+        self.warming = None
+        self.start = None
+        self.windows = []                           # One dict of measured deltas per detailed window
+        self.instructions = 0                       # Whole trace, including skipped instructions
+        self.accesses = 0
+
+    def enter(self, phase: str) -> None:
+        if self.start is not None:
+            self.end_window()
+        if phase == DETAIL:
+            self.start_window()
+        else:
+            self.start_warming()
+
+    def start_warming(self) -> None:
+        if self.warming is None:
+            self.warming = WarmingTracker(self.tracker.overall_cycles, self.memory_cycles)
+        self.core.tracker = self.core.cache.tracker = self.warming
+        self.bus.trackers[self.core.id] = NullBusTracker()
+
+    def start_window(self) -> None:
+        if self.warming is not None:
+            self.tracker.overall_cycles = self.warming.overall_cycles
+            self.warming = None
+        self.core.tracker = self.core.cache.tracker = self.tracker
+        self.bus.trackers[self.core.id] = self.bus_tracker
+        self.start = (dict(vars(self.tracker)), dict(vars(self.bus_tracker)), self.instructions)
+
+    def end_window(self) -> None:
+        tracker, bus_tracker, instructions = self.start
+        self.start = None
+        delta = {name: value - tracker[name] for name, value in vars(self.tracker).items()}
+        delta.update({name: value - bus_tracker[name] for name, value in vars(self.bus_tracker).items()})
+        delta['instructions'] = self.instructions - instructions
+        delta['accesses'] = delta['num_load'] + delta['num_store']
+        self.windows.append(delta)
+        if delta['accesses'] > 0:
+            self.memory_cycles = max(1, round((delta['overall_cycles'] - delta['compute_cycles']) / delta['accesses']))
+
+    """
+    skip: accounts for instructions dropped without simulation, moving the warming clock past them
+    """
+    def skip(self, labels, values) -> None:
+        memory = len(labels) - bytes(labels).count(OTHERS)
+        compute = sum(value for label, value in zip(labels, values) if label == OTHERS)
+        if self.warming is not None:
+            self.warming.overall_cycles += compute + memory * self.memory_cycles
+
+    def count(self, labels) -> None:
+        self.instructions += len(labels)
+        self.accesses += len(labels) - bytes(labels).count(OTHERS)
+
+    def estimate(self, numerator: str, denominator: str = 'instructions'):
+        return ratio_estimate([w[numerator] for w in self.windows], [w[denominator] for w in self.windows])
+
+"""
+Sampler: samples every core of {system}. Wrap each core's chunks with sample_chunks before running the system
+"""
+class Sampler:
+    def __init__(self, system, period: int, window: int, warmup: int = None) -> None:
+        if not 0 < window < period:
+            raise ValueError(f'the sample window ({window}) must be shorter than the sample period ({period})')
+        if warmup is not None and not 0 <= warmup <= period - window:
+            raise ValueError(f'the warm-up ({warmup}) must fit in the sample period ({period}) before the window ({window})')
+        self.period = period
+        self.window = window
+        self.warmup = warmup
+        self.cores = [CoreSampler(core, system.bus) for core in system.cores]
+
+    """
+    phase_at: phase of the instruction at {position} of a core's trace, and the position where that phase ends
+    """
+    def phase_at(self, position: int):
+        period_start = position - position % self.period
+        window_start = period_start + self.period - self.window
+        if position >= window_start:
+            return DETAIL, period_start + self.period
+        if self.warmup is not None and position < window_start - self.warmup:
+            return SKIP, window_start - self.warmup
+        return WARM, window_start
+
+    """
+    sample_chunks: the chunks of {data} cut at phase boundaries, without the skipped instructions
+    A core pulls its next chunk only once it ran the previous one, so trackers are swapped between two instructions.
+    """
+    def sample_chunks(self, core_id: int, data):
+        sampler = self.cores[core_id]
+        position = 0
+        current = None
+        for labels, values in data:
+            start = 0
+            while start < len(labels):
+                phase, phase_end = self.phase_at(position)
+                end = min(len(labels), start + phase_end - position)
+                if phase != current:
+                    sampler.enter(phase)
+                    current = phase
+                chunk = labels[start:end], values[start:end]
+                sampler.count(chunk[0])
+                if phase == SKIP:
+                    sampler.skip(*chunk)
+                else:
+                    yield chunk
+                position += end - start
+                start = end
+
+        if current == DETAIL:
+            sampler.end_window()
+
+    """
+    estimates: {name: (estimate, 95% half-width)} of the totals of the run: overall execution cycles of each core
+    (cycles_{id}), miss rate, data traffic, invalidations and updates
+    """
+    def estimates(self):
+        windows = [w for core in self.cores for w in core.windows]
+        result = {'miss_rate': ratio_estimate([w['num_miss'] for w in windows], [w['accesses'] for w in windows])}
+        for core in self.cores:
+            cpi, cpi_error = core.estimate('overall_cycles')
+            result[f'cycles_{core.core.id}'] = (cpi * core.instructions, cpi_error * core.instructions)
+        for name in ['data_traffic', 'num_invalidation', 'num_update']:
+            # Cores are sampled independently, so their variances add up
+            total, variance = 0.0, 0.0
+            for core in self.cores:
+                per_instruction, error = core.estimate(name)
+                total += per_instruction * core.instructions
+                variance += (error * core.instructions / Z_95) ** 2
+            result[name] = (total, Z_95 * math.sqrt(variance))
+        return result
+
+    """
+    report: prints the estimates of the whole run, each with its 95% confidence interval
+    """
+    def report(self) -> None:
+        print(f'##### SAMPLED ESTIMATES (period {self.period}, window {self.window}, '
+              f'warm-up {"full" if self.warmup is None else self.warmup}, 95% confidence) #####')
+        if not any(core.windows for core in self.cores):
+            print('No detailed window: the traces are shorter than one sample period')
+            return
+
+        estimates = self.estimates()
+        for core in self.cores:
+            rate, rate_error = core.estimate('num_miss', 'accesses')
+            cycles, cycles_error = estimates[f'cycles_{core.core.id}']
+            print(f'##### ESTIMATES FOR CORE {core.core.id} ({len(core.windows)} windows) #####')
+            print(f'Overall Execution Cycles: {cycles:.0f} +/- {cycles_error:.0f}')
+            print(f'Number of memory (load/store) operations: {core.accesses}')
+            print(f'Miss rate: {rate:.4f} +/- {rate_error:.4f}')
+
+        print('##### ESTIMATES FOR SHARED BUS #####')
+        print('Data traffic: {:.0f} +/- {:.0f} bytes'.format(*estimates['data_traffic']))
+        print('Number of invalidations: {:.0f} +/- {:.0f}'.format(*estimates['num_invalidation']))
+        print('Number of updates: {:.0f} +/- {:.0f}'.format(*estimates['num_update']))
+        print('Overall miss rate: {:.4f} +/- {:.4f}'.format(*estimates['miss_rate']))
@@ -0,0 +1,99 @@
+from heapq import heapify, heapreplace, heappop
+from trace_reader import skip_instructions
+
+MAX_BATCH = 1 << 12             # Instructions a core runs at most before the scheduler checks for a stop
+
+"""
+CycleScheduler: runs every core on the calling thread in simulated-cycle order
+- Always advances the core with the smallest overall_cycles (ties go to the lowest core id), in batches lasting while it stays the smallest
+- Remote requests can charge cycles to a waiting core, so heap keys are lower bounds: a stale key at the top is refreshed before it runs
+- No threads and no lock contention: the same traces always produce the same interleaving and the same stats
+- Counts the instructions each core has run, so a run can pause between two instructions (see checkpoint.py)
+"""
+class CycleScheduler:
+    def __init__(self) -> None:
+        self.cores = []
+        self.positions = {}             # core id -> instructions run so far (restored when resuming from a checkpoint)
+        self.executed = 0               # Instructions run by all cores
+        self.on_pause = None            # Called with the scheduler every {pause_every} instructions and when stopped
+        self.pause_every = None
+        self.stop_after = None          # Stop once this many instructions have run
+        self.stopping = False
+
+    """
+    add_core: queues {core} to run {data}, skipping the instructions it already ran before a checkpoint
+    """
+    def add_core(self, core, data) -> None:
+        skip = self.positions.setdefault(core.id, 0)
+        if skip > 0:
+            data = skip_instructions(data, skip)
+        self.cores.append((core, data))
+
+    """
+    stop: ends the run after the current batch (at most MAX_BATCH instructions). Safe to call from a signal handler
+    """
+    def stop(self) -> None:
+        self.stopping = True
+        self.next_pause = 0
+
+    def schedule_pause(self) -> None:
+        self.next_pause = float('inf')
+        if self.pause_every is not None:
+            self.next_pause = (self.executed // self.pause_every + 1) * self.pause_every
+        if self.stop_after is not None:
+            self.next_pause = min(self.next_pause, self.stop_after)
+        if self.stopping:
+            self.next_pause = 0
+
+    """
+    pause: calls on_pause. Returns False if the run must stop there
+    """
+    def pause(self) -> bool:
+        if self.stop_after is not None and self.executed >= self.stop_after:
+            self.stopping = True
+        if self.on_pause is not None:
+            self.on_pause(self)
+        if self.stopping:
+            return False
+        self.schedule_pause()
+        return True
+
+    """
+    run: runs the cores until their traces end (returns True) or the run is stopped (returns False)
+    The core at the top of the heap runs a batch of instructions (see Core.steps), for as long as it would still be
+    at the top: its (cycles, id) stays below the smallest other key. That is the interleaving of one instruction
+    per heap update, with the heap only touched where another core's turn comes. Batches also end at the next
+    pause, and after at most MAX_BATCH instructions so that stop is noticed.
+    """
+    def run(self) -> bool:
+        heap = [(core.tracker.overall_cycles, core.id, core, core.steps(data)) for core, data in self.cores]
+        heapify(heap)
+
+        positions = self.positions
+        self.schedule_pause()
+        while heap:
+            cycles, core_id, core, steps = heap[0]
+            current_cycles = core.tracker.overall_cycles
+            if current_cycles != cycles:
+                heapreplace(heap, (current_cycles, core_id, core, steps))
+                continue
+
+            # Smallest key of the other cores (stale keys are lower bounds, as when one instruction runs per turn).
+            # Cycles are whole numbers: the core is still first below bound + 1 cycles if it wins the tie on ids
+            if len(heap) > 1:
+                bound_cycles, bound_id = heap[1][:2] if len(heap) == 2 or heap[1] < heap[2] else heap[2][:2]
+                stop_cycles = bound_cycles if core_id > bound_id else bound_cycles + 1
+            else:
+                stop_cycles = float('inf')
+            core.batch = (stop_cycles, min(self.next_pause - self.executed, MAX_BATCH))
+
+            ran = next(steps, 0)
+            if ran == 0:
+                heappop(heap)
+                continue
+            positions[core_id] += ran
+            self.executed += ran
+            if self.executed >= self.next_pause and not self.pause():
+                return False
+            heapreplace(heap, (core.tracker.overall_cycles, core_id, core, steps))
+        return True
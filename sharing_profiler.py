@@ -0,0 +1,213 @@
+from array import array
+from threading import Lock
+from enums import BlockSource
+
+"""
+sharing_profiler: opt-in per-cache-line sharing counters, with false sharing detection
+
+SharingProfiler.attach wraps the load and store handlers of every core and a few bus methods of a System (instance
+attributes, so a run without the profiler executes the usual code). For each line, identified like in the bus
+directory, it counts:
+- accesses and writes, and the bitmasks of cores that read and wrote it
+- the word offsets each core read and wrote (a bitmask per core, offsets taken modulo 64)
+- invalidations and updates received by the caches holding it, and blocks transferred between caches
+- ping-pongs: writes by a core other than the line's previous writer
+A line is flagged as likely false sharing when at least two cores write it and no word written by one core is
+read or written by another: the cores only share the block, not the data.
+
+Counters live in flat arrays indexed by a slot per line, found through one dict. At most {max_lines} lines are
+tracked: accesses to later lines are only counted as untracked, so memory stays bounded on long traces.
+"""
+
+DEFAULT_MAX_LINES = 1 << 20
+OFFSET_BITS = 64
+REMOTE_CACHE = BlockSource.REMOTE_CACHE
+
+"""
+popcount: number of bits set in {mask}
+"""
+def popcount(mask: int) -> int:
+    return bin(mask).count('1')
+
+class SharingProfiler:
+    def __init__(self, system, max_lines: int = DEFAULT_MAX_LINES) -> None:
+        self.system = system
+        self.directory = system.bus.directory
+        self.cores = len(system.cores)
+        if self.cores > 64:
+            raise ValueError(f'the sharing profiler tracks up to 64 cores, not {self.cores}')
+        self.max_lines = max_lines
+        self.slots = {}                     # line -> slot in the arrays below
+        self.lines = array('Q')             # Line of each slot
+        self.accesses = array('Q')
+        self.writes = array('Q')
+        self.readers = array('Q')           # Bitmask of cores
+        self.writers = array('Q')
+        self.invalidations = array('Q')
+        self.updates = array('Q')
+        self.transfers = array('Q')
+        self.ping_pongs = array('Q')
+        self.last_writer = array('h')       # -1 until the line is first written
+        self.read_offsets = array('Q')      # {cores} bitmasks of word offsets per slot
+        self.write_offsets = array('Q')
+        self.untracked = 0
+        self.lock = Lock()                  # Taken to allocate a slot, so threaded cores never share one
+
+    """
+    slot: slot of {line}, allocated on first use. None once {max_lines} lines are tracked
+    The slot is only published once its counters exist, so other threads never see a slot past the arrays' end.
+    """
+    def slot(self, line: int):
+        slot = self.slots.get(line)
+        if slot is not None:
+            return slot
+        with self.lock:
+            slot = self.slots.get(line)
+            if slot is not None or len(self.slots) >= self.max_lines:
+                return slot
+            slot = len(self.lines)
+            self.lines.append(line)
+            for counters in (self.accesses, self.writes, self.readers, self.writers, self.invalidations, self.updates,
+                             self.transfers, self.ping_pongs):
+                counters.append(0)
+            self.last_writer.append(-1)
+            self.read_offsets.extend([0] * self.cores)
+            self.write_offsets.extend([0] * self.cores)
+            self.slots[line] = slot
+        return slot
+
+    def access(self, core_id: int, tag, cache_index, offset, write: bool) -> None:
+        slot = self.slot(self.directory.line(tag, cache_index))
+        if slot is None:
+            self.untracked += 1
+            return
+        self.accesses[slot] += 1
+        bit = 1 << (offset % OFFSET_BITS)
+        if write:
+            self.writes[slot] += 1
+            self.writers[slot] |= 1 << core_id
+            self.write_offsets[slot * self.cores + core_id] |= bit
+            previous = self.last_writer[slot]
+            if previous != -1 and previous != core_id:
+                self.ping_pongs[slot] += 1
+            self.last_writer[slot] = core_id
+        else:
+            self.readers[slot] |= 1 << core_id
+            self.read_offsets[slot * self.cores + core_id] |= bit
+
+    """
+    count: adds {amount} to {counters} of the line (tag, cache_index), if it is tracked
+    """
+    def count(self, counters, tag, cache_index, amount: int = 1) -> None:
+        slot = self.slots.get(self.directory.line(tag, cache_index))
+        if slot is not None and amount:
+            counters[slot] += amount
+
+    """
+    attach: starts profiling {system}. Call it before the traces are fed
+    """
+    def attach(self) -> None:
+        for core in self.system.cores:
+            if core.handlers is not None:
+                handle_load, handle_store = core.handlers
+                core.handlers = [self.profiled(core.id, handle_load, False), self.profiled(core.id, handle_store, True)]
+
+        bus = self.system.bus
+        flush_all, bus_update_request, deliver_block = bus.flush_all, bus.bus_update_request, bus.deliver_block
+
+        def profiled_flush_all(id, tag, cache_index, offset):
+            self.count(self.invalidations, tag, cache_index, popcount(self.directory.sharers(tag, cache_index) & ~(1 << id)))
+            return flush_all(id, tag, cache_index, offset)
+
+        def profiled_bus_update_request(id, tag, cache_index, offset):
+            self.count(self.updates, tag, cache_index, popcount(self.directory.sharers(tag, cache_index) & ~(1 << id)))
+            return bus_update_request(id=id, tag=tag, cache_index=cache_index, offset=offset)
+
+        def profiled_deliver_block(source, op, target_id, tag, cache_index, offset):
+            if source == REMOTE_CACHE:
+                self.count(self.transfers, tag, cache_index)
+            return deliver_block(source=source, op=op, target_id=target_id, tag=tag, cache_index=cache_index, offset=offset)
+
+        bus.flush_all = profiled_flush_all
+        bus.bus_update_request = profiled_bus_update_request
+        bus.deliver_block = profiled_deliver_block
+
+    def profiled(self, core_id: int, handler, write: bool):
+        access = self.access
+
+        def wrapper(tag, cache_index, offset):
+            access(core_id, tag, cache_index, offset, write)
+            return handler(tag, cache_index, offset)
+        return wrapper
+
+    """
+    offsets: ([read offset mask], [write offset mask]) of each core for {slot}
+    """
+    def offsets(self, slot: int):
+        start = slot * self.cores
+        return list(self.read_offsets[start:start + self.cores]), list(self.write_offsets[start:start + self.cores])
+
+    """
+    false_sharing: whether the line in {slot} is written by several cores that never touch each other's written words
+    """
+    def false_sharing(self, slot: int) -> bool:
+        if popcount(self.writers[slot]) < 2:
+            return False
+        reads, writes = self.offsets(slot)
+        for core in range(self.cores):
+            others = 0
+            for other in range(self.cores):
+                if other != core:
+                    others |= reads[other] | writes[other]
+            if writes[core] & others:
+                return False
+        return True
+
+    def coherence_traffic(self, slot: int) -> int:
+        return self.invalidations[slot] + self.updates[slot] + self.transfers[slot]
+
+    """
+    hottest: slots of the {top} lines with the most coherence traffic (invalidations, updates and transfers)
+    """
+    def hottest(self, top: int):
+        slots = [slot for slot in range(len(self.lines)) if self.coherence_traffic(slot) > 0]
+        slots.sort(key=lambda slot: (-self.coherence_traffic(slot), -self.accesses[slot], self.lines[slot]))
+        return slots[:top]
+
+    def report(self, top: int = 20) -> None:
+        index_bits = self.directory.index_bits
+        shared = [slot for slot in range(len(self.lines)) if popcount(self.readers[slot] | self.writers[slot]) > 1]
+        flagged = [slot for slot in shared if self.false_sharing(slot)]
+        traffic = sum(self.coherence_traffic(slot) for slot in range(len(self.lines)))
+        print(f'##### SHARING PROFILE: {len(self.lines)} lines, {len(shared)} shared by several cores, '
+              f'{len(flagged)} likely falsely shared #####')
+        if self.untracked:
+            print(f'{self.untracked} accesses to lines past the first {self.max_lines} were not tracked')
+        if traffic:
+            print(f'Coherence traffic (invalidations + updates + transfers) of the falsely shared lines: '
+                  f'{sum(self.coherence_traffic(slot) for slot in flagged) / traffic:.1%} of {traffic}')
+
+        print(f'##### TOP {top} LINES BY COHERENCE TRAFFIC #####')
+        print(f'{"tag":>12} {"index":>6} {"accesses":>9} {"writes":>8} {"readers":>10} {"writers":>10} {"invalid.":>9} '
+              f'{"updates":>8} {"transfers":>9} {"ping-pong":>9}  sharing')
+        for slot in self.hottest(top):
+            line = self.lines[slot]
+            verdict = 'FALSE' if self.false_sharing(slot) else 'true' if popcount(self.readers[slot] | self.writers[slot]) > 1 else 'private'
+            print(f'{line >> index_bits:>#12x} {line & ((1 << index_bits) - 1):>6} {self.accesses[slot]:>9} {self.writes[slot]:>8} '
+                  f'{self.readers[slot]:>#10x} {self.writers[slot]:>#10x} {self.invalidations[slot]:>9} {self.updates[slot]:>8} '
+                  f'{self.transfers[slot]:>9} {self.ping_pongs[slot]:>9}  {verdict}')
+
+        flagged.sort(key=lambda slot: -self.coherence_traffic(slot))
+        if flagged:
+            print(f'##### WORDS WRITTEN BY EACH CORE ON THE TOP {min(top, len(flagged))} FALSELY SHARED LINES #####')
+        for slot in flagged[:top]:
+            line = self.lines[slot]
+            _, writes = self.offsets(slot)
+            words = ', '.join(f'core {core}: {offset_list(mask)}' for core, mask in enumerate(writes) if mask)
+            print(f'tag {line >> index_bits:#x} index {line & ((1 << index_bits) - 1)}: {words}')
+
+"""
+offset_list: the word offsets set in {mask}, e.g. '0 1 5'
+"""
+def offset_list(mask: int) -> str:
+    return ' '.join(str(offset) for offset in range(OFFSET_BITS) if mask >> offset & 1)
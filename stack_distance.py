@@ -0,0 +1,195 @@
+import argparse
+from enums import Instruction, Protocol
+from cache import CacheConfig
+from address_mapper import AddressMapper
+from trace_reader import read_trace, find_trace_file, count_trace_files
+from binary_trace import ensure_binary_trace, load_binary_trace
+
+"""
+stack_distance: miss rates of every power-of-two cache size and associativity from one pass over a trace
+
+An LRU set of {associativity} ways hits exactly when fewer than {associativity} other blocks of the same set
+were used since the last use of the block (its stack distance). So for each number of sets, one histogram of
+per-set stack distances gives the misses of every associativity at once:
+    misses(sets, ways) = cold misses + accesses with stack distance >= ways
+Addresses are split with AddressMapper, exactly as Core does, and each core's trace is analysed on its own
+(private LRU caches, without coherence traffic).
+"""
+
+LOAD = Instruction.LOAD.value
+STORE = Instruction.STORE.value
+
+"""
+FenwickTree: prefix sums over a sequence that only grows at the end. Append, add and prefix are O(log n)
+"""
+class FenwickTree:
+    def __init__(self) -> None:
+        self.tree = [0]         # 1-based
+
+    def __len__(self) -> int:
+        return len(self.tree) - 1
+
+    def append(self, value: int) -> int:
+        tree = self.tree
+        index = len(tree)
+        total = value
+        stop = index - (index & -index)
+        child = index - 1
+        while child > stop:
+            total += tree[child]
+            child -= child & -child
+        tree.append(total)
+        return index
+
+    def add(self, index: int, delta: int) -> None:
+        tree = self.tree
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        tree = self.tree
+        total = 0
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+"""
+SetStack: LRU stack of one cache set
+Each use of a block appends a 1 to the tree and clears the 1 of its previous use, so the number of 1s after the
+previous use is the number of distinct blocks used since: its stack distance. The tree is renumbered once it
+holds more than 4x as many cleared entries as blocks, which bounds it to the set's footprint.
+"""
+class SetStack:
+    __slots__ = ('tree', 'last')
+
+    def __init__(self) -> None:
+        self.tree = FenwickTree()
+        self.last = {}          # tag -> index of its latest use in tree
+
+    def access(self, tag: int) -> int:
+        if len(self.tree) >= 4 * len(self.last) + 64:
+            self.compact()
+
+        tree = self.tree
+        last = self.last
+        previous = last.get(tag)
+        if previous is None:
+            distance = -1       # Cold miss
+        else:
+            distance = len(last) - tree.prefix(previous)
+            tree.add(previous, -1)
+        last[tag] = tree.append(1)
+        return distance
+
+    def compact(self) -> None:
+        order = sorted((index, tag) for tag, index in self.last.items())
+        tree = FenwickTree()
+        last = {}
+        for _, tag in order:
+            last[tag] = tree.append(1)
+        self.tree = tree
+        self.last = last
+
+"""
+StackDistanceAnalysis: stack distance histograms of one trace for every power-of-two number of sets
+Covers all caches of {block_size} bytes blocks from {block_size} to {max_cache_size} bytes
+"""
+class StackDistanceAnalysis:
+    def __init__(self, block_size: int, max_cache_size: int, word_size: int = 4) -> None:
+        self.block_size = block_size
+        self.max_cache_size = max_cache_size
+        self.max_blocks = max_cache_size // block_size
+        self.accesses = 0
+        self.levels = []        # (num_set, mapper, sets, histogram) per number of sets
+
+        num_set = 1
+        while num_set <= self.max_blocks:
+            # Any geometry with {num_set} sets splits addresses the same way: use a direct-mapped one
+            config = CacheConfig(size=num_set * block_size, associativity=1, block_size=block_size, word_size=word_size, protocol=Protocol.NONE)
+            mapper = AddressMapper(config)      # Raises ValueError for non power-of-two geometries
+            # histogram[d]: accesses at stack distance d. The last bucket counts cold misses and distances beyond the largest cache
+            histogram = [0] * (self.max_blocks // num_set + 1)
+            self.levels.append((num_set, mapper, [None] * num_set, histogram))
+            num_set *= 2
+
+    """
+    feed: analyses the load / store instructions of {data}, an iterable of (labels, values) chunks
+    """
+    def feed(self, data) -> None:
+        for labels, values in data:
+            memory = [i for i, label in enumerate(labels) if label == LOAD or label == STORE]
+            if not memory:
+                continue
+            addresses = [values[i] for i in memory]
+            self.accesses += len(addresses)
+
+            for num_set, mapper, sets, histogram in self.levels:
+                beyond = len(histogram) - 1
+                tags, indices, _ = mapper.decode_chunk(addresses)
+                for tag, cache_index in zip(tags, indices):
+                    stack = sets[cache_index]
+                    if stack is None:
+                        stack = sets[cache_index] = SetStack()
+                    distance = stack.access(tag)
+                    if distance < 0 or distance > beyond:
+                        distance = beyond
+                    histogram[distance] += 1
+
+    def misses(self, cache_size: int, associativity: int) -> int:
+        num_set = cache_size // self.block_size // associativity
+        for level_sets, _, _, histogram in self.levels:
+            if level_sets == num_set:
+                if associativity >= len(histogram):
+                    raise ValueError(f'{cache_size} bytes is larger than the analysed maximum of {self.max_cache_size} bytes')
+                return self.accesses - sum(histogram[:associativity])
+        raise ValueError(f'no analysis for {cache_size} bytes, {associativity}-way ({num_set} sets)')
+
+    def miss_rate(self, cache_size: int, associativity: int) -> float:
+        return self.misses(cache_size, associativity) / self.accesses if self.accesses > 0 else 0.0
+
+    """
+    curves: (cache_size, associativity, misses, miss rate) of every power-of-two cache, direct-mapped to fully associative
+    """
+    def curves(self):
+        cache_size = self.block_size
+        while cache_size <= self.max_cache_size:
+            associativity = 1
+            while associativity <= cache_size // self.block_size:
+                yield cache_size, associativity, self.misses(cache_size, associativity), self.miss_rate(cache_size, associativity)
+                associativity *= 2
+            cache_size *= 2
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - single-pass LRU miss rates of every cache size and associativity')
+    parser.add_argument('trace', help='Trace name, e.g. bodytrack reads traces/bodytrack_{core}.data')
+    parser.add_argument('block_size', type=int, help='Block size in bytes')
+    parser.add_argument('max_cache_size', type=int, help='Largest cache size analysed, in bytes')
+    parser.add_argument('--cores', type=int, default=None, help='Number of trace files analysed (default: all found)')
+    parser.add_argument('--binary', action='store_true', help='Read the traces through their binary copies (see binary_trace)')
+    parser.add_argument('--output', default=None, help='Also write the curves to this CSV file')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    cores = args.cores if args.cores is not None else count_trace_files(args.trace)
+
+    rows = []
+    for core_id in range(cores):
+        trace_filename = find_trace_file(args.trace, core_id)
+        data = load_binary_trace(ensure_binary_trace(trace_filename)) if args.binary else read_trace(trace_filename)
+        analysis = StackDistanceAnalysis(args.block_size, args.max_cache_size)
+        analysis.feed(data)
+
+        print(f'##### MISS RATES FOR CORE {core_id} ({analysis.accesses} memory operations) #####')
+        print(f'{"cache size":>12} {"ways":>6} {"sets":>6} {"misses":>10} {"miss rate":>10}')
+        for cache_size, associativity, misses, miss_rate in analysis.curves():
+            print(f'{cache_size:>12} {associativity:>6} {cache_size // args.block_size // associativity:>6} {misses:>10} {miss_rate:>10.4f}')
+            rows.append((core_id, cache_size, associativity, misses, miss_rate))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write('core,cache_size,associativity,misses,miss_rate\n')
+            for row in rows:
+                f.write(','.join(str(value) for value in row) + '\n')
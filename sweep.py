@@ -0,0 +1,154 @@
+import argparse
+import csv
+import io
+import itertools
+import os
+import time
+from array import array
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from cache import CacheConfig
+from system import System
+from trace_reader import read_trace, find_trace_file, count_trace_files, DEFAULT_BUFFER_SIZE
+from binary_trace import binary_chunks, binary_size, pack_trace
+from replacement import POLICIES
+from main import parse_protocol, feed_chunks, DEFAULT_ADDRESS_OFFSET
+
+"""
+sweep: runs every point of a protocol x trace x cache size x associativity x block size grid on a process pool
+- Each trace file is parsed once, into a shared memory block laid out like a binary trace (see binary_trace)
+- Workers attach to the blocks by name and read them as zero-copy memoryviews, so no run parses or copies a trace
+- Every run's stats are gathered into one table, printed and written as CSV
+Addresses are still split into tag / index / offset by each run, since that depends on the cache geometry.
+
+Usage: python3 sweep.py --protocols MESI DRAGON --traces bodytrack --cache-sizes 1024 4096 16384 --associativity 1 2 4 --block-sizes 16 32
+"""
+
+COLUMNS = ['protocol', 'trace', 'cache_size', 'associativity', 'block_size', 'replacement', 'cores',
+           'cycles', 'accesses', 'misses', 'miss_rate', 'private_accesses', 'shared_accesses',
+           'data_traffic', 'invalidations_updates', 'cpu_seconds']
+
+"""
+SharedTrace: one parsed trace file held in shared memory. Picklable by name, so it can be handed to workers
+"""
+class SharedTrace:
+    def __init__(self, name: str, count: int) -> None:
+        self.name = name
+        self.count = count
+
+    """
+    create: parses {filename} and copies it into a new shared memory block. Returns (SharedTrace, SharedMemory)
+    The caller owns the block and must unlink it.
+    """
+    @staticmethod
+    def create(filename: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        labels = bytearray()
+        values = array('Q')
+        for chunk_labels, chunk_values in read_trace(filename, buffer_size=buffer_size):
+            labels.extend(chunk_labels)
+            values.extend(chunk_values)
+
+        shm = SharedMemory(create=True, size=max(binary_size(len(labels)), 1))
+        pack_trace(shm.buf, labels, values)
+        return SharedTrace(shm.name, len(labels)), shm
+
+# Shared memory blocks attached by this worker process, by name. Kept open for the life of the worker
+attached = {}
+
+def attach(shared: SharedTrace):
+    if shared.name not in attached:
+        attached[shared.name] = SharedMemory(name=shared.name)
+    return binary_chunks(attached[shared.name].buf, shared.count)
+
+"""
+run_point: simulates one grid point with the event scheduler and returns its row of the results table
+{shared_traces} are the SharedTraces of the point's trace, one per trace file
+"""
+def run_point(point):
+    protocol_name, trace, cache_size, associativity, block_size, replacement, cores, shared_traces, address_offset = point
+    row = {'protocol': protocol_name, 'trace': trace, 'cache_size': cache_size, 'associativity': associativity,
+           'block_size': block_size, 'replacement': replacement, 'cores': cores}
+
+    protocol = parse_protocol(protocol_name)
+    config = CacheConfig(size=cache_size, associativity=associativity, block_size=block_size, word_size=4, protocol=protocol, replacement=replacement)
+    try:
+        system = System(protocol=protocol, processor_num=cores, cache_config=config, filename=os.devnull, scheduler='event')
+    except ValueError as e:
+        row['error'] = str(e)
+        return row
+
+    start = time.process_time()
+    feed_chunks(system, lambda index: attach(shared_traces[index]), cores, len(shared_traces), address_offset)
+    with redirect_stdout(io.StringIO()):
+        system.trace()
+    row['cpu_seconds'] = round(time.process_time() - start, 3)
+
+    row.update(system.summary())
+    return row
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stardust - parallel parameter sweep')
+    parser.add_argument('--protocols', nargs='+', default=['MESI'], help='MESI, MOESI and / or DRAGON')
+    parser.add_argument('--traces', nargs='+', required=True, help='Trace names, e.g. bodytrack blackscholes')
+    parser.add_argument('--cache-sizes', nargs='+', type=int, default=[4096], help='Cache sizes in bytes')
+    parser.add_argument('--associativity', nargs='+', type=int, default=[2], help='Associativities')
+    parser.add_argument('--block-sizes', nargs='+', type=int, default=[32], help='Block sizes in bytes')
+    parser.add_argument('--replacement', nargs='+', choices=list(POLICIES), default=['lru'], help='Replacement policies')
+    parser.add_argument('--cores', nargs='+', type=int, default=[4], help='Core counts (trace files are reused as with main.py --cores)')
+    parser.add_argument('--address-offset', type=lambda value: int(value, 0), default=DEFAULT_ADDRESS_OFFSET,
+                        help='Added to the addresses of each further core reusing a trace file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: one per CPU)')
+    parser.add_argument('--output', default='sweep.csv', help='CSV file receiving the results table (default sweep.csv)')
+    return parser.parse_args(argv)
+
+def print_table(rows) -> None:
+    print(' '.join(f'{column:>12}' for column in COLUMNS))
+    for row in rows:
+        if 'error' in row:
+            print(' '.join(f'{row[column]:>12}' for column in COLUMNS[:7]) + f'  skipped: {row["error"]}')
+        else:
+            print(' '.join(f'{row[column]:>12}' for column in COLUMNS))
+
+if __name__ == "__main__":
+    args = parse_args()
+    max_cores = max(args.cores)
+
+    # Parse every trace file once
+    blocks = []
+    shared = {}
+    try:
+        for trace in args.traces:
+            trace_files = min(count_trace_files(trace), max_cores)
+            if trace_files == 0:
+                find_trace_file(trace, 0)   # Raises FileNotFoundError listing the files tried
+            shared[trace] = []
+            for index in range(trace_files):
+                shared_trace, shm = SharedTrace.create(find_trace_file(trace, index))
+                blocks.append(shm)
+                shared[trace].append(shared_trace)
+            print(f'{trace}: {trace_files} trace files, {sum(t.count for t in shared[trace])} instructions')
+
+        points = [(protocol, trace, cache_size, associativity, block_size, replacement, cores, shared[trace][:cores], args.address_offset)
+                  for protocol, trace, cache_size, associativity, block_size, replacement, cores
+                  in itertools.product(args.protocols, args.traces, args.cache_sizes, args.associativity, args.block_sizes, args.replacement, args.cores)]
+        print(f'Running {len(points)} configurations on {args.workers} workers')
+
+        start = time.perf_counter()
+        with Pool(processes=args.workers) as pool:
+            rows = pool.map(run_point, points, chunksize=1)
+        elapsed = time.perf_counter() - start
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    print_table(rows)
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS + ['error'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    simulated = sum(row.get('cpu_seconds', 0) for row in rows)
+    print(f'\n{len(rows)} configurations in {elapsed:.2f}s ({simulated:.2f} CPU seconds of simulation, {simulated / elapsed:.1f}x parallel speed-up)')
+    print(f'Results written to {args.output}')
@@ -1,26 +1,76 @@
+import functools
 import threading
+from contextlib import redirect_stdout
 from enums import Protocol
 from cache import Cache, CacheConfig
 from core import Core
-from tracker import CoreTracker, BusTracker
+from tracker import CoreTracker, LockedCoreTracker, BusTracker
 from bus import Bus
-from threading import Lock
-import sys
+from address_mapper import AddressMapper
+from scheduler import CycleScheduler
+from threading import RLock
 
-# 1 protocol, 1 shared bus, 4 processors with 1 L1 cache each
+SCHEDULERS = ['threads', 'event']
+LOCKINGS = ['global', 'striped']
+DEFAULT_STRIPES = 64
+
+# 1 protocol, 1 shared bus, {processor_num} processors (4 by default) with 1 L1 cache each
+# scheduler: 'threads' runs one thread per core, 'event' interleaves all cores deterministically in cycle order on one thread
+# locking: 'global' serialises bus requests on one lock. 'striped' gives each group of cache sets ({stripes} groups,
+# at most one per set) its own lock, held by a core for a whole load or store, so that cores working on different
+# sets run concurrently (e.g. on a free-threaded Python) while every set sees its requests one at a time
+# shared_lines: with the set of lines several cores access (see private_lines.py), misses on any other line are
+# filled from memory without a bus request
 class System:
-    def __init__(self, protocol: Protocol, processor_num: int, cache_config: CacheConfig, filename: str) -> None:
+    def __init__(self, protocol: Protocol, processor_num: int, cache_config: CacheConfig, filename: str, scheduler: str = 'threads',
+                 locking: str = 'global', stripes: int = DEFAULT_STRIPES, shared_lines=None) -> None:
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f'unknown scheduler {scheduler}, expected one of {", ".join(SCHEDULERS)}')
+        if locking not in LOCKINGS:
+            raise ValueError(f'unknown locking {locking}, expected one of {", ".join(LOCKINGS)}')
+
         self.protocol = protocol
-        self.bus = Bus(BusTracker(), cache_config=cache_config, lock=Lock())
+        self.mapper = AddressMapper(cache_config)     # Raises ValueError for non power-of-two geometries
+        self.locking = locking
+        stripes = min(stripes, self.mapper.num_set) if locking == 'striped' else 1
+        # Bus locks are reentrant: a striped core holding its set's lock for an instruction, or an event log holding it
+        # around a request (see eventlog.py), takes it again in the bus request
+        self.bus = Bus(BusTracker(), cache_config=cache_config, lock=RLock(), stripes=stripes)
         self.cores = []
         self.filename = filename
         for i in range(0, processor_num):
-            shared_tracker = CoreTracker()
+            shared_tracker = LockedCoreTracker() if locking == 'striped' else CoreTracker()
             new_cache = Cache(id=i, cache_config=cache_config, tracker=shared_tracker)
             # Both bus and core has access to given cache
-            self.cores.append(Core(id=i, bus=self.bus, cache=new_cache, tracker=shared_tracker, protocol=protocol))
+            self.cores.append(Core(id=i, bus=self.bus, cache=new_cache, tracker=shared_tracker, protocol=protocol, mapper=self.mapper))
             self.bus.add_cache(new_cache)
+        if shared_lines is not None:
+            # Misses on the other lines skip the bus (see Core.bypass_private_lines). Threads racing over one
+            # global lock keep it for the fills; a striped core already holds its set's lock
+            for core in self.cores:
+                core.bypass_private_lines(shared_lines, locked=scheduler == 'threads' and locking == 'global')
+        if locking == 'striped':
+            self.bus.shard_trackers()
+            for core in self.cores:
+                if core.handlers is not None:
+                    core.handlers = [self.striped(handler) for handler in core.handlers]
+        self.scheduler = scheduler
         self.threads = []
+        self.event_scheduler = CycleScheduler()
+
+    """
+    striped: {handler} holding the lock of its set for the whole instruction, so that its cache lookup, state change
+    and bus request are never interleaved with another core's request on the same set
+    """
+    def striped(self, handler):
+        bus = self.bus
+
+        # The locks are looked up on each call: a profiler may replace them after the handlers are wrapped
+        @functools.wraps(handler)
+        def locked_handler(tag, cache_index, offset):
+            with bus.locks[cache_index & bus.stripe_mask]:
+                handler(tag, cache_index, offset)
+        return locked_handler
 
     def get_protocol(self) -> str:
         return self.protocol
@@ -29,22 +79,75 @@ class System:
         return self.cache
 
     def add_thread(self, data, core_id) -> None:
-        t = threading.Thread(target=self.cores[core_id].trace, args=(data,))
-        self.threads.append(t)
+        if self.scheduler == 'event':
+            self.event_scheduler.add_core(self.cores[core_id], data)
+        else:
+            t = threading.Thread(target=self.cores[core_id].trace, args=(data,))
+            self.threads.append(t)
 
-    def trace(self):
-        for thread in self.threads:
-            thread.start()
+    """
+    trace: runs every core to the end of its trace, then prints and writes the stats. Returns True
+    Returns False without writing stats if the event scheduler was stopped early (see CycleScheduler.stop)
+    """
+    def trace(self) -> bool:
+        if not self.run():
+            return False
+        self.write_stats()
+        return True
 
-        # Wait for all threads to finish
-        for thread in self.threads:
-            thread.join()
+    """
+    run: runs the cores. Returns False if the event scheduler was stopped before the traces ended
+    """
+    def run(self) -> bool:
+        if self.scheduler == 'event':
+            finished = self.event_scheduler.run()
+        else:
+            for thread in self.threads:
+                thread.start()
+
+            # Wait for all threads to finish
+            for thread in self.threads:
+                thread.join()
+            finished = True
+
+        if self.locking == 'striped':
+            self.bus.merge_trackers()
+        return finished
+
+    """
+    write_stats: prints each cache's footprint, and writes the stats to {filename}
+    """
+    def write_stats(self) -> None:
+        for core in self.cores:
+            footprint, allocated = core.cache.footprint()
+            print(f'Cache {core.id} memory footprint: {footprint} bytes ({allocated} of {len(core.cache.sets)} sets allocated)')
 
         print("\n\n**STATISTICS**\n\n")
         
         # Direct this to a file instead of stdout
-        with open(self.filename, 'w+') as sys.stdout:
-            for core in self.cores:
-                core.print_stats()
+        with open(self.filename, 'w+') as f, redirect_stdout(f):
+            self.print_stats()
+
+    """
+    summary: totals of the run over all cores, as a flat dict (e.g. for a results table)
+    """
+    def summary(self) -> dict:
+        trackers = [core.tracker for core in self.cores]
+        accesses = sum(tracker.num_load + tracker.num_store for tracker in trackers)
+        misses = sum(tracker.num_miss for tracker in trackers)
+        return {
+            'cycles': max(tracker.overall_cycles for tracker in trackers),
+            'accesses': accesses,
+            'misses': misses,
+            'miss_rate': round(misses / accesses, 4) if accesses > 0 else 0,
+            'private_accesses': sum(tracker.num_private_access for tracker in trackers),
+            'shared_accesses': sum(tracker.num_shared_access for tracker in trackers),
+            'data_traffic': self.bus.tracker.data_traffic,
+            'invalidations_updates': self.bus.tracker.num_invalidation + self.bus.tracker.num_update,
+        }
+
+    def print_stats(self):
+        for core in self.cores:
+            core.print_stats()
 
-            self.bus.print_stats()
\ No newline at end of file
+        self.bus.print_stats()
@@ -0,0 +1,174 @@
+import json
+import socket
+import threading
+import time
+
+"""
+telemetry: live progress of a running System, as JSON lines written to a file or a Unix socket
+
+Telemetry.counted_chunks passes each core's trace chunks through in slices of at most SLICE instructions, and counts
+a slice as retired when the core asks for the next one: the hot loop itself is untouched, and the counts are exact
+to within one slice. A sample is written every {interval} seconds (from a timer thread) and/or every {every}
+instructions retired by all cores together (by the core crossing the mark, at the end of its slice).
+
+Lines written, each one JSON object:
+- {"type": "start", ...}: protocol, cores, scheduler, interval and every
+- {"type": "sample", ...}: seq, time (Unix), elapsed seconds, instructions retired, loads and stores, simulated
+  accesses per second since the start and since the previous sample, bus counters, and per core: instructions,
+  cycles, loads, stores, misses and miss rate
+- {"type": "end", ...}: a last sample once the run is over
+Counters are read from the trackers while the cores run, without locks: a sample is a consistent snapshot of no
+single instant, but each value is one a counter actually held. With sampling or a region of interest, these are
+the counters of the trackers in use at that moment.
+
+A target of the form unix:PATH connects to a listening Unix stream socket at PATH. If the file or socket fails,
+telemetry stops and {error} keeps the reason: the run itself goes on.
+"""
+
+SLICE = 4096
+UNIX_PREFIX = 'unix:'
+BUS_COUNTERS = ['data_traffic', 'num_invalidation', 'num_update']
+
+class Telemetry:
+    def __init__(self, system, target: str, interval: float = None, every: int = None) -> None:
+        if interval is not None and interval <= 0:
+            raise ValueError(f'the telemetry interval must be positive, not {interval}')
+        if every is not None and every <= 0:
+            raise ValueError(f'the telemetry instruction count must be positive, not {every}')
+        self.system = system
+        self.target = target
+        self.interval = interval
+        self.every = every
+        self.next_sample = every            # Instructions retired at which the next counted sample is due
+        self.instructions = [0] * len(system.cores)
+        self.retired = 0
+        self.lock = threading.Lock()        # Guards {retired}, {next_sample} and the output
+        self.done = threading.Event()
+        self.timer = None
+        self.output = None
+        self.error = None
+        self.seq = 0
+        self.started = None
+        self.previous = None                # (elapsed, accesses) of the previous sample
+
+        if target.startswith(UNIX_PREFIX):
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.connect(target[len(UNIX_PREFIX):])
+            except OSError:
+                connection.close()
+                raise
+            self.output = connection.makefile('w', buffering=1)
+            connection.close()                  # The file object keeps the connection open
+        else:
+            self.output = open(target, 'w', buffering=1)
+
+    """
+    counted_chunks: passes the chunks of core {core_id}'s {data} through in slices, counting the instructions retired
+    Use it as the outermost chunk wrapper, e.g. feed_traces(..., wrap=telemetry.counted_chunks)
+    """
+    def counted_chunks(self, core_id: int, data):
+        for labels, values in data:
+            for start in range(0, len(labels), SLICE):
+                end = min(len(labels), start + SLICE)
+                yield labels[start:end], values[start:end]
+                self.retire(core_id, end - start)
+
+    def retire(self, core_id: int, count: int) -> None:
+        self.instructions[core_id] += count
+        with self.lock:
+            self.retired += count
+            if self.every is not None and self.retired >= self.next_sample:
+                self.next_sample = (self.retired // self.every + 1) * self.every
+                self.write('sample')
+
+    """
+    start: writes the start line and starts the timer. Call it right before the run
+    """
+    def start(self) -> None:
+        system = self.system
+        self.started = time.perf_counter()
+        self.previous = (0.0, 0)
+        with self.lock:
+            self.send({'type': 'start', 'time': time.time(), 'protocol': system.protocol.name, 'cores': len(system.cores),
+                       'scheduler': system.scheduler, 'interval': self.interval, 'every': self.every})
+        if self.interval is not None:
+            self.timer = threading.Thread(target=self.tick, daemon=True)
+            self.timer.start()
+
+    def tick(self) -> None:
+        while not self.done.wait(self.interval):
+            with self.lock:
+                self.write('sample')
+
+    """
+    stop: stops the timer, writes the end line and closes the output. Call it once the run is over
+    """
+    def stop(self) -> None:
+        self.done.set()
+        if self.timer is not None:
+            self.timer.join()
+        with self.lock:
+            self.write('end')
+            if self.output is not None:
+                try:
+                    self.output.close()
+                except OSError as e:
+                    self.error = self.error or e
+                self.output = None
+
+    """
+    snapshot: the counters of the run so far, as a dict
+    """
+    def snapshot(self) -> dict:
+        system = self.system
+        cores = []
+        for core in system.cores:
+            tracker = core.tracker      # Warming trackers (sampling, region of interest) only count cycles
+            loads, stores, misses = (getattr(tracker, name, 0) for name in ('num_load', 'num_store', 'num_miss'))
+            cores.append({'core': core.id, 'instructions': self.instructions[core.id], 'cycles': getattr(tracker, 'overall_cycles', 0),
+                          'loads': loads, 'stores': stores, 'misses': misses,
+                          'miss_rate': misses / (loads + stores) if loads + stores else 0.0})
+
+        # Cores may have their own bus trackers (sampling, striped locking): count each tracker once
+        bus = system.bus
+        trackers = {id(tracker): tracker for tracker in [bus.tracker, *list(bus.trackers.values())]}
+        bus_counters = {name: sum(getattr(tracker, name, 0) for tracker in trackers.values()) for name in BUS_COUNTERS}
+
+        elapsed = time.perf_counter() - self.started
+        accesses = sum(core['loads'] + core['stores'] for core in cores)
+        previous_elapsed, previous_accesses = self.previous
+        self.previous = (elapsed, accesses)
+        return {
+            'seq': self.seq,
+            'time': time.time(),
+            'elapsed': elapsed,
+            'instructions': self.retired,
+            'accesses': accesses,
+            'accesses_per_second': accesses / elapsed if elapsed > 0 else 0.0,
+            'recent_accesses_per_second': (accesses - previous_accesses) / (elapsed - previous_elapsed) if elapsed > previous_elapsed else 0.0,
+            'bus': bus_counters,
+            'cores': cores,
+        }
+
+    """
+    write: writes a {kind} line with a snapshot. Hold {lock}
+    """
+    def write(self, kind: str) -> None:
+        if self.output is None:
+            return
+        self.send({'type': kind, **self.snapshot()})
+        self.seq += 1
+
+    def send(self, record: dict) -> None:
+        if self.output is None:
+            return
+        try:
+            self.output.write(json.dumps(record) + '\n')
+        except OSError as e:
+            self.error = e
+            try:
+                self.output.close()
+            except OSError:
+                pass
+            self.output = None
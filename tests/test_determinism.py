@@ -0,0 +1,23 @@
+import os
+import pytest
+from enums import Protocol
+from benchmarks.common import simulate
+from benchmarks.workloads import generate
+
+"""
+identical_runs: (whether two runs agree bit for bit, stats of the first, memory accesses, seconds) of one configuration
+"""
+def identical_runs(protocol, trace, cache_size, associativity, block_size, scheduler='event'):
+    first, accesses, seconds = simulate(protocol, trace, cache_size, associativity, block_size, scheduler=scheduler)
+    second, _, _ = simulate(protocol, trace, cache_size, associativity, block_size, scheduler=scheduler)
+    return first == second, first, accesses, seconds
+
+@pytest.mark.parametrize('workload', ['migratory', 'false_sharing', 'producer_consumer'])
+@pytest.mark.parametrize('protocol', [Protocol.MESI, Protocol.MOESI, Protocol.DRAGON])
+def test_event_scheduler_is_deterministic(protocol, workload, tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'traces')
+    trace = generate(workload, 2000, directory=str(tmp_path / 'traces'))
+    monkeypatch.chdir(tmp_path)
+    identical, stats, accesses, _ = identical_runs(protocol, trace, 1024, 2, 32)
+    assert accesses > 0 and stats
+    assert identical
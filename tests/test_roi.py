@@ -0,0 +1,49 @@
+import io
+import os
+from contextlib import redirect_stdout
+from cache import CacheConfig
+from enums import Instruction, Protocol
+from system import System
+from main import feed_traces
+from roi import RegionOfInterest
+
+LOAD = Instruction.LOAD.value
+STORE = Instruction.STORE.value
+LINE = 13                   # Characters of each trace line written by write_trace ('0 0x00100000\n')
+LENGTH = 200
+
+"""
+write_trace: writes traces/roi_{core}.data under {directory}, {LENGTH} loads and stores per core of LINE characters
+"""
+def write_trace(directory, cores: int) -> None:
+    os.makedirs(os.path.join(directory, 'traces'))
+    for core in range(cores):
+        with open(os.path.join(directory, 'traces', f'roi_{core}.data'), 'w') as f:
+            for i in range(LENGTH):
+                f.write(f'{STORE if i % 3 == 0 else LOAD} {0x100000 + core * 0x1000 + i * 8:#010x}\n')
+
+def run_region(begin: int, buffer_size: int, cores: int = 2):
+    protocol = Protocol.MESI
+    config = CacheConfig(size=4096, associativity=2, block_size=32, word_size=4, protocol=protocol)
+    system = System(protocol=protocol, processor_num=cores, cache_config=config, filename=os.devnull, scheduler='event')
+    roi = RegionOfInterest(system, begin)
+    feed_traces(system, 'roi', cores, buffer_size=buffer_size, wrap=roi.roi_chunks)
+    with redirect_stdout(io.StringIO()):
+        system.run()
+    roi.finish()
+    return [core.tracker.num_load + core.tracker.num_store for core in system.cores]
+
+def test_region_starts_on_a_chunk_boundary(tmp_path, monkeypatch):
+    write_trace(tmp_path, 2)
+    monkeypatch.chdir(tmp_path)
+    chunk = 10
+    for begin in [chunk, 2 * chunk, chunk - 1, chunk + 1]:
+        assert run_region(begin, buffer_size=chunk * LINE) == [LENGTH - begin] * 2, begin
+
+def test_fast_forward_length_stops_at_the_instruction_bound():
+    roi = RegionOfInterest(System(Protocol.MESI, 1, CacheConfig(4096, 2, 32, 4, Protocol.MESI), os.devnull, 'event'), 10)
+    labels, values = [LOAD] * 10, [0] * 10
+    assert roi.fast_forward_length(labels, values, 0, None) == 10
+    assert roi.fast_forward_length(labels, values, 10, None) == 0
+    assert roi.fast_forward_length(labels, values, 15, None) == 0
+    assert roi.fast_forward_length(labels, values, 5, None) == 5
@@ -0,0 +1,36 @@
+import os
+import pytest
+from enums import Protocol
+from trace_reader import read_trace, find_trace_file
+from stack_distance import StackDistanceAnalysis
+from benchmarks.common import run_system
+from benchmarks.workloads import generate
+
+"""
+cross_check: (analysed misses, simulated misses, seconds simulating) of core 0 of {trace} alone (MESI, so no remote
+cache ever interferes) in a cache of {cache_size} bytes and {associativity} ways
+"""
+def cross_check(analysis, trace, block_size: int, cache_size: int, associativity: int):
+    system, _, seconds = run_system(Protocol.MESI, trace, cache_size, associativity, block_size, processor_num=1, trace_files=1)
+    return analysis.misses(cache_size, associativity), system.cores[0].tracker.num_miss, seconds
+
+"""
+check_points: (cache size, associativity) pairs to cross-check: direct-mapped, 2-way and fully associative at the
+smallest, a middle and the largest size
+"""
+def check_points(block_size: int, max_cache_size: int):
+    sizes = sorted({block_size * 4, max_cache_size // 4, max_cache_size} - {0})
+    return [(size, ways) for size in sizes if size >= block_size for ways in sorted({1, 2, size // block_size})
+            if ways <= size // block_size]
+
+@pytest.mark.parametrize('workload', ['private', 'read_shared', 'migratory'])
+def test_miss_counts_match_the_simulator(workload, tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'traces')
+    trace = generate(workload, 3000, cores=1, directory=str(tmp_path / 'traces'))
+    monkeypatch.chdir(tmp_path)
+    block_size, max_cache_size = 16, 2048
+    analysis = StackDistanceAnalysis(block_size, max_cache_size)
+    analysis.feed(read_trace(find_trace_file(trace, 0)))
+    for cache_size, associativity in check_points(block_size, max_cache_size):
+        analysed, simulated, _ = cross_check(analysis, trace, block_size, cache_size, associativity)
+        assert analysed == simulated, (cache_size, associativity)
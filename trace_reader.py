@@ -0,0 +1,114 @@
+import bz2
+import gzip
+import lzma
+import os
+from enums import Instruction
+
+"""
+trace_reader: lazily streams a trace file to a core in buffered chunks
+- Each chunk is a pair (labels, values) of equal length sequences of ints
+- Values are decoded from hex: an address for loads / stores, a cycle count for other instructions
+- Only {buffer_size} characters of trace text (plus the chunk parsed from it) are held in memory at once
+- Traces compressed with gzip, bzip2 or xz are decompressed on the fly, never on disk
+"""
+
+DEFAULT_BUFFER_SIZE = 1 << 20       # 1M characters of trace text per chunk
+OTHERS = Instruction.OTHERS.value   # Other instructions carry a cycle count instead of an address
+TRACE_EXTENSIONS = ['.data', '.data.gz', '.data.bz2', '.data.xz']
+OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+"""
+find_trace_file: path of the trace for {core_id}, plain or compressed: traces/{trace}_{core_id}.data[.gz|.bz2|.xz]
+"""
+def find_trace_file(trace: str, core_id: int, directory: str = 'traces') -> str:
+    candidates = [os.path.join(directory, f'{trace}_{core_id}{extension}') for extension in TRACE_EXTENSIONS]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f'No trace file for core {core_id}, tried {", ".join(candidates)}')
+
+"""
+count_trace_files: number of consecutive trace files traces/{trace}_0, traces/{trace}_1, ... that exist
+"""
+def count_trace_files(trace: str, directory: str = 'traces') -> int:
+    count = 0
+    while any(os.path.exists(os.path.join(directory, f'{trace}_{count}{extension}')) for extension in TRACE_EXTENSIONS):
+        count += 1
+    return count
+
+"""
+open_trace: opens {filename} as text, decompressing it as a stream if it ends with .gz, .bz2 or .xz
+"""
+def open_trace(filename: str):
+    opener = OPENERS.get(os.path.splitext(filename)[1], open)
+    return opener(filename, "rt")
+
+"""
+parse_lines: parses `Label HexValue` lines into a chunk. Malformed lines are skipped.
+"""
+def parse_lines(lines):
+    labels = []
+    values = []
+
+    for line in lines:
+        split_line = line.split(' ')
+        if len(split_line) == 2:
+            label, value = split_line
+            labels.append(int(label))
+            values.append(int(value, 16))
+
+    return labels, values
+
+"""
+read_trace: opens {filename} and returns a generator yielding its chunks
+The file is opened eagerly so that a missing trace fails before the simulation starts.
+"""
+def read_trace(filename: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+    return read_chunks(open_trace(filename), buffer_size)
+
+"""
+read_chunks: generator yielding chunks of the open trace file {f}, closing it once exhausted
+A line cut in half by the end of a buffer is carried over to the next read.
+"""
+def read_chunks(f, buffer_size: int = DEFAULT_BUFFER_SIZE):
+    with f:
+        remainder = ''
+        while True:
+            buffer = f.read(buffer_size)
+            if not buffer:
+                break
+
+            lines = (remainder + buffer).split('\n')
+            remainder = lines.pop()
+            chunk = parse_lines(lines)
+            del lines
+            yield chunk
+
+        if remainder:
+            yield parse_lines([remainder])
+
+"""
+offset_addresses: shifts every load / store address of the chunks in {data} by {offset}. Cycle counts are left untouched
+Lets one trace file feed several cores without the copies sharing any data.
+"""
+def offset_addresses(data, offset: int):
+    for labels, values in data:
+        yield labels, [value if label == OTHERS else value + offset for label, value in zip(labels, values)]
+
+"""
+skip_instructions: the chunks of {data} without their first {count} instructions
+Used to resume a core part-way through its trace.
+"""
+def skip_instructions(data, count: int):
+    for labels, values in data:
+        if count >= len(labels):
+            count -= len(labels)
+            continue
+        if count > 0:
+            labels, values = labels[count:], values[count:]
+            count = 0
+        yield labels, values
@@ -1,6 +1,54 @@
+import json
+from array import array
+from threading import Lock
 from enums import BlockState
 
+"""
+LatencyModel: cycles charged by a CoreTracker
+- hit: each cache lookup, hit or not
+- memory: stall of a block loaded from memory
+- evict: stall of an eviction or flush (the write-back)
+- word: stall per word received from a remote cache
+stall is what replay.py calls for every event of a recorded run: subclasses can override it, e.g. to charge
+time-dependent latencies. A direct run only reads the four attributes.
+"""
+class LatencyModel:
+    FIELDS = ['hit', 'memory', 'evict', 'word']
+
+    def __init__(self, hit: int = 1, memory: int = 100, evict: int = 100, word: int = 2) -> None:
+        self.hit = hit
+        self.memory = memory
+        self.evict = evict
+        self.word = word
+
+    """
+    from_file: model read from a JSON file of some of FIELDS, e.g. {"memory": 200}; the others keep their defaults
+    """
+    @classmethod
+    def from_file(cls, filename: str):
+        with open(filename) as f:
+            values = json.load(f)
+        if not isinstance(values, dict):
+            raise ValueError(f'{filename} must hold a JSON object of {", ".join(cls.FIELDS)}')
+        unknown = set(values) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f'unknown latencies {", ".join(sorted(unknown))}, expected {", ".join(cls.FIELDS)}')
+        return cls(**values)
+
+    """
+    stall: cycles charged to a core for {count} consecutive events of {kind} (see RecordingTracker), issued at {cycle}
+    """
+    def stall(self, kind: int, count: int, cycle: int) -> int:
+        return count * getattr(self, EVENT_LATENCIES[kind])
+
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and vars(other) == vars(self)
+
+DEFAULT_LATENCY = LatencyModel()
+
 class CoreTracker:
+    latency = DEFAULT_LATENCY           # Shared by every tracker; replaced to simulate other latencies
+
     def __init__(self) -> None:
         self.overall_cycles = 0         # Overall Execution Cycles (total execution time basically)
         self.hit_cycles = 0             # Cycles incurred by cache hit
@@ -13,8 +61,8 @@ class CoreTracker:
         self.num_shared_access = 0      # Number of accesses to shared data (eg access line while in shared state)
     
     def track_hit_cycles(self):
-        self.overall_cycles += 1
-        self.hit_cycles += 1
+        self.overall_cycles += self.latency.hit
+        self.hit_cycles += self.latency.hit
 
     def track_compute(self, cycles: int):
         self.overall_cycles += cycles
@@ -51,16 +99,106 @@ class CoreTracker:
         self.track_hit_cycles()
 
     def track_evict(self):
-        self.track_stall(cycles=100)
+        self.track_stall(cycles=self.latency.evict)
 
     def track_load_words_from_remote_cache(self, words: int):
-        self.track_stall(cycles=2*words)
+        self.track_stall(cycles=self.latency.word*words)
     
     def track_load_from_mem(self):
         # 1 cycle to check from cache first
         self.track_hit_cycles()
-        self.track_stall(cycles=100)
+        self.track_stall(cycles=self.latency.memory)
+
+# Events of a RecordingTracker, with the LatencyModel field charging each
+HIT, MEMORY, EVICT, WORDS, COMPUTE = range(5)
+EVENT_LATENCIES = ['hit', 'memory', 'evict', 'word']
+KIND_BITS = 3
+KIND_MASK = (1 << KIND_BITS) - 1
+MAX_EVENT_COUNT = (1 << (32 - KIND_BITS)) - 1
+
+"""
+RecordingTracker: a CoreTracker that also records its timing events in {events}, for replay.py
+Each event is one 32-bit word: (count << KIND_BITS) | kind. Consecutive events of one kind are merged, so a run of
+hits costs one word. COMPUTE counts cycles, WORDS remote words, the others events.
+"""
+class RecordingTracker(CoreTracker):
+    def __init__(self) -> None:
+        super().__init__()
+        self.events = array('I')
+
+    def record(self, kind: int, count: int) -> None:
+        events = self.events
+        if events and events[-1] & KIND_MASK == kind and (events[-1] >> KIND_BITS) + count <= MAX_EVENT_COUNT:
+            events[-1] += count << KIND_BITS
+            return
+        while count > MAX_EVENT_COUNT:
+            events.append((MAX_EVENT_COUNT << KIND_BITS) | kind)
+            count -= MAX_EVENT_COUNT
+        events.append((count << KIND_BITS) | kind)
+
+    def track_hit_cycles(self):
+        self.record(HIT, 1)
+        super().track_hit_cycles()
+
+    def track_compute(self, cycles: int):
+        self.record(COMPUTE, cycles)
+        super().track_compute(cycles)
+
+    def track_evict(self):
+        self.record(EVICT, 1)
+        super().track_evict()
 
+    def track_load_words_from_remote_cache(self, words: int):
+        self.record(WORDS, words)
+        super().track_load_words_from_remote_cache(words)
+
+    def track_load_from_mem(self):
+        # The lookup is recorded as a HIT by track_hit_cycles
+        self.record(MEMORY, 1)
+        super().track_load_from_mem()
+
+
+"""
+LockedCoreTracker: a CoreTracker whose counters can be updated from several threads at once
+With striped bus locking, a core's tracker is charged by its own thread and by requests of other cores on other
+sets (snoops, flushes, updates), which no longer share one lock.
+"""
+class LockedCoreTracker(CoreTracker):
+    def __init__(self) -> None:
+        super().__init__()
+        self.lock = Lock()
+
+    def track_hit_cycles(self):
+        with self.lock:
+            super().track_hit_cycles()
+
+    def track_compute(self, cycles: int):
+        with self.lock:
+            super().track_compute(cycles)
+
+    def track_stall(self, cycles: int):
+        with self.lock:
+            super().track_stall(cycles)
+
+    def incr_load(self):
+        with self.lock:
+            self.num_load += 1
+
+    def incr_store(self):
+        with self.lock:
+            self.num_store += 1
+
+    def incr_miss(self):
+        with self.lock:
+            self.num_miss += 1
+
+    def incr_shared_data_access(self):
+        with self.lock:
+            self.num_shared_access += 1
+
+    def incr_private_data_access(self):
+        with self.lock:
+            self.num_private_access += 1
 
 class BusTracker:
     def __init__(self) -> None:
@@ -75,4 +213,54 @@ class BusTracker:
         self.num_invalidation += blocks
 
     def track_update(self, updates: int):
-        self.num_update += updates
\ No newline at end of file
+        self.num_update += updates
+
+"""
+WarmingTracker: stands in for a core's CoreTracker while its caches are functionally warmed (see sampling.py)
+Nothing is counted. Only overall_cycles moves, by the exact cycles of other instructions and an estimated
+{memory_cycles} per load / store, so the event scheduler keeps interleaving the cores sensibly.
+"""
+class WarmingTracker:
+    def __init__(self, overall_cycles: int, memory_cycles: int) -> None:
+        self.overall_cycles = overall_cycles
+        self.memory_cycles = memory_cycles
+
+    def incr_load(self):
+        self.overall_cycles += self.memory_cycles
+
+    def incr_store(self):
+        self.overall_cycles += self.memory_cycles
+
+    def track_compute(self, cycles: int):
+        self.overall_cycles += cycles
+
+    def incr_miss(self):
+        pass
+
+    def incr_data_access(self, state: BlockState):
+        pass
+
+    def track_hit(self):
+        pass
+
+    def track_evict(self):
+        pass
+
+    def track_load_words_from_remote_cache(self, words: int):
+        pass
+
+    def track_load_from_mem(self):
+        pass
+
+"""
+NullBusTracker: counts no bus activity (requests of cores being warmed)
+"""
+class NullBusTracker:
+    def track_traffic(self, word_size: int, words: int):
+        pass
+
+    def track_invalidation(self, blocks: int):
+        pass
+
+    def track_update(self, updates: int):
+        pass
@@ -0,0 +1,116 @@
+from enums import BlockState, MemOperation, BlockSource, Protocol
+
+"""
+transitions: coherence state machines compiled into dense transition tables
+
+Each protocol is described by a list of rules (op, from states, sources, next state):
+- ANY matches every state / source, KEEP leaves the state unchanged
+- Later rules override earlier ones, so a protocol lists its fallbacks first
+- Ops a protocol never issues have no entry (None) in its table
+
+compile_table turns the rules into table[op.value][state.value][source.value] -> next state value, so a
+transition is three list lookups on small integers. Every table is checked when this module is imported: all
+(state, op, source) combinations reachable from INVALID must have an entry, and must stay within the
+protocol's states. Adding a protocol (e.g. MSI or Firefly) is a matter of adding its rules here.
+"""
+
+ANY = None
+KEEP = None
+
+NUM_OPS = max(op.value for op in MemOperation) + 1
+NUM_STATES = max(state.value for state in BlockState) + 1
+NUM_SOURCES = max(source.value for source in BlockSource) + 1
+
+M = BlockState.MODIFIED
+E = BlockState.EXCLUSIVE
+S = BlockState.SHARED
+I = BlockState.INVALID
+O = BlockState.OWNED
+SC = BlockState.SHARED_CLEAN
+SM = BlockState.SHARED_MODIFIED
+MEMORY = BlockSource.MEMORY
+REMOTE = BlockSource.REMOTE_CACHE
+
+MESI_RULES = [
+    (MemOperation.PR_INVALIDATE_LOAD, ANY, ANY, KEEP),
+    (MemOperation.PR_INVALIDATE_LOAD, [I], [MEMORY], E),
+    (MemOperation.PR_INVALIDATE_LOAD, [I], [REMOTE], S),
+    (MemOperation.PR_INVALIDATE_STORE, ANY, ANY, M),
+    (MemOperation.BUS_INVALIDATE_LOAD, ANY, ANY, KEEP),
+    (MemOperation.BUS_INVALIDATE_LOAD, [E, M], ANY, S),
+    (MemOperation.BUS_LOAD_EXCLUSIVE, ANY, ANY, I),
+]
+
+# MESI optimisation: a modified block is shared from the OWNED state instead of being written back
+MOESI_RULES = [
+    (MemOperation.PR_INVALIDATE_LOAD, ANY, ANY, KEEP),
+    (MemOperation.PR_INVALIDATE_LOAD, [I], [MEMORY], E),
+    (MemOperation.PR_INVALIDATE_LOAD, [I], [REMOTE], S),
+    (MemOperation.PR_INVALIDATE_STORE, ANY, ANY, M),
+    (MemOperation.BUS_MOESI_LOAD, ANY, ANY, KEEP),
+    (MemOperation.BUS_MOESI_LOAD, [E], ANY, S),
+    (MemOperation.BUS_MOESI_LOAD, [M], ANY, O),
+    (MemOperation.BUS_LOAD_EXCLUSIVE, ANY, ANY, I),
+]
+
+DRAGON_RULES = [
+    (MemOperation.PR_LOAD_MISS, ANY, ANY, KEEP),
+    (MemOperation.PR_LOAD_MISS, [I], [MEMORY], E),
+    (MemOperation.PR_LOAD_MISS, [I], [REMOTE], SC),
+    (MemOperation.PR_STORE_MISS, ANY, ANY, KEEP),
+    (MemOperation.PR_STORE_MISS, ANY, [MEMORY], M),
+    (MemOperation.PR_STORE_MISS, ANY, [REMOTE], SM),
+    (MemOperation.PR_UPDATE_STORE, ANY, ANY, KEEP),
+    (MemOperation.PR_UPDATE_STORE, [E], ANY, M),
+    (MemOperation.PR_UPDATE_STORE, [SC], ANY, SM),      # Achieve ownership
+    (MemOperation.BUS_UPDATE_LOAD, ANY, ANY, KEEP),
+    (MemOperation.BUS_UPDATE_LOAD, [E], ANY, SC),
+    (MemOperation.BUS_UPDATE_LOAD, [M], ANY, SM),      # Keep ownership, now shared
+    (MemOperation.BUS_UPDATE_UPDATE, ANY, ANY, KEEP),
+    (MemOperation.BUS_UPDATE_UPDATE, [SM], ANY, SC),    # Give up ownership
+]
+
+PROTOCOL_RULES = {
+    Protocol.MESI: ([M, E, S, I], MESI_RULES),
+    Protocol.MOESI: ([M, O, E, S, I], MOESI_RULES),
+    Protocol.DRAGON: ([M, E, SC, SM, I], DRAGON_RULES),
+    Protocol.NONE: ([I], []),
+}
+
+def compile_table(rules):
+    table = [[[None] * NUM_SOURCES for _ in range(NUM_STATES)] for _ in range(NUM_OPS)]
+    for op, states, sources, next_state in rules:
+        for state in (BlockState if states is ANY else states):
+            for source in (BlockSource if sources is ANY else sources):
+                table[op.value][state.value][source.value] = (state if next_state is KEEP else next_state).value
+    return table
+
+"""
+check_table: walks every state reachable from INVALID and raises ValueError on a missing or out-of-protocol transition
+"""
+def check_table(protocol: Protocol, table, states) -> None:
+    ops = [op for op in MemOperation if any(table[op.value][state.value][source.value] is not None for state in BlockState for source in BlockSource)]
+    state_values = {state.value for state in states}
+    reached = {BlockState.INVALID.value}
+    pending = [BlockState.INVALID.value]
+    while pending:
+        state = pending.pop()
+        for op in ops:
+            for source in BlockSource:
+                next_state = table[op.value][state][source.value]
+                if next_state is None:
+                    raise ValueError(f'{protocol}: no transition for state {BlockState(state)}, op {op}, source {source}')
+                if next_state not in state_values:
+                    raise ValueError(f'{protocol}: {BlockState(state)} --{op}/{source}--> {BlockState(next_state)} leaves the protocol states')
+                if next_state not in reached:
+                    reached.add(next_state)
+                    pending.append(next_state)
+
+def build_tables():
+    tables = {}
+    for protocol, (states, rules) in PROTOCOL_RULES.items():
+        tables[protocol] = compile_table(rules)
+        check_table(protocol, tables[protocol], states)
+    return tables
+
+TRANSITION_TABLES = build_tables()